@@ -0,0 +1,82 @@
+"""
+Daily rollup of rooms sold and revenue that backs the analytics endpoints.
+
+Rows are recomputed only for the days a booking or payment change touches,
+from the RoomNight ledger and COMPLETED payments. Signals queue the refresh for
+after the change commits, so it never holds locks in the booking transaction, and
+refreshes of one hotel are serialised on its row so a late one cannot overwrite
+a newer result.
+"""
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import DailyStat, Hotel, Payment, RoomNight
+
+
+def day_start(day):
+    """Aware midnight that opens ``day`` in the current time zone, for datetime range filters."""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def refresh_daily_stats_on_commit(hotel_id, dates):
+    """Refreshes the days once the current transaction commits (at once outside one)."""
+    days = set(dates)
+    if hotel_id and days:
+        transaction.on_commit(lambda: refresh_daily_stats(hotel_id, days), robust=True)
+
+
+def refresh_daily_stats(hotel_id, dates):
+    """Recomputes the rollup rows of one hotel for the given days."""
+    days = set(dates)
+    if not hotel_id or not days:
+        return
+    with transaction.atomic():
+        # Taken before reading, so the refresh that writes last also read last
+        if not Hotel.objects.select_for_update().filter(pk=hotel_id).exists():
+            return
+        _write_daily_stats(hotel_id, days)
+
+
+def _write_daily_stats(hotel_id, days):
+    start, end = min(days), max(days) + timedelta(days=1)
+
+    rows = {}
+    sold = (
+        RoomNight.objects.filter(night__gte=start, night__lt=end, room__room_type__hotel_id=hotel_id)
+        .values('night', 'room__room_type')
+        .annotate(sold=Count('id'))
+    )
+    for row in sold:
+        if row['night'] in days:
+            rows[(row['night'], row['room__room_type'])] = [row['sold'], Decimal('0')]
+
+    revenue = (
+        Payment.objects.filter(
+            status=Payment.PaymentStatus.COMPLETED,
+            invoice__booking__hotel_id=hotel_id,
+            payment_date__gte=day_start(start),
+            payment_date__lt=day_start(end),
+        )
+        .annotate(day=TruncDate('payment_date'))
+        .values('day', 'invoice__booking__room_type')
+        .annotate(total=Sum('amount'))
+    )
+    for row in revenue:
+        if row['day'] in days:
+            rows.setdefault((row['day'], row['invoice__booking__room_type']), [0, Decimal('0')])[1] = row['total']
+
+    DailyStat.objects.filter(hotel_id=hotel_id, date__in=days).delete()
+    DailyStat.objects.bulk_create([
+        DailyStat(hotel_id=hotel_id, room_type_id=room_type_id, date=day, rooms_sold=sold, revenue=total)
+        for (day, room_type_id), (sold, total) in rows.items()
+    ])
+
+
+def payment_day(payment):
+    """Rollup day a payment is counted on (payment_date in the server time zone)."""
+    return timezone.localdate(payment.payment_date) if payment.payment_date else timezone.localdate()
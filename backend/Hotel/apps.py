@@ -2,4 +2,7 @@ from django.apps import AppConfig
 
 class HotelConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'Hotel'
\ No newline at end of file
+    name = 'Hotel'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,196 @@
+"""
+Token authentication that answers warm requests without touching the database.
+
+DRF's TokenAuthentication joins Token and User on every request. Here a token
+resolves to a small entry (the user fields in USER_FIELDS, and the role and hotel
+of their StaffProfile) held in a bounded in-process LRU, and optionally
+in a shared cache as a second tier, so a warm request costs no query at all.
+
+Entries are dropped by signals when the token is deleted (logout), the user is
+saved (password change or reset, deactivation) or the staff profile changes. The
+in-process tier only hears about writes made in its own process, so when several
+worker processes share a cache (AUTH_TOKEN_CACHE_ALIAS, set when REDIS_URL is) the
+local entries live only a few seconds and the shared tier carries invalidations.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from .models import StaffProfile
+
+AUTH_TOKEN_CACHE_SIZE = getattr(settings, 'AUTH_TOKEN_CACHE_SIZE', 10000)
+AUTH_TOKEN_CACHE_TIMEOUT = getattr(settings, 'AUTH_TOKEN_CACHE_TIMEOUT', 300)
+AUTH_TOKEN_CACHE_ALIAS = getattr(settings, 'AUTH_TOKEN_CACHE_ALIAS', None)
+AUTH_TOKEN_LOCAL_TIMEOUT = getattr(
+    settings, 'AUTH_TOKEN_LOCAL_TIMEOUT', 5 if AUTH_TOKEN_CACHE_ALIAS else AUTH_TOKEN_CACHE_TIMEOUT,
+)
+
+User = get_user_model()
+# The user fields kept in the cache; the rest (the password hash above all) are
+# deferred on the rebuilt user and loaded on first access, e.g. by check_password.
+# In concrete field order, as Model.from_db expects.
+USER_FIELDS = [
+    field.attname for field in User._meta.concrete_fields
+    if field.attname in {'id', 'username', 'first_name', 'last_name', 'email', 'is_active', 'is_staff', 'is_superuser'}
+]
+
+
+class TokenCache:
+    """Bounded LRU of token entries with a time to live, safe to share between threads."""
+
+    def __init__(self, max_size, timeout):
+        self.max_size = max_size
+        self.timeout = timeout
+        self._entries = OrderedDict()
+        self._keys_by_user = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            expires, entry = item
+            if expires < time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (time.monotonic() + self.timeout, entry)
+            self._keys_by_user.setdefault(entry['user_id'], set()).add(key)
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+
+    def delete(self, key):
+        with self._lock:
+            self._remove(key)
+
+    def delete_user(self, user_id):
+        with self._lock:
+            for key in list(self._keys_by_user.get(user_id, ())):
+                self._remove(key)
+
+    def _remove(self, key):
+        item = self._entries.pop(key, None)
+        if item is None:
+            return
+        user_id = item[1]['user_id']
+        keys = self._keys_by_user.get(user_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_user[user_id]
+
+
+local_cache = TokenCache(AUTH_TOKEN_CACHE_SIZE, AUTH_TOKEN_LOCAL_TIMEOUT)
+
+
+def _shared_cache():
+    return caches[AUTH_TOKEN_CACHE_ALIAS] if AUTH_TOKEN_CACHE_ALIAS else None
+
+
+def _cache_key(key):
+    return f'auth-token:{key}'
+
+
+def _load_entry(key):
+    """One query: the token with its user and, through the reverse one-to-one, the staff profile."""
+    token = Token.objects.select_related('user__staffprofile').filter(key=key).first()
+    if token is None:
+        return None
+    user = token.user
+    try:
+        profile = user.staffprofile
+    except StaffProfile.DoesNotExist:
+        profile = None
+    return {
+        'user_id': user.pk,
+        'db': user._state.db,
+        'user': [getattr(user, field) for field in USER_FIELDS],
+        'created': token.created,
+        'role': profile.role if profile else None,
+        'hotel_id': profile.hotel_id if profile else None,
+    }
+
+
+def get_entry(key):
+    entry = local_cache.get(key)
+    if entry is not None:
+        return entry
+    shared = _shared_cache()
+    if shared is not None:
+        entry = shared.get(_cache_key(key))
+    if entry is None:
+        entry = _load_entry(key)
+        if entry is None:
+            return None
+        if shared is not None:
+            shared.set(_cache_key(key), entry, AUTH_TOKEN_CACHE_TIMEOUT)
+    local_cache.set(key, entry)
+    return entry
+
+
+def invalidate_token(key):
+    local_cache.delete(key)
+    shared = _shared_cache()
+    if shared is not None:
+        shared.delete(_cache_key(key))
+
+
+def invalidate_user(user_id):
+    local_cache.delete_user(user_id)
+    shared = _shared_cache()
+    if shared is not None:
+        keys = Token.objects.filter(user_id=user_id).values_list('key', flat=True)
+        shared.delete_many([_cache_key(key) for key in keys])
+
+
+def entry_user(entry):
+    """A fresh user built from a token entry, its staff scope already attached (see staff_scope)."""
+    user = User.from_db(entry['db'], USER_FIELDS, entry['user'])
+    user._staff_scope = (entry['role'], entry['hotel_id'])
+    return user
+
+
+def staff_scope(user):
+    """
+    (role, hotel_id) of the user's staff profile, or (None, None) without one.
+    Free for users authenticated by CachedTokenAuthentication; otherwise one query,
+    remembered on the user object.
+    """
+    scope = getattr(user, '_staff_scope', None)
+    if scope is None:
+        scope = (None, None)
+        if user.is_authenticated:
+            scope = StaffProfile.objects.filter(user=user).values_list('role', 'hotel_id').first() or scope
+        user._staff_scope = scope
+    return scope
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Drop-in replacement for TokenAuthentication backed by the token cache."""
+
+    def authenticate_credentials(self, key):
+        entry = get_entry(key)
+        if entry is None:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+
+        # Fresh instances per request, so a view changing request.user cannot leak into the cache
+        user = entry_user(entry)
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+        token = Token.from_db(entry['db'], ['key', 'user_id', 'created'], [key, user.pk, entry['created']])
+        token.user = user
+        return user, token
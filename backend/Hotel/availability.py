@@ -0,0 +1,171 @@
+"""
+Room availability backed by the RoomNight occupancy ledger.
+
+Every occupied night is a single indexed row, so "which rooms of this type are
+free for [check_in, check_out)" only touches the nights in that window and never
+the booking history.
+"""
+import random
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.utils import timezone
+
+from .models import Booking, Payment, Room, RoomNight
+
+# How many times a lost allocation race is retried before giving up
+ALLOCATION_ATTEMPTS = 5
+
+# MySQL ER_LOCK_DEADLOCK and ER_LOCK_WAIT_TIMEOUT: the transaction was rolled back
+# (or its statement abandoned) and can simply be run again
+LOCK_CONFLICT_CODES = (1213, 1205)
+# Upper bound of the random pause before the first deadlock retry; doubles per attempt
+LOCK_RETRY_BACKOFF = 0.02
+
+# How long an online booking keeps its room while the guest pays
+PENDING_HOLD_MINUTES = getattr(settings, 'PENDING_HOLD_MINUTES', 30)
+# Expired holds released per transaction
+RELEASE_BATCH_SIZE = 200
+
+# Fields whose change can move a booking's nights in the ledger
+LEDGER_FIELDS = {'room', 'room_id', 'status', 'check_in', 'check_out', 'checked_out_on'}
+
+# Nights charged at the weekend rate (date.weekday(): Friday and Saturday)
+WEEKEND_NIGHTS = (4, 5)
+
+
+def stay_nights(check_in, check_out):
+    """Every night of a stay, check-out day excluded."""
+    return [check_in + timedelta(days=offset) for offset in range((check_out - check_in).days)]
+
+
+def booking_nights(booking):
+    """
+    Nights the booking holds its room for in the ledger: the whole stay while it is
+    live, and the nights actually stayed once checked out, so they still count as sold.
+    """
+    if not booking.room_id:
+        return []
+    if booking.status in Booking.OCCUPYING_STATUSES:
+        return stay_nights(booking.check_in, booking.check_out)
+    if booking.status == Booking.BookingStatus.CHECKED_OUT:
+        # Leaving early frees the rest of the stay for new bookings
+        left = min(booking.check_out, booking.checked_out_on or booking.check_out)
+        return stay_nights(booking.check_in, left)
+    return []
+
+
+def sync_booking_nights(booking, update_fields=None):
+    """
+    Rewrites the ledger rows of a single booking from its current state.
+    Returns the set of nights whose occupancy changed.
+    """
+    if update_fields is not None and not LEDGER_FIELDS.intersection(update_fields):
+        return set()
+
+    current = set(RoomNight.objects.filter(booking=booking).values_list('room_id', 'night'))
+    wanted = {(booking.room_id, night) for night in booking_nights(booking)}
+    if current == wanted:
+        return set()
+
+    if current:
+        RoomNight.objects.filter(booking=booking).delete()
+    RoomNight.objects.bulk_create([
+        RoomNight(room_id=room_id, booking=booking, night=night) for room_id, night in wanted
+    ])
+    return {night for _, night in current | wanted}
+
+
+def occupied_room_ids(check_in, check_out, room_type=None):
+    """Subquery of room ids that have at least one occupied night in the window."""
+    nights = RoomNight.objects.filter(night__gte=check_in, night__lt=check_out)
+    if room_type is not None:
+        nights = nights.filter(room__room_type=room_type)
+    return nights.values('room_id')
+
+
+def free_rooms(room_type, check_in, check_out):
+    """Rooms of ``room_type`` that are bookable for the whole stay."""
+    return (
+        Room.objects.filter(room_type=room_type)
+        .exclude(status=Room.RoomStatus.MAINTENANCE)
+        .exclude(id__in=occupied_room_ids(check_in, check_out, room_type))
+        .order_by('id')
+    )
+
+
+class AllocationConflict(Exception):
+    """Every allocation attempt lost its race for a room."""
+
+
+def is_lock_conflict(error):
+    """Whether an OperationalError is a deadlock or lock timeout worth retrying."""
+    code = error.args[0] if error.args else None
+    if code in LOCK_CONFLICT_CODES:
+        return True
+    # SQLite reports a busy database by message only
+    return isinstance(code, str) and 'database is locked' in code
+
+
+def allocate_room(room_type, check_in, check_out, create_booking, attempts=ALLOCATION_ATTEMPTS):
+    """
+    Picks a free room and creates the booking on it inside a single transaction.
+
+    Candidate rooms are locked with SKIP LOCKED, so parallel requests spread over
+    different rooms instead of queueing behind one row. The unique (room, night)
+    ledger constraint is the final guard: a request that still loses the race rolls
+    back and retries, as does one chosen as a deadlock victim. Deadlocks are only
+    retried when this is the outermost transaction, since the database has already
+    rolled back any enclosing one. ``create_booking(room)`` must save and return the
+    booking. Returns None when the room type is sold out.
+    """
+    retry_lock_conflicts = not connection.in_atomic_block
+    for attempt in range(attempts):
+        try:
+            with transaction.atomic():
+                room = (
+                    free_rooms(room_type, check_in, check_out)
+                    .select_for_update(skip_locked=True)
+                    .first()
+                )
+                if room is None:
+                    return None
+                return create_booking(room)
+        except IntegrityError:
+            continue
+        except OperationalError as error:
+            if not (retry_lock_conflicts and is_lock_conflict(error)):
+                raise
+            # Jittered, so the transactions that collided do not collide again
+            time.sleep(random.uniform(0, LOCK_RETRY_BACKOFF * 2 ** attempt))
+    raise AllocationConflict()
+
+
+def hold_expiry():
+    """When a pending online booking made now stops holding its room."""
+    return timezone.now() + timedelta(minutes=PENDING_HOLD_MINUTES)
+
+
+def release_expired_holds(batch_size=RELEASE_BATCH_SIZE):
+    """
+    Cancels pending bookings whose hold ran out without a completed payment, which
+    frees their nights. Rows locked elsewhere (a payment being applied) are skipped
+    and looked at on the next run. Returns how many bookings were cancelled.
+    """
+    released = 0
+    while True:
+        with transaction.atomic():
+            bookings = list(
+                Booking.objects.select_for_update(skip_locked=True)
+                .filter(status=Booking.BookingStatus.PENDING, hold_expires_at__lt=timezone.now())
+                .exclude(invoices__payments__status=Payment.PaymentStatus.COMPLETED)
+                .order_by('hold_expires_at', 'id')[:batch_size]
+            )
+            for booking in bookings:
+                booking.status = Booking.BookingStatus.CANCELLED
+                booking.save(update_fields=['status'])
+        released += len(bookings)
+        if len(bookings) < batch_size:
+            return released
@@ -0,0 +1,124 @@
+"""
+Response cache for read endpoints whose data rarely changes.
+
+Each cached model has a version counter per hotel (plus one for "all hotels"),
+bumped by post_save/post_delete signals. Cache keys and ETags embed the current
+versions, so a write invalidates exactly the responses built from that model,
+and a client holding a matching ETag gets a 304 without any query or serialisation.
+
+The backend is whatever the ``RESPONSE_CACHE_ALIAS`` cache points at: the in-process
+LocMemCache by default, or Redis when REDIS_URL is set. Deployments running several
+worker processes should use the shared backend so invalidations reach every worker.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponseNotModified
+from rest_framework.response import Response
+
+RESPONSE_CACHE_ALIAS = getattr(settings, 'RESPONSE_CACHE_ALIAS', 'default')
+RESPONSE_CACHE_TIMEOUT = getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 600)
+
+
+def _cache():
+    return caches[RESPONSE_CACHE_ALIAS]
+
+
+def has_hotel(model):
+    return any(field.name == 'hotel' for field in model._meta.concrete_fields)
+
+
+def _version_key(model, hotel_id):
+    # Models without their own hotel column are versioned across all hotels
+    scope = hotel_id if hotel_id and has_hotel(model) else 'all'
+    return f'model-version:{model._meta.label_lower}:{scope}'
+
+
+def _changed_key(version_key):
+    return 'model-changed:' + version_key[len('model-version:'):]
+
+
+def get_versions(models, hotel_id=None):
+    """Current version of each model for one hotel (or for all hotels)."""
+    keys = [_version_key(model, hotel_id) for model in models]
+    found = _cache().get_many(keys)
+    missing = {key: time.time_ns() for key in keys if key not in found}
+    if missing:
+        # A fresh counter starts from the clock so it never repeats an evicted value
+        _cache().set_many(missing, None)
+        found.update(missing)
+    return tuple(found[key] for key in keys)
+
+
+def bump_version(model, hotel_id=None):
+    """Invalidates every cached response built from ``model`` for the hotel and the all-hotels view."""
+    keys = {_version_key(model, None), _version_key(model, hotel_id)}
+    for key in keys:
+        try:
+            _cache().incr(key)
+        except ValueError:
+            _cache().set(key, time.time_ns(), None)
+    now = time.time()
+    _cache().set_many({_changed_key(key): now for key in keys}, None)
+
+
+def last_changed(models, hotel_id=None):
+    """Epoch seconds of the latest bump of any of ``models``, or None when none is recorded."""
+    keys = [_changed_key(_version_key(model, hotel_id)) for model in models]
+    stamps = _cache().get_many(keys).values()
+    return max(stamps) if stamps else None
+
+
+def etag_matches(request, etag):
+    header = request.headers.get('If-None-Match', '')
+    tags = [tag.strip() for tag in header.split(',')]
+    return etag in tags or '*' in tags
+
+
+class CachedReadMixin:
+    """
+    Caches list/retrieve payloads of a viewset and answers If-None-Match with 304.
+    ``cache_models`` lists every model whose changes alter the response.
+    """
+    cache_models = ()
+
+    def get_cache_hotel_id(self):
+        # Hotel the response is limited to; None when it covers every hotel's rows
+        return None
+
+    def _cache_key(self, request, kwargs):
+        hotel_id = self.get_cache_hotel_id()
+        versions = get_versions(self.cache_models, hotel_id)
+        # Host is part of the key because serializers build absolute media and page URLs
+        raw = '|'.join([
+            self.basename, self.action, str(hotel_id), request.get_host(), request.get_full_path(),
+            repr(sorted(kwargs.items())), repr(versions),
+        ])
+        return 'response:' + hashlib.md5(raw.encode('utf-8')).hexdigest()
+
+    def _cached(self, handler, request, *args, **kwargs):
+        key = self._cache_key(request, kwargs)
+        etag = f'"{key[len("response:"):]}"'
+        if etag_matches(request, etag):
+            response = HttpResponseNotModified()
+            response['ETag'] = etag
+            return response
+
+        data = _cache().get(key)
+        if data is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            _cache().set(key, response.data, RESPONSE_CACHE_TIMEOUT)
+        else:
+            response = Response(data)
+        response['ETag'] = etag
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self._cached(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._cached(super().retrieve, request, *args, **kwargs)
@@ -0,0 +1,71 @@
+"""
+Conditional GET for endpoints that screens poll (bookings, housekeeping, food orders).
+
+Saves and deletes bump the per-model, per-hotel version counters of caching.py
+once their transaction commits. A poll reads those counters from the cache and,
+when the client's ETag or If-Modified-Since still matches, answers 304 without
+running a query.
+"""
+import hashlib
+
+from django.db import transaction
+from django.http import HttpResponseNotModified
+from django.utils.http import http_date, parse_http_date_safe
+
+from .caching import bump_version, etag_matches, get_versions, last_changed
+
+
+def bump_model_version(model, hotel_id=None):
+    """
+    Records a change to ``model`` for the hotel and the all-hotels view once the
+    surrounding transaction commits, so a poll never pairs a new version with rows
+    it cannot see yet.
+    """
+    transaction.on_commit(lambda: bump_version(model, hotel_id))
+
+
+class ConditionalGetMixin:
+    """
+    Answers If-None-Match / If-Modified-Since on list and retrieve with 304 when
+    none of ``version_models`` changed since the client's copy.
+    """
+    version_models = ()
+
+    def get_version_hotel_id(self):
+        # Hotel the response is limited to; None when it covers every hotel's rows
+        return None
+
+    def _version_state(self, request, kwargs):
+        hotel_id = self.get_version_hotel_id()
+        versions = get_versions(self.version_models, hotel_id)
+        raw = '|'.join([
+            self.basename, self.action, str(hotel_id), request.get_host(), request.get_full_path(),
+            repr(sorted(kwargs.items())), repr(versions),
+        ])
+        etag = '"%s"' % hashlib.md5(raw.encode('utf-8')).hexdigest()
+        return etag, last_changed(self.version_models, hotel_id)
+
+    def _not_modified(self, request, etag, last_modified):
+        if 'If-None-Match' in request.headers:
+            return etag_matches(request, etag)
+        since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+        return bool(since and last_modified and int(last_modified) <= since)
+
+    def _conditional(self, handler, request, *args, **kwargs):
+        etag, last_modified = self._version_state(request, kwargs)
+        if self._not_modified(request, etag, last_modified):
+            response = HttpResponseNotModified()
+        else:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+        response['ETag'] = etag
+        if last_modified:
+            response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self._conditional(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._conditional(super().retrieve, request, *args, **kwargs)
@@ -0,0 +1,97 @@
+"""
+Dashboard statistics, served from the cache and invalidated by model signals.
+
+On a cache miss every counter is computed by one SQL statement made of scalar
+subqueries, so the dashboard never costs more than a single round trip.
+"""
+import time
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import F, Func
+from django.utils import timezone
+
+from .models import Booking, Guest, Invoice, Room, RoomNight
+
+# Safety net for changes that bypass signals (queryset.update(), raw SQL)
+SUMMARY_TIMEOUT = 300
+
+# Bumped when a change affects every hotel (guests are shared between hotels)
+GENERATION_KEY = 'dashboard-summary-generation'
+
+
+def _summary_key(hotel_id, generation, today):
+    return f'dashboard-summary:{generation}:{hotel_id or "all"}:{today.isoformat()}'
+
+
+def _scalar(queryset, function, field='id'):
+    """Turns a queryset into a one-value SELECT (COUNT/SUM without GROUP BY)."""
+    return queryset.order_by().annotate(value=Func(F(field), function=function)).values('value')
+
+
+def _compute_summary(hotel_id, today):
+    bookings = Booking.objects.all()
+    rooms = Room.objects.all()
+    invoices = Invoice.objects.all()
+    nights = RoomNight.objects.filter(night=today)
+    if hotel_id:
+        bookings = bookings.filter(hotel_id=hotel_id)
+        rooms = rooms.filter(room_type__hotel_id=hotel_id)
+        invoices = invoices.filter(booking__hotel_id=hotel_id)
+        nights = nights.filter(room__room_type__hotel_id=hotel_id)
+    live = bookings.exclude(status=Booking.BookingStatus.CANCELLED)
+
+    counters = {
+        'total_bookings': _scalar(bookings, 'COUNT'),
+        'total_customers': _scalar(Guest.objects.all(), 'COUNT'),
+        'total_rooms': _scalar(rooms, 'COUNT'),
+        'revenue': _scalar(invoices, 'SUM', 'amount'),
+        'occupied_today': _scalar(nights, 'COUNT'),
+        'arrivals_today': _scalar(live.filter(check_in=today), 'COUNT'),
+        'departures_today': _scalar(live.filter(check_out=today), 'COUNT'),
+    }
+
+    parts, params = [], []
+    for queryset in counters.values():
+        sql, sql_params = queryset.query.sql_with_params()
+        parts.append(f'({sql})')
+        params.extend(sql_params)
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT ' + ', '.join(parts), params)
+        row = cursor.fetchone()
+
+    data = {name: value or 0 for name, value in zip(counters, row)}
+    data['revenue'] = Decimal(str(data['revenue']))
+    data['occupancy_rate'] = round(data['occupied_today'] * 100 / data['total_rooms'], 2) if data['total_rooms'] else 0
+    return data
+
+
+def get_summary(hotel_id=None):
+    """Dashboard counters for one hotel, or for every hotel when ``hotel_id`` is None."""
+    today = timezone.localdate()
+    generation = cache.get_or_set(GENERATION_KEY, time.time_ns, None)
+    key = _summary_key(hotel_id, generation, today)
+    data = cache.get(key)
+    if data is None:
+        data = _compute_summary(hotel_id, today)
+        cache.set(key, data, SUMMARY_TIMEOUT)
+    return data
+
+
+def invalidate_summary(hotel_id=None):
+    """
+    Drops the cached counters of one hotel (and the all-hotels view).
+    Without a hotel every cached summary is dropped.
+    """
+    if hotel_id is None:
+        try:
+            cache.incr(GENERATION_KEY)
+        except ValueError:
+            # An evicted generation restarts from the clock so it can never reuse an old value
+            cache.set(GENERATION_KEY, time.time_ns(), None)
+        return
+
+    generation = cache.get_or_set(GENERATION_KEY, time.time_ns, None)
+    today = timezone.localdate()
+    cache.delete_many([_summary_key(hotel_id, generation, today), _summary_key(None, generation, today)])
@@ -0,0 +1,165 @@
+"""
+In-process publish/subscribe hub behind the server-sent event streams.
+
+Model signals publish from whatever thread handled the write; every subscriber is
+an ASGI connection with its own bounded asyncio queue, fed through its event loop.
+Each channel keeps a short history so a reconnecting client can resume from its
+Last-Event-ID. A subscriber that falls too far behind, or asks to resume from an
+event that is no longer retained, receives a ``reset`` event and must refetch.
+
+The hub lives in one process: run the streams on a single ASGI worker, or put a
+shared broker in front of ``publish`` when scaling out.
+"""
+import asyncio
+import itertools
+import json
+import threading
+import time
+from collections import deque
+
+from rest_framework.utils.encoders import JSONEncoder
+
+# Events kept per channel for Last-Event-ID resume
+HISTORY_SIZE = 500
+
+# Undelivered events a single connection may buffer before it is reset
+QUEUE_SIZE = 100
+
+# Seconds between keep-alive comments on an idle stream
+HEARTBEAT_SECONDS = 15
+
+RESET = object()
+
+
+class Event:
+    __slots__ = ('seq', 'id', 'name', 'payload', 'frame')
+
+    def __init__(self, epoch, seq, name, payload):
+        self.seq = seq
+        self.id = f'{epoch}-{seq}'
+        self.name = name
+        self.payload = payload
+        # Encoded once and shared by every subscriber
+        data = json.dumps(payload, cls=JSONEncoder, separators=(',', ':'))
+        self.frame = f'id: {self.id}\nevent: {name}\ndata: {data}\n\n'.encode('utf-8')
+
+
+class _Channel:
+    __slots__ = ('counter', 'history', 'subscribers')
+
+    def __init__(self):
+        self.counter = itertools.count(1)
+        self.history = deque(maxlen=HISTORY_SIZE)
+        self.subscribers = set()
+
+
+class Subscription:
+    """One stream connection. Iterate it to receive events, RESET, or None on heartbeat."""
+    __slots__ = ('channel', 'loop', 'predicate', 'queue')
+
+    def __init__(self, channel, loop, predicate=None):
+        self.channel = channel
+        self.loop = loop
+        self.predicate = predicate
+        self.queue = asyncio.Queue(QUEUE_SIZE)
+
+    def wants(self, event):
+        return self.predicate is None or self.predicate(event)
+
+    def _deliver(self, event):
+        # Runs on the subscriber's own event loop
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Too slow to keep up: drop the backlog and make the client refetch
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESET)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return await asyncio.wait_for(self.queue.get(), HEARTBEAT_SECONDS)
+        except asyncio.TimeoutError:
+            return None
+
+
+def _deliver_all(subscriptions, event):
+    for subscription in subscriptions:
+        subscription._deliver(event)
+
+
+class EventHub:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._channels = {}
+        # Event ids embed the process start so ids from a previous run are never resumed
+        self._epoch = str(int(time.time()))
+
+    def publish(self, channel, name, payload):
+        with self._lock:
+            state = self._channels.setdefault(channel, _Channel())
+            event = Event(self._epoch, next(state.counter), name, payload)
+            state.history.append(event)
+            subscribers = list(state.subscribers)
+
+        # Filters run here so idle connections are not woken for rows they ignore,
+        # and each event loop is woken once per event however many connections it serves
+        by_loop = {}
+        for subscription in subscribers:
+            if subscription.wants(event):
+                by_loop.setdefault(subscription.loop, []).append(subscription)
+        for loop, targets in by_loop.items():
+            try:
+                loop.call_soon_threadsafe(_deliver_all, targets, event)
+            except RuntimeError:
+                # The loop has closed along with its connections
+                for subscription in targets:
+                    self.unsubscribe(subscription)
+        return event
+
+    def subscribe(self, channel, last_event_id=None, predicate=None):
+        """
+        Registers a connection on the running loop. Returns (subscription, backlog)
+        where backlog lists the missed events to replay, or is None when the
+        requested position can no longer be resumed.
+        """
+        subscription = Subscription(channel, asyncio.get_running_loop(), predicate)
+        with self._lock:
+            state = self._channels.setdefault(channel, _Channel())
+            state.subscribers.add(subscription)
+            backlog = self._backlog(state, last_event_id)
+        if backlog is not None:
+            backlog = [event for event in backlog if subscription.wants(event)]
+        return subscription, backlog
+
+    def _backlog(self, state, last_event_id):
+        if not last_event_id:
+            return []
+        epoch, _, seq = last_event_id.partition('-')
+        if epoch != self._epoch or not seq.isdigit():
+            return None
+        seq = int(seq)
+        oldest = state.history[0].seq if state.history else None
+        if oldest is not None and seq < oldest - 1:
+            return None
+        return [event for event in state.history if event.seq > seq]
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            state = self._channels.get(subscription.channel)
+            if state is not None:
+                state.subscribers.discard(subscription)
+
+
+hub = EventHub()
+
+
+def food_orders_channel(hotel_id):
+    return f'food-orders:{hotel_id}'
+
+
+def housekeeping_channel(hotel_id):
+    return f'housekeeping:{hotel_id}'
@@ -0,0 +1,113 @@
+"""
+Per-hotel settings (tax rate, currency, check-in/out times, maintenance mode)
+cached in process, and the maintenance-mode middleware built on them.
+
+Each hotel's settings are kept in a plain dict next to the version they were read
+at. The version lives in the default cache and is bumped by the Hotel post_save /
+post_delete signal, so a lookup costs one cache read and no query; with REDIS_URL
+set the bump reaches every worker process.
+"""
+import time
+from typing import NamedTuple
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.http import JsonResponse
+from django.utils.decorators import sync_and_async_middleware
+
+from .authentication import get_entry
+from .models import Hotel
+
+# Writes to these stay open in maintenance mode: admins must be able to switch it
+# off again, and PayHere keeps notifying about payments already made
+MAINTENANCE_EXEMPT_PATHS = getattr(settings, 'MAINTENANCE_EXEMPT_PATHS', (
+    '/admin/', '/api/hotels/', '/api/login/', '/api/logout/', '/api/payhere/notify/',
+))
+MAINTENANCE_RETRY_AFTER = getattr(settings, 'MAINTENANCE_RETRY_AFTER', 300)
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class HotelSettings(NamedTuple):
+    id: int
+    tax_rate: object
+    default_currency: str
+    check_in_time: object
+    check_out_time: object
+    maintenance_mode: bool
+
+
+FIELDS = HotelSettings._fields
+
+_configs = {}
+
+
+def _version_key(hotel_id):
+    return f'hotel-config-version:{hotel_id}'
+
+
+def get_hotel_config(hotel_id):
+    """Settings of one hotel, or None when it does not exist."""
+    key = _version_key(hotel_id)
+    version = cache.get(key)
+    if version is None:
+        version = time.time_ns()
+        cache.set(key, version, None)
+    cached = _configs.get(hotel_id)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    row = Hotel.objects.filter(pk=hotel_id).values_list(*FIELDS).first()
+    config = HotelSettings(*row) if row else None
+    _configs[hotel_id] = (version, config)
+    return config
+
+
+def invalidate_hotel_config(hotel_id):
+    _configs.pop(hotel_id, None)
+    try:
+        cache.incr(_version_key(hotel_id))
+    except ValueError:
+        cache.set(_version_key(hotel_id), time.time_ns(), None)
+
+
+def _request_hotel_id(request):
+    # Runs before DRF authenticates, so the token is read straight from the cache
+    # that CachedTokenAuthentication fills; anyone else writes to the default hotel
+    words = request.headers.get('Authorization', '').split()
+    if len(words) == 2 and words[0] == 'Token':
+        entry = get_entry(words[1])
+        if entry is not None and entry['hotel_id']:
+            return entry['hotel_id']
+    return request.tenant.write_hotel_id
+
+
+def in_maintenance(request):
+    if request.method in SAFE_METHODS or request.path.startswith(MAINTENANCE_EXEMPT_PATHS):
+        return False
+    hotel_id = _request_hotel_id(request)
+    config = get_hotel_config(hotel_id) if hotel_id else None
+    return bool(config and config.maintenance_mode)
+
+
+def _maintenance_response():
+    response = JsonResponse({'detail': 'The hotel is under maintenance. Please try again later.'}, status=503)
+    response['Retry-After'] = str(MAINTENANCE_RETRY_AFTER)
+    return response
+
+
+@sync_and_async_middleware
+def maintenance_middleware(get_response):
+    """Answers writes with 503 while the hotel is in maintenance mode; reads go through."""
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            if request.method not in SAFE_METHODS and await sync_to_async(in_maintenance)(request):
+                return _maintenance_response()
+            return await get_response(request)
+    else:
+        def middleware(request):
+            if in_maintenance(request):
+                return _maintenance_response()
+            return get_response(request)
+    return middleware
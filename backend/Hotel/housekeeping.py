@@ -0,0 +1,179 @@
+"""
+Room turnover: checkout side effects, batched room/task status changes and
+automatic assignment of tasks to housekeepers.
+
+Bulk changes write with bulk_update/bulk_create, which send no model signals,
+so the polling version counters and the housekeeping stream are updated here.
+"""
+from django.db import connection, transaction
+from django.db.models import F, Max
+
+from .conditional import bump_model_version
+from .events import housekeeping_channel, hub
+from .models import HousekeepingTask, Room, StaffProfile
+from .scheduling import assign_tasks
+from .serializers import HousekeepingTaskSerializer
+
+MAX_BULK_TRANSITION = 1000
+
+OPEN_TASK_STATUSES = (HousekeepingTask.TaskStatus.DIRTY, HousekeepingTask.TaskStatus.IN_PROGRESS)
+
+
+class UnknownRows(Exception):
+    """Raised with {'rooms': [...], 'tasks': [...]} when some ids do not exist."""
+
+
+def room_payload(room):
+    return {
+        'id': room.pk, 'room_type': room.room_type_id, 'room_number': room.room_number,
+        'floor': room.floor, 'status': room.status,
+    }
+
+
+def publish_housekeeping(hotel_id, name, payload):
+    """Sends a board delta once the surrounding transaction commits."""
+    if hotel_id:
+        transaction.on_commit(lambda: hub.publish(housekeeping_channel(hotel_id), name, payload))
+
+
+def _open_task_room_ids(room_ids):
+    return set(
+        HousekeepingTask.objects.filter(room_id__in=room_ids, status__in=OPEN_TASK_STATUSES)
+        .values_list('room_id', flat=True)
+    )
+
+
+def turn_over_room(booking):
+    """Marks the room of a checked-out booking DIRTY and queues its cleaning task."""
+    if booking.room_id is None:
+        return None
+    room = Room.objects.select_for_update().get(pk=booking.room_id)
+    # Rooms out of order stay that way; they still get cleaned
+    if room.status == Room.RoomStatus.CLEAN:
+        room.status = Room.RoomStatus.DIRTY
+        room.save(update_fields=['status'])
+    if _open_task_room_ids([room.pk]):
+        return None
+    return HousekeepingTask.objects.create(room=room, notes=f'Checkout of booking #{booking.pk}')
+
+
+def bulk_transition(room_statuses, task_statuses, hotel_id=None):
+    """
+    Applies {room_id: status} and {task_id: status} in a handful of statements.
+    With ``hotel_id`` only that hotel's rooms and tasks are touched; others count as unknown.
+    Tasks moved to CLEAN mark their room CLEAN (unless the room is listed too), and
+    rooms moved to DIRTY get a cleaning task when none is open.
+    Returns (rooms, tasks, created_count) with tasks holding the changed and new rows.
+    """
+    room_statuses = dict(room_statuses)
+    with transaction.atomic():
+        task_rows = HousekeepingTask.objects.filter(pk__in=task_statuses)
+        if hotel_id is not None:
+            task_rows = task_rows.filter(room__room_type__hotel_id=hotel_id)
+        tasks = {task.pk: task for task in task_rows}
+        for task_id, task in tasks.items():
+            task.status = task_statuses[task_id]
+            if task.status == HousekeepingTask.TaskStatus.CLEAN:
+                room_statuses.setdefault(task.room_id, Room.RoomStatus.CLEAN)
+
+        room_rows = Room.objects.filter(pk__in=room_statuses)
+        if hotel_id is not None:
+            room_rows = room_rows.filter(room_type__hotel_id=hotel_id)
+        rooms = {room.pk: room for room in room_rows.annotate(hotel_id=F('room_type__hotel_id'))}
+        missing_rooms = sorted(set(room_statuses) - set(rooms))
+        missing_tasks = sorted(set(task_statuses) - set(tasks))
+        if missing_rooms or missing_tasks:
+            raise UnknownRows({'rooms': missing_rooms, 'tasks': missing_tasks})
+        for room_id, room in rooms.items():
+            room.status = room_statuses[room_id]
+
+        # Rooms turning DIRTY need a task unless one stays open after this batch
+        dirty = {room_id for room_id, room in rooms.items() if room.status == Room.RoomStatus.DIRTY}
+        covered = _open_task_room_ids(dirty) if dirty else set()
+        covered -= {task.room_id for task in tasks.values() if task.status not in OPEN_TASK_STATUSES}
+        covered |= {task.room_id for task in tasks.values() if task.status in OPEN_TASK_STATUSES}
+        new_tasks = [HousekeepingTask(room_id=room_id) for room_id in sorted(dirty - covered)]
+
+        Room.objects.bulk_update(rooms.values(), ['status'], batch_size=500)
+        HousekeepingTask.objects.bulk_update(tasks.values(), ['status'], batch_size=500)
+        task_ids = set(tasks)
+        if new_tasks:
+            last_id = HousekeepingTask.objects.aggregate(last=Max('id'))['last'] or 0
+            HousekeepingTask.objects.bulk_create(new_tasks, batch_size=500)
+            if connection.features.can_return_rows_from_bulk_insert:
+                task_ids.update(task.pk for task in new_tasks)
+            else:
+                # MySQL does not return the new ids
+                task_ids.update(HousekeepingTask.objects.filter(
+                    pk__gt=last_id, room_id__in=[task.room_id for task in new_tasks],
+                ).values_list('pk', flat=True))
+
+        changed_tasks = _fetch_tasks(task_ids)
+        _announce(rooms.values(), changed_tasks, {task.pk: task.assigned_to_id for task in tasks.values()})
+    return list(rooms.values()), changed_tasks, len(new_tasks)
+
+
+def auto_assign(hotel_id, reassign=False):
+    """
+    Spreads the hotel's DIRTY tasks over its active housekeepers (see scheduling.py).
+    Only unassigned tasks move unless ``reassign`` is set. Tasks in progress stay put
+    but count towards their housekeeper's load.
+    Returns (changed tasks, {user_id: open tasks held afterwards}).
+    """
+    housekeepers = StaffProfile.objects.filter(
+        hotel_id=hotel_id, role=StaffProfile.RoleChoices.HOUSEKEEPER, status='Active',
+    ).values_list('user_id', flat=True)
+    loads = {user_id: 0 for user_id in housekeepers}
+    if not loads:
+        return [], {}
+
+    with transaction.atomic():
+        pending, previous, current_floors = [], {}, {}
+        # Locked until the assignments are written, so a concurrent run or a status
+        # change cannot act on the loads read here; only the task rows are locked
+        open_tasks = HousekeepingTask.objects.select_for_update(of=('self',)).filter(
+            room__room_type__hotel_id=hotel_id, status__in=OPEN_TASK_STATUSES,
+        ).order_by('id').values_list('id', 'status', 'assigned_to_id', 'room__floor')
+        for task_id, status, user_id, floor in open_tasks:
+            if status == HousekeepingTask.TaskStatus.DIRTY and (user_id is None or reassign):
+                pending.append((task_id, floor))
+                previous[task_id] = user_id
+            elif user_id in loads:
+                loads[user_id] += 1
+                if status == HousekeepingTask.TaskStatus.IN_PROGRESS or user_id not in current_floors:
+                    current_floors[user_id] = floor
+
+        assignments = assign_tasks(pending, loads, current_floors)
+        for user_id in assignments.values():
+            loads[user_id] += 1
+        changed = {task_id: user_id for task_id, user_id in assignments.items() if previous[task_id] != user_id}
+        HousekeepingTask.objects.bulk_update(
+            [HousekeepingTask(pk=task_id, assigned_to_id=user_id) for task_id, user_id in changed.items()],
+            ['assigned_to'], batch_size=500,
+        )
+        tasks = _fetch_tasks(changed)
+        _announce([], tasks, {task_id: previous[task_id] for task_id in changed})
+    return tasks, loads
+
+
+def _fetch_tasks(task_ids):
+    return list(
+        HousekeepingTask.objects.filter(pk__in=task_ids)
+        .select_related('room', 'assigned_to').annotate(hotel_id=F('room__room_type__hotel_id'))
+        .order_by('id')
+    )
+
+
+def _announce(rooms, tasks, previous_assignees):
+    hotels = {room.hotel_id for room in rooms} | {task.hotel_id for task in tasks}
+    for hotel_id in hotels:
+        if rooms:
+            bump_model_version(Room, hotel_id)
+        if tasks:
+            bump_model_version(HousekeepingTask, hotel_id)
+    for room in rooms:
+        publish_housekeeping(room.hotel_id, 'room.updated', room_payload(room))
+    for task in tasks:
+        payload = dict(HousekeepingTaskSerializer(task).data)
+        payload['previous_assigned_to'] = previous_assignees.get(task.pk, task.assigned_to_id)
+        publish_housekeeping(task.hotel_id, 'task.updated' if task.pk in previous_assignees else 'task.created', payload)
@@ -0,0 +1,333 @@
+"""
+Bulk import of rooms, guests and historical bookings from CSV or JSON Lines.
+
+Rows are streamed and handled one chunk at a time: the chunk is validated, its
+foreign keys are resolved through in-memory maps (the hotel's room types and rooms,
+the chunk's guests by e-mail) and the valid rows are written with bulk_create in a
+single transaction, so memory stays flat whatever the file size.
+
+bulk_create sends no model signals, so the importers keep the RoomNight ledger,
+the daily rollup, the dashboard and the polling versions up to date themselves.
+"""
+import csv
+import io
+import json
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Max
+from django.db.models.functions import Lower
+
+from .analytics import refresh_daily_stats
+from .availability import booking_nights
+from .conditional import bump_model_version
+from .dashboard import invalidate_summary
+from .models import Booking, Guest, Room, RoomNight, RoomType
+from .pricing import price_stays
+
+DEFAULT_BATCH_SIZE = 1000
+
+FORMATS = ('csv', 'jsonl')
+
+# Days refreshed per rollup call after a booking import
+ROLLUP_CHUNK_DAYS = 31
+
+
+def read_rows(stream, fmt):
+    """Yields (line number, row dict, error) from a binary or text file."""
+    if isinstance(stream.read(0), bytes):
+        stream = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row, None
+        return
+    for line_number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_number, None, f"Invalid JSON: {e}"
+            continue
+        if not isinstance(row, dict):
+            yield line_number, None, "Each line must be a JSON object."
+            continue
+        yield line_number, row, None
+
+
+def _text(value):
+    return value.strip() if isinstance(value, str) else value
+
+
+def _clean(model, field_name, row, errors, key=None, required=True):
+    """Converts and validates one column with the model field's own rules."""
+    value = _text(row.get(key or field_name))
+    if value in (None, ''):
+        if required:
+            errors[key or field_name] = "This field is required."
+        return None
+    try:
+        return model._meta.get_field(field_name).clean(value, None)
+    except ValidationError as e:
+        errors[key or field_name] = ' '.join(e.messages)
+        return None
+
+
+class Importer:
+    """Turns a chunk of rows into unsaved objects and writes them in bulk."""
+    model = None
+
+    def __init__(self, hotel):
+        self.hotel = hotel
+
+    def build(self, rows):
+        """[(line, row)] -> ([(line, obj)], [(line, errors)])"""
+        raise NotImplementedError
+
+    def write(self, objects, batch_size):
+        self.model.objects.bulk_create(objects, batch_size=batch_size)
+
+    def finish(self):
+        """Runs once after the last chunk that wrote rows."""
+
+
+class RoomImporter(Importer):
+    """Columns: room_type (name), room_number, floor, status (optional)."""
+    model = Room
+
+    def __init__(self, hotel):
+        super().__init__(hotel)
+        self.room_types = {}
+        for room_type_id, name in RoomType.objects.filter(hotel=hotel).order_by('-id').values_list('id', 'name'):
+            self.room_types[name.strip().lower()] = room_type_id
+        self.numbers = set(Room.objects.filter(room_type__hotel=hotel).values_list('room_number', flat=True))
+
+    def build(self, rows):
+        objects, failures = [], []
+        for line, row in rows:
+            errors = {}
+            room_type_id = self.room_types.get(str(_text(row.get('room_type')) or '').lower())
+            if room_type_id is None:
+                errors['room_type'] = "Unknown room type."
+            number = _clean(Room, 'room_number', row, errors)
+            floor = _clean(Room, 'floor', row, errors)
+            status = _clean(Room, 'status', row, errors, required=False) or Room.RoomStatus.CLEAN
+            if number in self.numbers:
+                errors['room_number'] = "A room with this number already exists."
+            if errors:
+                failures.append((line, errors))
+                continue
+            self.numbers.add(number)
+            objects.append((line, Room(room_type_id=room_type_id, room_number=number, floor=floor, status=status)))
+        return objects, failures
+
+    def finish(self):
+        bump_model_version(Room, self.hotel.pk)
+        invalidate_summary(self.hotel.pk)
+
+
+class GuestImporter(Importer):
+    """Columns: name, email, phone, address (optional), preferences (optional JSON)."""
+    model = Guest
+
+    def build(self, rows):
+        emails = {str(_text(row.get('email')) or '').lower() for _, row in rows}
+        taken = set(
+            Guest.objects.annotate(email_lower=Lower('email')).filter(email_lower__in=emails)
+            .values_list('email_lower', flat=True)
+        )
+        objects, failures = [], []
+        for line, row in rows:
+            errors = {}
+            name = _clean(Guest, 'name', row, errors)
+            email = _clean(Guest, 'email', row, errors)
+            phone = _clean(Guest, 'phone', row, errors)
+            address = _clean(Guest, 'address', row, errors, required=False)
+            preferences = _text(row.get('preferences')) or {}
+            if isinstance(preferences, str):
+                try:
+                    preferences = json.loads(preferences)
+                except ValueError:
+                    errors['preferences'] = "Must be a JSON object."
+            if email and email.lower() in taken:
+                errors['email'] = "A guest with this email already exists."
+            if errors:
+                failures.append((line, errors))
+                continue
+            taken.add(email.lower())
+            objects.append((line, Guest(name=name, email=email, phone=phone, address=address, preferences=preferences)))
+        return objects, failures
+
+    def finish(self):
+        bump_model_version(Guest, None)
+        # Guests are shared between hotels
+        invalidate_summary()
+
+
+class BookingImporter(Importer):
+    """
+    Columns: guest_email, room_type (name), room_number (optional), check_in, check_out,
+    status (optional), total_price (optional, priced like a new booking when empty),
+    special_requests (optional).
+    """
+    model = Booking
+
+    def __init__(self, hotel):
+        super().__init__(hotel)
+        self.room_types = {}
+        for room_type in RoomType.objects.filter(hotel=hotel).order_by('-id'):
+            self.room_types[room_type.name.strip().lower()] = room_type
+        self.rooms = {
+            number: (room_id, room_type_id)
+            for room_id, number, room_type_id in
+            Room.objects.filter(room_type__hotel=hotel).order_by('-id').values_list('id', 'room_number', 'room_type_id')
+        }
+        self.touched_nights = set()
+
+    def build(self, rows):
+        emails = {str(_text(row.get('guest_email')) or '').lower() for _, row in rows}
+        guests = dict(
+            Guest.objects.annotate(email_lower=Lower('email')).filter(email_lower__in=emails)
+            .values_list('email_lower', 'id')
+        )
+
+        candidates, failures = [], []
+        for line, row in rows:
+            errors = {}
+            guest_id = guests.get(str(_text(row.get('guest_email')) or '').lower())
+            if guest_id is None:
+                errors['guest_email'] = "No guest with this email."
+            room_type = self.room_types.get(str(_text(row.get('room_type')) or '').lower())
+            if room_type is None:
+                errors['room_type'] = "Unknown room type."
+            room_id = None
+            number = _text(row.get('room_number'))
+            if number:
+                room_id, room_type_id = self.rooms.get(str(number), (None, None))
+                if room_id is None:
+                    errors['room_number'] = "Unknown room."
+                elif room_type is not None and room_type_id != room_type.pk:
+                    errors['room_number'] = "Room does not belong to this room type."
+            check_in = _clean(Booking, 'check_in', row, errors)
+            check_out = _clean(Booking, 'check_out', row, errors)
+            if check_in and check_out and check_out <= check_in:
+                errors['check_out'] = "Check-out must be after check-in."
+            status = _clean(Booking, 'status', row, errors, required=False) or Booking.BookingStatus.PENDING
+            total_price = _clean(Booking, 'total_price', row, errors, required=False)
+            special_requests = _clean(Booking, 'special_requests', row, errors, required=False)
+            if errors:
+                failures.append((line, errors))
+                continue
+            candidates.append((line, Booking(
+                hotel=self.hotel, guest_id=guest_id, room_type=room_type, room_id=room_id,
+                check_in=check_in, check_out=check_out, status=status,
+                total_price=total_price, special_requests=special_requests,
+            )))
+
+        objects = self._without_overlaps(candidates, failures)
+        unpriced = [booking for _, booking in objects if booking.total_price is None]
+        quotes = price_stays([(booking.room_type, booking.check_in, booking.check_out) for booking in unpriced])
+        for booking, quote in zip(unpriced, quotes):
+            booking.total_price = quote['total']
+        return objects, failures
+
+    def _without_overlaps(self, candidates, failures):
+        """Drops rows whose room is already occupied, in the ledger or earlier in the chunk."""
+        occupying = [booking for _, booking in candidates if booking_nights(booking)]
+        if not occupying:
+            return candidates
+        taken = set(
+            RoomNight.objects.filter(
+                room_id__in={booking.room_id for booking in occupying},
+                night__gte=min(booking.check_in for booking in occupying),
+                night__lt=max(booking.check_out for booking in occupying),
+            ).values_list('room_id', 'night')
+        )
+        objects = []
+        for line, booking in candidates:
+            nights = {(booking.room_id, night) for night in booking_nights(booking)}
+            if nights:
+                if nights & taken:
+                    failures.append((line, {'room_number': "The room is already booked for some of these nights."}))
+                    continue
+                taken |= nights
+            objects.append((line, booking))
+        return objects
+
+    def write(self, objects, batch_size):
+        last_id = Booking.objects.aggregate(last=Max('id'))['last'] or 0
+        Booking.objects.bulk_create(objects, batch_size=batch_size)
+        if not connection.features.can_return_rows_from_bulk_insert:
+            # MySQL does not return the new ids; they are handed out in insert order
+            ids = list(
+                Booking.objects.filter(pk__gt=last_id, hotel=self.hotel).order_by('id')
+                .values_list('id', flat=True)[:len(objects) + 1]
+            )
+            if len(ids) != len(objects):
+                raise DatabaseError("Bookings were written concurrently; the chunk was not imported.")
+            for booking, pk in zip(objects, ids):
+                booking.pk = pk
+
+        nights = [
+            RoomNight(room_id=booking.room_id, booking_id=booking.pk, night=night)
+            for booking in objects
+            for night in booking_nights(booking)
+        ]
+        RoomNight.objects.bulk_create(nights, batch_size=batch_size)
+        self.touched_nights.update(night.night for night in nights)
+
+    def finish(self):
+        days = sorted(self.touched_nights)
+        for start in range(0, len(days), ROLLUP_CHUNK_DAYS):
+            refresh_daily_stats(self.hotel.pk, days[start:start + ROLLUP_CHUNK_DAYS])
+        bump_model_version(Booking, self.hotel.pk)
+        invalidate_summary(self.hotel.pk)
+
+
+IMPORTERS = {
+    'rooms': RoomImporter,
+    'guests': GuestImporter,
+    'bookings': BookingImporter,
+}
+
+
+def run_import(kind, stream, fmt, hotel, batch_size=DEFAULT_BATCH_SIZE, dry_run=False, on_error=None):
+    """
+    Imports every row of ``stream`` into ``hotel``. ``on_error(line, errors)`` is called
+    for each rejected row. Returns {'rows', 'created', 'failed'} counts.
+    """
+    importer = IMPORTERS[kind](hotel)
+    report = on_error or (lambda line, errors: None)
+    counts = {'rows': 0, 'created': 0, 'failed': 0}
+    rows = read_rows(stream, fmt)
+    while True:
+        chunk = list(islice(rows, batch_size))
+        if not chunk:
+            break
+        counts['rows'] += len(chunk)
+        parsed = []
+        for line, row, error in chunk:
+            if error:
+                counts['failed'] += 1
+                report(line, {'row': error})
+            else:
+                parsed.append((line, row))
+
+        objects, failures = importer.build(parsed)
+        if objects and not dry_run:
+            try:
+                with transaction.atomic():
+                    importer.write([obj for _, obj in objects], batch_size)
+            except DatabaseError as e:
+                failures.extend((line, {'row': f"Chunk rejected by the database: {e}"}) for line, _ in objects)
+                objects = []
+        counts['created'] += len(objects)
+        counts['failed'] += len(failures)
+        for line, errors in sorted(failures, key=lambda failure: failure[0]):
+            report(line, errors)
+
+    if counts['created']:
+        importer.finish()
+    return counts
@@ -0,0 +1,40 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from Hotel.importers import DEFAULT_BATCH_SIZE, FORMATS, IMPORTERS, run_import
+from Hotel.models import Hotel
+
+
+class Command(BaseCommand):
+    help = "Imports rooms, guests or bookings for one hotel from a CSV or JSON Lines file."
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(IMPORTERS))
+        parser.add_argument('path')
+        parser.add_argument('--hotel', type=int, required=True, help="Hotel the rows belong to.")
+        parser.add_argument('--format', dest='file_format', choices=FORMATS, help="Defaults to the file extension.")
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help="Rows per chunk and INSERT.")
+        parser.add_argument('--dry-run', action='store_true', help="Validate without writing anything.")
+
+    def handle(self, *args, **options):
+        hotel = Hotel.objects.filter(pk=options['hotel']).first()
+        if hotel is None:
+            raise CommandError(f"Hotel {options['hotel']} does not exist.")
+        file_format = options['file_format'] or os.path.splitext(options['path'])[1].lstrip('.').lower()
+        if file_format not in FORMATS:
+            raise CommandError("Pass --format csv or --format jsonl.")
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be positive.")
+
+        def report(line, errors):
+            details = '; '.join(f"{field}: {message}" for field, message in errors.items())
+            self.stderr.write(f"line {line}: {details}")
+
+        with open(options['path'], 'rb') as stream:
+            counts = run_import(
+                options['kind'], stream, file_format, hotel,
+                batch_size=options['batch_size'], dry_run=options['dry_run'], on_error=report,
+            )
+        verb = "would be imported" if options['dry_run'] else "imported"
+        self.stdout.write(f"{counts['created']} of {counts['rows']} {options['kind']} {verb}, {counts['failed']} rejected.")
@@ -0,0 +1,58 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, close_old_connections, connection
+
+from Hotel.payhere import process_batch
+
+
+class Command(BaseCommand):
+    help = "Processes queued PayHere notifications. Runs until stopped unless --once is given."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=1, help="Worker threads, each claiming its own batches.")
+        parser.add_argument('--batch-size', type=int, default=50, help="Notifications claimed per transaction.")
+        parser.add_argument('--idle-sleep', type=float, default=1.0, help="Seconds to wait when the queue is empty.")
+        parser.add_argument('--once', action='store_true', help="Drain what is due now, then exit.")
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1 or options['batch_size'] < 1:
+            raise CommandError("--workers and --batch-size must be positive.")
+        self.total = 0
+        self.lock = threading.Lock()
+
+        threads = [
+            threading.Thread(target=self.work, args=(options,), name=f'payhere-worker-{i}', daemon=True)
+            for i in range(options['workers'])
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(timeout=1)
+        except KeyboardInterrupt:
+            self.stdout.write("Stopping.")
+        self.stdout.write(f"Processed {self.total} notifications.")
+
+    def work(self, options):
+        try:
+            while True:
+                close_old_connections()
+                try:
+                    handled = process_batch(options['batch_size'])
+                except DatabaseError as e:
+                    # Lock timeouts, deadlocks or a lost connection: the batch was rolled back
+                    self.stderr.write(f"{threading.current_thread().name}: {e}")
+                    connection.close()
+                    time.sleep(options['idle_sleep'])
+                    continue
+                with self.lock:
+                    self.total += handled
+                if not handled:
+                    if options['once']:
+                        return
+                    time.sleep(options['idle_sleep'])
+        finally:
+            connection.close()
@@ -0,0 +1,39 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from Hotel.analytics import refresh_daily_stats
+from Hotel.models import Hotel
+
+# Days recomputed per refresh call, to keep each transaction small
+CHUNK_DAYS = 31
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the DailyStat analytics rollup for a date range (defaults to a year either side of today)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='start', help="First day to rebuild (YYYY-MM-DD).")
+        parser.add_argument('--to', dest='end', help="Day after the last one to rebuild (YYYY-MM-DD).")
+        parser.add_argument('--hotel', type=int, help="Only rebuild this hotel.")
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+        start = parse_date(options['start']) if options['start'] else today - timedelta(days=365)
+        end = parse_date(options['end']) if options['end'] else today + timedelta(days=365)
+        if not (start and end) or end <= start:
+            raise CommandError("--to must be a date after --from.")
+
+        hotels = Hotel.objects.all()
+        if options['hotel']:
+            hotels = hotels.filter(pk=options['hotel'])
+
+        for hotel_id in hotels.values_list('id', flat=True):
+            day = start
+            while day < end:
+                chunk_end = min(day + timedelta(days=CHUNK_DAYS), end)
+                refresh_daily_stats(hotel_id, [day + timedelta(days=i) for i in range((chunk_end - day).days)])
+                day = chunk_end
+            self.stdout.write(f"Rebuilt hotel {hotel_id} from {start} to {end}.")
@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, close_old_connections, connection
+
+from Hotel.availability import RELEASE_BATCH_SIZE, release_expired_holds
+
+
+class Command(BaseCommand):
+    help = "Cancels unpaid online bookings whose hold ran out. Runs until stopped unless --once is given."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=RELEASE_BATCH_SIZE, help="Bookings cancelled per transaction.")
+        parser.add_argument('--interval', type=float, default=60.0, help="Seconds between sweeps.")
+        parser.add_argument('--once', action='store_true', help="Release what has expired now, then exit.")
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be positive.")
+        total = 0
+        try:
+            while True:
+                close_old_connections()
+                try:
+                    total += release_expired_holds(options['batch_size'])
+                except DatabaseError as e:
+                    # Lock timeouts, deadlocks or a lost connection: the batch was rolled back
+                    self.stderr.write(str(e))
+                    connection.close()
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            self.stdout.write("Stopping.")
+        finally:
+            connection.close()
+        self.stdout.write(f"Released {total} bookings.")
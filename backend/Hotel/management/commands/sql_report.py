@@ -0,0 +1,47 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from Hotel.sqlstats import build_report, set_config
+
+
+class Command(BaseCommand):
+    help = "Ranks captured SQL fingerprints by total time, count or p95, and switches capture on or off."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--order', choices=['total', 'count', 'p95'], default='total')
+        parser.add_argument('--limit', type=int, default=20)
+        parser.add_argument('--view', help="Only statements run by this view, e.g. booking-list.")
+        parser.add_argument('--json', action='store_true', help="Print the report as JSON.")
+        switch = parser.add_mutually_exclusive_group()
+        switch.add_argument('--enable', action='store_true', help="Start capturing in every process.")
+        switch.add_argument('--disable', action='store_true', help="Stop capturing.")
+        parser.add_argument('--sample-rate', type=float, help="Share of requests captured, above 0 and at most 1.")
+        parser.add_argument('--reset', action='store_true', help="Drop everything captured so far.")
+
+    def handle(self, *args, **options):
+        sample_rate = options['sample_rate']
+        if sample_rate is not None and not 0 < sample_rate <= 1:
+            raise CommandError("--sample-rate must be above 0 and at most 1.")
+        enabled = True if options['enable'] else False if options['disable'] else None
+        if enabled is not None or sample_rate is not None or options['reset']:
+            config = set_config(enabled, sample_rate, reset=options['reset'])
+            self.stdout.write(f"Capture {'on' if config['enabled'] else 'off'}, sample rate {config['sample_rate']}.")
+            return
+
+        report = build_report(view=options['view'], limit=options['limit'], order=options['order'])
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        self.stdout.write(
+            f"Capture {'on' if report['enabled'] else 'off'} at {report['sample_rate']:.0%} of requests; "
+            f"{report['sampled_requests']} sampled requests from {report['processes']} processes."
+        )
+        for rank, row in enumerate(report['fingerprints'], 1):
+            self.stdout.write(
+                f"\n{rank:>3}. {row['total_ms']:>10.1f}ms total  {row['count']:>7} calls  "
+                f"mean {row['mean_ms']:.2f}ms  p95 {row['p95_ms']:.2f}ms"
+            )
+            self.stdout.write(f"     {row['fingerprint']}")
+            for view in row['views']:
+                self.stdout.write(f"       {view['view']}: {view['count']} calls, {view['per_request']}/request, {view['total_ms']:.1f}ms")
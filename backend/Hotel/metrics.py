@@ -0,0 +1,251 @@
+"""
+Per-request performance metrics, exposed in Prometheus text format at /metrics/
+to staff users and to scrapers holding METRICS_TOKEN.
+
+metrics_middleware times every request and, through connection.execute_wrapper,
+counts its queries and SQL time. Totals are kept in process per route (the URL
+name, e.g. "booking-list") and method: a latency histogram, query and SQL-time
+totals, response bytes and a count per status code. Requests slower than
+METRICS_SLOW_REQUEST_SECONDS are logged with their most expensive statements.
+Under ASGI the wrapper goes on the connection of the worker thread that runs the
+request's sync code, where the queries are made.
+
+Each worker process keeps its own totals, so Prometheus should scrape every worker
+(or run one metrics-serving process per container).
+"""
+import heapq
+import logging
+import threading
+import time
+from bisect import bisect_left
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+from django.utils.decorators import sync_and_async_middleware
+from rest_framework import exceptions
+
+from .authentication import CachedTokenAuthentication
+from .payhere import queue_stats
+from .sqlstats import record_request, should_sample
+
+logger = logging.getLogger(__name__)
+
+METRICS_SLOW_REQUEST_SECONDS = getattr(settings, 'METRICS_SLOW_REQUEST_SECONDS', 1.0)
+METRICS_SLOW_TOP_SQL = getattr(settings, 'METRICS_SLOW_TOP_SQL', 5)
+# Scrapers without a staff login send "Authorization: Bearer <token>" when this is set
+METRICS_TOKEN = getattr(settings, 'METRICS_TOKEN', None)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class RouteStats:
+    __slots__ = ('buckets', 'requests', 'seconds', 'queries', 'sql_seconds', 'response_bytes', 'statuses')
+
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.requests = 0
+        self.seconds = 0.0
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.response_bytes = 0
+        self.statuses = {}
+
+
+class Registry:
+    def __init__(self):
+        self._routes = {}
+        self._lock = threading.Lock()
+
+    def record(self, route, method, status, seconds, queries, sql_seconds, response_bytes):
+        with self._lock:
+            stats = self._routes.get((route, method))
+            if stats is None:
+                stats = self._routes[(route, method)] = RouteStats()
+            stats.buckets[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+            stats.requests += 1
+            stats.seconds += seconds
+            stats.queries += queries
+            stats.sql_seconds += sql_seconds
+            stats.response_bytes += response_bytes
+            stats.statuses[status] = stats.statuses.get(status, 0) + 1
+
+    def snapshot(self):
+        with self._lock:
+            return sorted(
+                (key, stats.buckets[:], stats.requests, stats.seconds, stats.queries,
+                 stats.sql_seconds, stats.response_bytes, dict(stats.statuses))
+                for key, stats in self._routes.items()
+            )
+
+    def reset(self):
+        with self._lock:
+            self._routes.clear()
+
+
+registry = Registry()
+
+
+class QueryTimer:
+    """
+    execute_wrapper that counts a request's queries and keeps its slowest statements;
+    with ``capture`` every statement is kept too, for the SQL fingerprint report.
+    """
+    __slots__ = ('count', 'seconds', 'slowest', 'statements')
+
+    def __init__(self, capture=False):
+        self.count = 0
+        self.seconds = 0.0
+        self.slowest = []
+        self.statements = [] if capture else None
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.count += 1
+            self.seconds += elapsed
+            if self.statements is not None:
+                self.statements.append((sql, elapsed))
+            if len(self.slowest) < METRICS_SLOW_TOP_SQL:
+                heapq.heappush(self.slowest, (elapsed, sql))
+            elif elapsed > self.slowest[0][0]:
+                heapq.heapreplace(self.slowest, (elapsed, sql))
+
+
+def _route(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    return match.view_name or match.route
+
+
+def _response_bytes(response):
+    if response.streaming:
+        return int(response.get('Content-Length') or 0)
+    return len(response.content)
+
+
+def _record(request, response, seconds, timer=None):
+    queries, sql_seconds = (timer.count, timer.seconds) if timer else (0, 0.0)
+    route = _route(request)
+    registry.record(route, request.method, response.status_code, seconds, queries, sql_seconds, _response_bytes(response))
+    if timer and timer.statements is not None:
+        record_request(route, timer.statements)
+    if seconds >= METRICS_SLOW_REQUEST_SECONDS:
+        top = sorted(timer.slowest, reverse=True) if timer else []
+        logger.warning(
+            "Slow request %s %s (%s) %s: %.3fs, %d queries, %.3fs SQL%s",
+            request.method, request.path, route, response.status_code, seconds, queries, sql_seconds,
+            ''.join(f"\n  {elapsed * 1000:.1f}ms {sql}" for elapsed, sql in top),
+        )
+
+
+def _attach(timer):
+    """Hooks ``timer`` into the connection of the calling thread and returns that connection."""
+    db = connections[DEFAULT_DB_ALIAS]
+    db.execute_wrappers.append(timer)
+    return db
+
+
+@sync_and_async_middleware
+def metrics_middleware(get_response):
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            # Under ASGI sync views and middleware run in the request's thread-sensitive
+            # worker thread, which has its own connection: the timer is attached there
+            timer = QueryTimer(capture=should_sample())
+            start = time.perf_counter()
+            db = await sync_to_async(_attach)(timer)
+            try:
+                response = await get_response(request)
+            finally:
+                db.execute_wrappers.remove(timer)
+            _record(request, response, time.perf_counter() - start, timer)
+            return response
+    else:
+        def middleware(request):
+            timer = QueryTimer(capture=should_sample())
+            start = time.perf_counter()
+            with connection.execute_wrapper(timer):
+                response = get_response(request)
+            _record(request, response, time.perf_counter() - start, timer)
+            return response
+    return middleware
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items())
+
+
+def render_metrics():
+    lines = []
+
+    def family(name, kind, help_text):
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+
+    snapshot = registry.snapshot()
+    family('hotel_http_request_duration_seconds', 'histogram', 'Request latency by route.')
+    for (route, method), buckets, requests, seconds, *_ in snapshot:
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS + ('+Inf',), buckets):
+            cumulative += count
+            lines.append(f'hotel_http_request_duration_seconds_bucket{{{_labels(route=route, method=method, le=bound)}}} {cumulative}')
+        lines.append(f'hotel_http_request_duration_seconds_sum{{{_labels(route=route, method=method)}}} {seconds:.6f}')
+        lines.append(f'hotel_http_request_duration_seconds_count{{{_labels(route=route, method=method)}}} {requests}')
+
+    family('hotel_http_requests_total', 'counter', 'Requests by route and status code.')
+    for (route, method), *_, statuses in snapshot:
+        for status, count in sorted(statuses.items()):
+            lines.append(f'hotel_http_requests_total{{{_labels(route=route, method=method, status=status)}}} {count}')
+
+    for name, index, help_text in (
+        ('hotel_db_queries_total', 4, 'Database queries run while serving the route.'),
+        ('hotel_db_query_seconds_total', 5, 'Time spent in database queries while serving the route.'),
+        ('hotel_http_response_bytes_total', 6, 'Response body bytes sent by the route (streams only when sized).'),
+    ):
+        family(name, 'counter', help_text)
+        for row in snapshot:
+            (route, method), value = row[0], row[index]
+            value = f'{value:.6f}' if isinstance(value, float) else value
+            lines.append(f'{name}{{{_labels(route=route, method=method)}}} {value}')
+
+    queue = queue_stats()
+    for key, help_text in (
+        ('depth', 'PayHere notifications waiting to be processed.'),
+        ('due', 'Queued PayHere notifications due for an attempt now.'),
+        ('retrying', 'Queued PayHere notifications that already failed at least once.'),
+        ('oldest_pending_age_seconds', 'Age of the oldest queued PayHere notification.'),
+    ):
+        family(f'hotel_payhere_queue_{key}', 'gauge', help_text)
+        lines.append(f'hotel_payhere_queue_{key} {queue[key] or 0}')
+    return '\n'.join(lines) + '\n'
+
+
+def _may_scrape(request):
+    """The METRICS_TOKEN bearer, or a staff user logged in by session or API token."""
+    if METRICS_TOKEN and constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {METRICS_TOKEN}'):
+        return True
+    user = getattr(request, 'user', None)
+    if not (user and user.is_authenticated):
+        try:
+            user, _ = CachedTokenAuthentication().authenticate(request) or (None, None)
+        except exceptions.AuthenticationFailed:
+            user = None
+    return bool(user and (user.is_staff or user.is_superuser))
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint, closed to everyone but staff and the METRICS_TOKEN holder."""
+    if not _may_scrape(request):
+        return HttpResponseForbidden()
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,50 @@
+# Generated by Django 5.2 on 2026-10-18 14:51
+
+import datetime
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_room_nights(apps, schema_editor):
+    Booking = apps.get_model('Hotel', 'Booking')
+    RoomNight = apps.get_model('Hotel', 'RoomNight')
+    bookings = Booking.objects.filter(
+        room__isnull=False, status__in=['CONFIRMED', 'CHECKED_IN']
+    ).values_list('id', 'room_id', 'check_in', 'check_out')
+
+    batch = []
+    for booking_id, room_id, check_in, check_out in bookings.iterator(chunk_size=2000):
+        for offset in range((check_out - check_in).days):
+            batch.append(RoomNight(
+                booking_id=booking_id, room_id=room_id,
+                night=check_in + datetime.timedelta(days=offset),
+            ))
+        if len(batch) >= 5000:
+            RoomNight.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    RoomNight.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Hotel', '0018_promobanner'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RoomNight',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('night', models.DateField()),
+                ('booking', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='nights', to='Hotel.booking')),
+                ('room', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='nights', to='Hotel.room')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['night', 'room'], name='roomnight_night_room_idx')],
+                'constraints': [models.UniqueConstraint(fields=('room', 'night'), name='unique_room_night')],
+            },
+        ),
+        migrations.RunPython(backfill_room_nights, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2 on 2026-10-18 15:10
+
+import datetime
+
+from django.db import migrations
+
+
+def backfill_pending_nights(apps, schema_editor):
+    # Pending bookings now hold their room, so they join the occupancy ledger
+    Booking = apps.get_model('Hotel', 'Booking')
+    RoomNight = apps.get_model('Hotel', 'RoomNight')
+    bookings = Booking.objects.filter(
+        room__isnull=False, status='PENDING'
+    ).values_list('id', 'room_id', 'check_in', 'check_out')
+
+    batch = []
+    for booking_id, room_id, check_in, check_out in bookings.iterator(chunk_size=2000):
+        for offset in range((check_out - check_in).days):
+            batch.append(RoomNight(
+                booking_id=booking_id, room_id=room_id,
+                night=check_in + datetime.timedelta(days=offset),
+            ))
+        if len(batch) >= 5000:
+            RoomNight.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    RoomNight.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def drop_pending_nights(apps, schema_editor):
+    RoomNight = apps.get_model('Hotel', 'RoomNight')
+    RoomNight.objects.filter(booking__status='PENDING').delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Hotel', '0019_roomnight'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_pending_nights, drop_pending_nights),
+    ]
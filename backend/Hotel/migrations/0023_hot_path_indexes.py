@@ -0,0 +1,40 @@
+# Generated by Django 5.2 on 2026-10-18 14:57
+
+import django.db.models.functions.text
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Hotel', '0022_keyset_pagination_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['room', 'status', 'check_in', 'check_out'], name='booking_room_stay_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['guest', '-check_in'], name='booking_guest_checkin_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['hotel', 'check_out'], name='booking_hotel_checkout_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='eventbooking',
+            index=models.Index(fields=['guest', '-created_at'], name='event_guest_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='guest',
+            index=models.Index(django.db.models.functions.text.Lower('email'), name='guest_email_lower_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payrollentry',
+            index=models.Index(fields=['staff', '-payment_date'], name='payroll_staff_date_idx'),
+        ),
+    ]
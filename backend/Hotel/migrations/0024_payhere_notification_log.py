@@ -0,0 +1,50 @@
+# Generated by Django 5.2 on 2026-10-18 15:12
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def prepare_unique_transaction_ids(apps, schema_editor):
+    Payment = apps.get_model('Hotel', 'Payment')
+    # Blank ids become NULL, which the unique constraint allows any number of times
+    Payment.objects.filter(transaction_id='').update(transaction_id=None)
+    # Payments duplicated by repeated notifications keep the id on the first row only
+    duplicated = (
+        Payment.objects.exclude(transaction_id=None).values('transaction_id')
+        .annotate(copies=Count('id')).filter(copies__gt=1).values_list('transaction_id', flat=True)
+    )
+    for transaction_id in list(duplicated):
+        extra = Payment.objects.filter(transaction_id=transaction_id).order_by('id').values_list('id', flat=True)[1:]
+        for payment_id in list(extra):
+            Payment.objects.filter(pk=payment_id).update(transaction_id=f'{transaction_id[:70]}-duplicate-{payment_id}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Hotel', '0023_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PayHereNotification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('payment_id', models.CharField(blank=True, db_index=True, max_length=100)),
+                ('order_id', models.CharField(blank=True, max_length=50)),
+                ('status_code', models.CharField(blank=True, max_length=5)),
+                ('payload', models.JSONField()),
+                ('signature_valid', models.BooleanField(default=False)),
+                ('outcome', models.CharField(blank=True, choices=[('PAID', 'Paid'), ('DUPLICATE', 'Duplicate'), ('NOT_PAID', 'Not Paid'), ('REJECTED', 'Rejected')], max_length=20)),
+                ('detail', models.CharField(blank=True, max_length=255)),
+                ('received_at', models.DateTimeField(auto_now_add=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.RunPython(prepare_unique_transaction_ids, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='payment',
+            name='transaction_id',
+            field=models.CharField(blank=True, max_length=100, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2 on 2026-10-18 15:13
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Hotel', '0024_payhere_notification_log'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payherenotification',
+            name='attempts',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='payherenotification',
+            name='last_error',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='payherenotification',
+            name='next_attempt_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AlterField(
+            model_name='payherenotification',
+            name='outcome',
+            field=models.CharField(blank=True, choices=[('PAID', 'Paid'), ('DUPLICATE', 'Duplicate'), ('NOT_PAID', 'Not Paid'), ('REJECTED', 'Rejected'), ('FAILED', 'Failed')], max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='payherenotification',
+            index=models.Index(fields=['processed_at', 'next_attempt_at'], name='payhere_queue_idx'),
+        ),
+    ]
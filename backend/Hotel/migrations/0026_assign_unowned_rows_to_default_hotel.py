@@ -0,0 +1,25 @@
+# Generated by Django 5.2 on 2026-10-18 16:40
+
+from django.db import migrations
+
+
+def assign_default_hotel(apps, schema_editor):
+    # Rows created through Hotel.objects.first() before any hotel existed have no
+    # hotel; they go to the default hotel so hotel-scoped lists still show them
+    Hotel = apps.get_model('Hotel', 'Hotel')
+    hotel_id = Hotel.objects.order_by('pk').values_list('pk', flat=True).first()
+    if hotel_id is None:
+        return
+    for name in ('Blog', 'FoodItem', 'PromoBanner'):
+        apps.get_model('Hotel', name).objects.filter(hotel=None).update(hotel_id=hotel_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Hotel', '0025_payhere_notification_queue'),
+    ]
+
+    operations = [
+        migrations.RunPython(assign_default_hotel, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2 on 2026-10-18 15:59
+
+import datetime
+
+from django.db import migrations, models
+
+
+def backfill_checked_out_nights(apps, schema_editor):
+    # Checked-out stays keep their nights in the ledger so they count as sold. The
+    # day guests left was not recorded before, so the whole stay is taken; a night
+    # re-let after an early departure keeps its newer booking.
+    Booking = apps.get_model('Hotel', 'Booking')
+    RoomNight = apps.get_model('Hotel', 'RoomNight')
+    bookings = Booking.objects.filter(
+        room__isnull=False, status='CHECKED_OUT'
+    ).values_list('id', 'room_id', 'check_in', 'check_out')
+
+    batch = []
+    for booking_id, room_id, check_in, check_out in bookings.iterator(chunk_size=2000):
+        for offset in range((check_out - check_in).days):
+            batch.append(RoomNight(
+                booking_id=booking_id, room_id=room_id,
+                night=check_in + datetime.timedelta(days=offset),
+            ))
+        if len(batch) >= 5000:
+            RoomNight.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    RoomNight.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def drop_checked_out_nights(apps, schema_editor):
+    RoomNight = apps.get_model('Hotel', 'RoomNight')
+    RoomNight.objects.filter(booking__status='CHECKED_OUT').delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Hotel', '0026_assign_unowned_rows_to_default_hotel'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='checked_out_on',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_checked_out_nights, drop_checked_out_nights),
+    ]
@@ -0,0 +1,48 @@
+# Rollup rows for the bookings and payments that existed before 0021_dailystat
+
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import migrations
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def backfill_daily_stats(apps, schema_editor):
+    DailyStat = apps.get_model('Hotel', 'DailyStat')
+    RoomNight = apps.get_model('Hotel', 'RoomNight')
+    Payment = apps.get_model('Hotel', 'Payment')
+
+    rows = defaultdict(lambda: [0, Decimal('0')])
+    sold = (
+        RoomNight.objects.values('night', 'room__room_type__hotel_id', 'room__room_type')
+        .annotate(sold=Count('id'))
+    )
+    for row in sold.iterator(chunk_size=2000):
+        rows[(row['room__room_type__hotel_id'], row['night'], row['room__room_type'])][0] = row['sold']
+
+    revenue = (
+        Payment.objects.filter(status='COMPLETED')
+        .annotate(day=TruncDate('payment_date'))
+        .values('day', 'invoice__booking__hotel_id', 'invoice__booking__room_type')
+        .annotate(total=Sum('amount'))
+    )
+    for row in revenue.iterator(chunk_size=2000):
+        rows[(row['invoice__booking__hotel_id'], row['day'], row['invoice__booking__room_type'])][1] = row['total']
+
+    DailyStat.objects.all().delete()
+    DailyStat.objects.bulk_create([
+        DailyStat(hotel_id=hotel_id, date=day, room_type_id=room_type_id, rooms_sold=count, revenue=total)
+        for (hotel_id, day, room_type_id), (count, total) in rows.items()
+    ], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Hotel', '0027_booking_checked_out_on'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_daily_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2 on 2026-10-18 16:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Hotel', '0029_booking_hold_expires_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['hotel', '-check_in', '-id'], name='booking_hotel_checkin_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='foodorder',
+            index=models.Index(fields=['hotel', '-created_at', '-id'], name='foodorder_hotel_created_idx'),
+        ),
+    ]
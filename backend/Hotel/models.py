@@ -1,6 +1,8 @@
 from django.db import models
+from django.db.models.functions import Lower
 from django.contrib.auth.models import User
 from django.conf import settings
+from django.utils import timezone
 
 # --- 1. Authentication & Hotel Configuration ---
 
@@ -127,6 +129,12 @@ class Guest(models.Model):
     address = models.TextField(blank=True, null=True)
     preferences = models.JSONField(default=dict, blank=True) 
 
+    class Meta:
+        indexes = [
+            # Case-insensitive lookups by email (GuestViewSet ?email=)
+            models.Index(Lower('email'), name='guest_email_lower_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -150,10 +158,84 @@ class Booking(models.Model):
     status = models.CharField(max_length=20, choices=BookingStatus.choices, default=BookingStatus.PENDING)
     total_price = models.DecimalField(max_digits=10, decimal_places=2)
     special_requests = models.TextField(blank=True, null=True)
+    # Day the guest actually left; nights from then on were not stayed
+    checked_out_on = models.DateField(null=True, blank=True)
+    # Online bookings hold their room only until then while unpaid (see availability.release_expired_holds)
+    hold_expires_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Keyset pagination order of /bookings/, for unscoped and hotel-scoped lists
+            models.Index(fields=['-check_in', '-id'], name='booking_checkin_id_idx'),
+            models.Index(fields=['hotel', '-check_in', '-id'], name='booking_hotel_checkin_id_idx'),
+            # Per-room overlap checks
+            models.Index(fields=['room', 'status', 'check_in', 'check_out'], name='booking_room_stay_idx'),
+            # A guest's bookings, newest first (?guest=)
+            models.Index(fields=['guest', '-check_in'], name='booking_guest_checkin_idx'),
+            # Today's departures on the dashboard
+            models.Index(fields=['hotel', 'check_out'], name='booking_hotel_checkout_idx'),
+            # Unpaid online holds that ran out
+            models.Index(fields=['status', 'hold_expires_at'], name='booking_status_hold_idx'),
+        ]
+
+    # Statuses that hold the assigned room for the stay. Pending bookings hold it too,
+    # otherwise two guests paying at the same time could be given the same room; an
+    # online one that is never paid is cancelled once its hold_expires_at passes.
+    OCCUPYING_STATUSES = (BookingStatus.PENDING, BookingStatus.CONFIRMED, BookingStatus.CHECKED_IN)
+
+    # Booking lifecycle: the statuses each status may move to
+    ALLOWED_TRANSITIONS = {
+        BookingStatus.PENDING: (BookingStatus.CONFIRMED, BookingStatus.CHECKED_IN, BookingStatus.CANCELLED),
+        BookingStatus.CONFIRMED: (BookingStatus.CHECKED_IN, BookingStatus.CANCELLED),
+        BookingStatus.CHECKED_IN: (BookingStatus.CHECKED_OUT,),
+        BookingStatus.CHECKED_OUT: (),
+        BookingStatus.CANCELLED: (),
+    }
 
     def __str__(self):
         return f"Booking {self.id} for {self.guest.name}"
 
+class RoomNight(models.Model):
+    """
+    Per-night occupancy ledger: one row for every night a room is held by a booking,
+    including the nights a checked-out guest stayed (see availability.booking_nights).
+    Kept in sync with Booking by signals so availability checks never scan booking history.
+    """
+    room = models.ForeignKey(Room, on_delete=models.CASCADE, related_name="nights")
+    booking = models.ForeignKey(Booking, on_delete=models.CASCADE, related_name="nights")
+    night = models.DateField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['room', 'night'], name='unique_room_night'),
+        ]
+        indexes = [
+            models.Index(fields=['night', 'room'], name='roomnight_night_room_idx'),
+        ]
+
+    def __str__(self):
+        return f"Room {self.room_id} - {self.night}"
+
+class DailyStat(models.Model):
+    """
+    Daily rollup of rooms sold and payment revenue per hotel and room type.
+    Refreshed for the affected days whenever a booking or payment changes, so
+    analytics read a few hundred rows instead of the raw booking and payment tables.
+    """
+    hotel = models.ForeignKey(Hotel, on_delete=models.CASCADE, related_name="daily_stats")
+    room_type = models.ForeignKey(RoomType, on_delete=models.CASCADE, related_name="daily_stats")
+    date = models.DateField()
+    rooms_sold = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0.00)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['hotel', 'date', 'room_type'], name='unique_daily_stat'),
+        ]
+
+    def __str__(self):
+        return f"{self.hotel_id} / {self.room_type_id} - {self.date}"
+
 # --- 4. Payment & Billing ---
 
 class Invoice(models.Model):
@@ -189,11 +271,18 @@ class Payment(models.Model):
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     payment_date = models.DateTimeField(auto_now_add=True)
     method = models.CharField(max_length=20, choices=PaymentMethod.choices)
-    transaction_id = models.CharField(max_length=100, blank=True, null=True)
+    # Gateway payment id; unique so a redelivered notification cannot pay twice
+    transaction_id = models.CharField(max_length=100, blank=True, null=True, unique=True)
     
     # New Field
     status = models.CharField(max_length=20, choices=PaymentStatus.choices, default=PaymentStatus.COMPLETED)
 
+    class Meta:
+        indexes = [
+            # Keyset pagination order of /payments/
+            models.Index(fields=['-payment_date', '-id'], name='payment_date_id_idx'),
+        ]
+
     def __str__(self):
         return f"{self.method} - {self.amount}"
 # --- 5. Housekeeping & Inventory ---
@@ -256,6 +345,12 @@ class PayrollEntry(models.Model):
     salary_amount = models.DecimalField(max_digits=10, decimal_places=2) 
     bonus_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
     payment_date = models.DateField()
+
+    class Meta:
+        indexes = [
+            # Payroll history of one staff member (?staff_id=), newest first
+            models.Index(fields=['staff', '-payment_date'], name='payroll_staff_date_idx'),
+        ]
     
     def __str__(self):
         return f"{self.staff.user.first_name} - {self.payment_date}"
@@ -294,9 +389,51 @@ class FoodOrder(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING')
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Keyset pagination order of /food-orders/, for unscoped and hotel-scoped lists
+            models.Index(fields=['-created_at', '-id'], name='foodorder_created_id_idx'),
+            models.Index(fields=['hotel', '-created_at', '-id'], name='foodorder_hotel_created_idx'),
+        ]
+
     def __str__(self):
         return f"Order {self.id} - {self.room_number}"
 
+class PayHereNotification(models.Model):
+    """
+    Append-only log of every PayHere notify delivery, stored as received.
+    It doubles as the processing queue: rows with no processed_at are pending,
+    and only the processing fields are filled in afterwards.
+    """
+    class Outcome(models.TextChoices):
+        PAID = 'PAID', 'Paid'
+        DUPLICATE = 'DUPLICATE', 'Duplicate'
+        NOT_PAID = 'NOT_PAID', 'Not Paid'
+        REJECTED = 'REJECTED', 'Rejected'
+        FAILED = 'FAILED', 'Failed'
+
+    payment_id = models.CharField(max_length=100, blank=True, db_index=True)
+    order_id = models.CharField(max_length=50, blank=True)
+    status_code = models.CharField(max_length=5, blank=True)
+    payload = models.JSONField()
+    signature_valid = models.BooleanField(default=False)
+    outcome = models.CharField(max_length=20, choices=Outcome.choices, blank=True)
+    detail = models.CharField(max_length=255, blank=True)
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            # Pending rows that are due, oldest first (the worker's claim query)
+            models.Index(fields=['processed_at', 'next_attempt_at'], name='payhere_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.order_id} {self.payment_id} ({self.outcome or 'new'})"
+
 class Blog(models.Model):
     hotel = models.ForeignKey(Hotel, on_delete=models.CASCADE, related_name="blogs", null=True, blank=True)
     title = models.CharField(max_length=255)
@@ -342,6 +479,12 @@ class EventBooking(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING')
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # A guest's event bookings (?guest=), newest first
+            models.Index(fields=['guest', '-created_at'], name='event_guest_created_idx'),
+        ]
+
     def __str__(self):
         return f"{self.event_type} - {self.guest.name}"
 
@@ -359,6 +502,12 @@ class ContactMessage(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING')
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Keyset pagination order of /contact-messages/
+            models.Index(fields=['-created_at', '-id'], name='contactmsg_created_id_idx'),
+        ]
+
     def __str__(self):
         return f"{self.subject} - {self.name}"
 
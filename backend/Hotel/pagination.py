@@ -0,0 +1,119 @@
+import base64
+import json
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset pagination on a composite (column, id) key, both descending: a page is
+    "rows where (column, id) < (last column, last id)", a range scan on the matching
+    index with no OFFSET and no COUNT(*), however many rows share a column value.
+
+    Requests that still send ?page= (e.g. the admin bookings table, which reads
+    ``count``) fall back to the project's page-number pagination.
+    """
+    ordering = ('-id',)
+    page_size = api_settings.PAGE_SIZE
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def _column(self):
+        # The column in front of the id tiebreaker, or None when the key is the id alone
+        return self.ordering[0].lstrip('-') if len(self.ordering) > 1 else None
+
+    def _position(self, row):
+        column = self._column()
+        return [getattr(row, column) if column else None, row.pk]
+
+    def _encode_cursor(self, row, reverse):
+        value, pk = self._position(row)
+        if hasattr(value, 'isoformat'):
+            value = value.isoformat()
+        raw = json.dumps({'v': value, 'id': pk, 'r': reverse}).encode('utf-8')
+        cursor = base64.urlsafe_b64encode(raw).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    def _decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+            column = self._column()
+            value = model._meta.get_field(column).to_python(cursor['v']) if column else None
+            return value, int(cursor['id']), bool(cursor['r'])
+        except (TypeError, ValueError, KeyError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def _beyond(self, value, pk, before):
+        # Rows after (value, pk) in descending key order, or before it when ``before``
+        column = self._column()
+        op = 'gt' if before else 'lt'
+        if column is None:
+            return Q(**{f'pk__{op}': pk})
+        # The redundant bound on the column alone is what lets the database seek into the
+        # index; for the OR on its own it scans from the top of the range instead
+        return Q(**{f'{column}__{op}e': value}) & (Q(**{f'{column}__{op}': value}) | Q(**{column: value, f'pk__{op}': pk}))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_number_paginator = None
+        if PageNumberPagination.page_query_param in request.query_params:
+            self.page_number_paginator = PageNumberPagination()
+            return self.page_number_paginator.paginate_queryset(queryset.order_by(*self.ordering), request, view)
+
+        self.base_url = request.build_absolute_uri()
+        cursor = self._decode_cursor(request, queryset.model)
+        reverse = cursor is not None and cursor[2]
+        if cursor is not None:
+            queryset = queryset.filter(self._beyond(cursor[0], cursor[1], before=reverse))
+        ordering = [field[1:] if field.startswith('-') else f'-{field}' for field in self.ordering] if reverse else self.ordering
+        rows = list(queryset.order_by(*ordering)[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+
+        self.next_link = self.previous_link = None
+        if rows:
+            if has_more or reverse:
+                self.next_link = self._encode_cursor(rows[-1], reverse=False)
+            if cursor is not None and (has_more or not reverse):
+                self.previous_link = self._encode_cursor(rows[0], reverse=True)
+        elif cursor is not None:
+            # Past either end: point back at the first page
+            self.previous_link = remove_query_param(self.base_url, self.cursor_query_param)
+        return rows
+
+    def get_paginated_response(self, data):
+        if self.page_number_paginator is not None:
+            return self.page_number_paginator.get_paginated_response(data)
+        return Response({'next': self.next_link, 'previous': self.previous_link, 'results': data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class BookingPagination(KeysetPagination):
+    ordering = ('-check_in', '-id')
+
+
+class PaymentPagination(KeysetPagination):
+    ordering = ('-payment_date', '-id')
+
+
+class CreatedAtPagination(KeysetPagination):
+    ordering = ('-created_at', '-id')
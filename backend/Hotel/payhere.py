@@ -0,0 +1,201 @@
+"""
+PayHere notify handling: signature check, an append-only log of deliveries that
+doubles as a database-backed queue, and idempotent processing.
+
+The notify endpoint only appends the delivery to the log and answers; the
+``process_payhere_notifications`` worker claims due rows in batches with
+SKIP LOCKED, so several workers can run side by side, and retries failures with
+exponential backoff.
+
+The gateway may deliver the same notification several times, even concurrently.
+Processing locks the booking's invoice, so deliveries for one order run one at a
+time, and a payment is only recorded for a payment_id not seen before; the unique
+Payment.transaction_id backs this up at the database level.
+"""
+import hashlib
+import hmac
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Avg, Count, DurationField, ExpressionWrapper, F, Max, Min, Q
+from django.utils import timezone
+
+from .models import Booking, Invoice, PayHereNotification, Payment
+
+SUCCESS_STATUS_CODE = '2'
+
+# Retry delay doubles from RETRY_BASE_SECONDS up to RETRY_MAX_SECONDS; a row that
+# still fails after MAX_ATTEMPTS is parked as FAILED for a person to look at
+RETRY_BASE_SECONDS = 5
+RETRY_MAX_SECONDS = 3600
+MAX_ATTEMPTS = 8
+
+Outcome = PayHereNotification.Outcome
+
+
+def _md5_upper(value):
+    return hashlib.md5(value.encode('utf-8')).hexdigest().upper()
+
+
+def notify_signature(data):
+    """
+    md5sig of a notification:
+    upper(md5(merchant_id + order_id + payhere_amount + payhere_currency + status_code + upper(md5(secret))))
+    """
+    return _md5_upper(''.join([
+        data.get('merchant_id', ''), data.get('order_id', ''), data.get('payhere_amount', ''),
+        data.get('payhere_currency', ''), data.get('status_code', ''),
+        _md5_upper(settings.PAYHERE_MERCHANT_SECRET),
+    ]))
+
+
+def signature_valid(data):
+    if data.get('merchant_id') != settings.PAYHERE_MERCHANT_ID:
+        return False
+    return hmac.compare_digest(notify_signature(data), data.get('md5sig', '').upper())
+
+
+def record_notification(data):
+    """Appends a delivery to the log, exactly as received."""
+    data = {key: str(value) for key, value in data.items()}
+    return PayHereNotification.objects.create(
+        payment_id=data.get('payment_id', '')[:100],
+        order_id=data.get('order_id', '')[:50],
+        status_code=data.get('status_code', '')[:5],
+        payload=data,
+        signature_valid=signature_valid(data),
+    )
+
+
+def _booking_id(order_id):
+    # Orders are created by payhere_init as "BK-<booking id>"
+    prefix, _, number = order_id.partition('-')
+    return int(number) if prefix == 'BK' and number.isdigit() else None
+
+
+def _apply(notification):
+    if not notification.signature_valid:
+        return Outcome.REJECTED, "Invalid signature."
+    booking_id = _booking_id(notification.order_id)
+    if booking_id is None:
+        return Outcome.REJECTED, "Unknown order id."
+    if notification.status_code != SUCCESS_STATUS_CODE:
+        return Outcome.NOT_PAID, f"Status code {notification.status_code}."
+    if not notification.payment_id:
+        return Outcome.REJECTED, "Missing payment_id."
+    try:
+        amount = Decimal(notification.payload.get('payhere_amount', ''))
+    except InvalidOperation:
+        return Outcome.REJECTED, "Invalid amount."
+
+    invoice = Invoice.objects.select_for_update().filter(booking_id=booking_id).order_by('id').first()
+    if invoice is None:
+        return Outcome.REJECTED, "No invoice for this booking."
+    # Locked so an expiring hold cannot cancel the booking while it is being paid
+    booking = Booking.objects.select_for_update().get(pk=booking_id)
+    if Payment.objects.filter(transaction_id=notification.payment_id).exists():
+        return Outcome.DUPLICATE, "Payment already recorded."
+    try:
+        with transaction.atomic():
+            Payment.objects.create(
+                invoice=invoice, amount=amount, method=Payment.PaymentMethod.PAYHERE,
+                transaction_id=notification.payment_id,
+            )
+    except IntegrityError:
+        return Outcome.DUPLICATE, "Payment already recorded."
+
+    if invoice.status != Invoice.InvoiceStatus.PAID:
+        invoice.status = Invoice.InvoiceStatus.PAID
+        invoice.save(update_fields=['status'])
+    if booking.status == Booking.BookingStatus.PENDING:
+        booking.status = Booking.BookingStatus.CONFIRMED
+        booking.save(update_fields=['status'])
+    elif booking.status == Booking.BookingStatus.CANCELLED:
+        # The money is recorded all the same; the guest is refunded or rebooked by staff
+        return Outcome.PAID, "Paid after the booking was cancelled."
+    return Outcome.PAID, ""
+
+
+def process_notification(notification):
+    """Applies a logged delivery and stores its outcome, all in one transaction."""
+    with transaction.atomic():
+        outcome, detail = _apply(notification)
+        notification.outcome = outcome
+        notification.detail = detail
+        notification.processed_at = timezone.now()
+        notification.save(update_fields=['outcome', 'detail', 'processed_at'])
+    return outcome
+
+
+def _retry_later(notification, error):
+    notification.attempts += 1
+    notification.last_error = f"{type(error).__name__}: {error}"
+    notification.detail = ""
+    if notification.attempts >= MAX_ATTEMPTS:
+        notification.outcome = Outcome.FAILED
+        notification.processed_at = timezone.now()
+    else:
+        delay = min(RETRY_BASE_SECONDS * 2 ** (notification.attempts - 1), RETRY_MAX_SECONDS)
+        notification.outcome = ""
+        notification.processed_at = None
+        notification.next_attempt_at = timezone.now() + timedelta(seconds=delay)
+    notification.save(update_fields=['attempts', 'last_error', 'detail', 'outcome', 'processed_at', 'next_attempt_at'])
+
+
+def process_batch(batch_size=50):
+    """
+    Claims up to ``batch_size`` due notifications, skipping rows other workers hold,
+    and processes them in one transaction. Returns how many were handled.
+
+    Each notification locks its order's invoice until the batch commits, so the batch
+    is processed in order id order: workers then take those locks in the same order
+    and cannot deadlock on two orders they both hold deliveries for.
+    """
+    with transaction.atomic():
+        batch = list(
+            PayHereNotification.objects.select_for_update(skip_locked=True)
+            .filter(processed_at=None, next_attempt_at__lte=timezone.now())
+            .order_by('next_attempt_at', 'id')[:batch_size]
+        )
+        batch.sort(key=lambda notification: (notification.order_id, notification.id))
+        for notification in batch:
+            try:
+                process_notification(notification)
+            except Exception as e:
+                # process_notification rolled back to its savepoint; the batch goes on
+                _retry_later(notification, e)
+    return len(batch)
+
+
+def _seconds(duration):
+    return round(duration.total_seconds(), 3) if duration is not None else None
+
+
+def queue_stats():
+    """Depth and latency of the notification queue."""
+    now = timezone.now()
+    pending = PayHereNotification.objects.filter(processed_at=None).aggregate(
+        depth=Count('id'),
+        due=Count('id', filter=Q(next_attempt_at__lte=now)),
+        retrying=Count('id', filter=Q(attempts__gt=0)),
+        oldest=Min('received_at'),
+    )
+    latency = ExpressionWrapper(F('processed_at') - F('received_at'), output_field=DurationField())
+    recent = PayHereNotification.objects.filter(processed_at__gte=now - timedelta(hours=1)).aggregate(
+        processed=Count('id'),
+        failed=Count('id', filter=Q(outcome=Outcome.FAILED)),
+        avg_latency=Avg(latency),
+        max_latency=Max(latency),
+    )
+    return {
+        'depth': pending['depth'],
+        'due': pending['due'],
+        'retrying': pending['retrying'],
+        'oldest_pending_age_seconds': _seconds(now - pending['oldest'] if pending['oldest'] else None),
+        'processed_last_hour': recent['processed'],
+        'failed_last_hour': recent['failed'],
+        'avg_latency_seconds': _seconds(recent['avg_latency']),
+        'max_latency_seconds': _seconds(recent['max_latency']),
+    }
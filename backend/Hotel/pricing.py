@@ -0,0 +1,136 @@
+"""
+Server-side stay pricing.
+
+Nights are charged at the room type's weekday or weekend rate, a coupon takes its
+percentage off the nights that fall inside its validity window, and the hotel's
+tax rate is added on top. Night counts come from numpy's vectorised business-day
+arithmetic, so a batch of thousands of stays is priced without walking nights.
+"""
+from decimal import Decimal, ROUND_HALF_UP
+
+import numpy as np
+
+from .availability import WEEKEND_NIGHTS, stay_nights
+from .hotel_config import get_hotel_config
+from .models import DiscountCoupon
+
+# busday_count weekmask (Monday first) that only counts weekend nights
+WEEKEND_MASK = ''.join('1' if day in WEEKEND_NIGHTS else '0' for day in range(7))
+
+CENTS = Decimal('0.01')
+HUNDRED = Decimal('100')
+
+
+def _money(value):
+    return value.quantize(CENTS, rounding=ROUND_HALF_UP)
+
+
+def find_coupon(code, hotel=None):
+    """
+    Active coupon for ``code`` (case-insensitive), or None. ``hotel`` may be a Hotel or its id.
+    Raises ValueError when ``code`` is given but is not a string.
+    """
+    if code is None:
+        return None
+    if not isinstance(code, str):
+        raise ValueError(code)
+    code = code.strip()
+    if not code:
+        return None
+    coupons = DiscountCoupon.objects.filter(code__iexact=code, is_active=True)
+    if hotel is not None:
+        coupons = coupons.filter(hotel=hotel)
+    return coupons.first()
+
+
+def count_nights(check_ins, check_outs):
+    """Vectorised (total_nights, weekend_nights) arrays for parallel arrays of stay dates."""
+    starts = np.asarray(check_ins, dtype='datetime64[D]')
+    ends = np.asarray(check_outs, dtype='datetime64[D]')
+    total = (ends - starts).astype(np.int64)
+    weekend = np.busday_count(starts, ends, weekmask=WEEKEND_MASK)
+    return total, weekend
+
+
+def _discounted_nights(check_ins, check_outs, coupon):
+    """Vectorised night counts of each stay that fall inside the coupon's validity window."""
+    starts = np.asarray(check_ins, dtype='datetime64[D]')
+    ends = np.asarray(check_outs, dtype='datetime64[D]')
+    window_start = np.maximum(starts, np.datetime64(coupon.valid_from, 'D'))
+    # valid_to is the last night the coupon applies to
+    window_end = np.minimum(ends, np.datetime64(coupon.valid_to, 'D') + 1)
+    window_end = np.where(window_end > window_start, window_end, window_start)
+    return count_nights(window_start, window_end)
+
+
+def price_stays(stays, coupon=None):
+    """
+    Prices many stays in one pass.
+
+    ``stays`` is a sequence of (room_type, check_in, check_out) with check_out after
+    check_in. Tax rate and currency come from the hotel settings cache, so the room
+    types' hotels need not be loaded. Returns one quote dict per stay.
+    """
+    if not stays:
+        return []
+
+    room_types, check_ins, check_outs = zip(*stays)
+    nights, weekend = count_nights(check_ins, check_outs)
+    if coupon is not None:
+        coupon_nights, coupon_weekend = _discounted_nights(check_ins, check_outs, coupon)
+    else:
+        coupon_nights = coupon_weekend = np.zeros(len(stays), dtype=np.int64)
+
+    quotes = []
+    for i, room_type in enumerate(room_types):
+        hotel = get_hotel_config(room_type.hotel_id)
+        weekend_nights = int(weekend[i])
+        weekday_nights = int(nights[i]) - weekend_nights
+        subtotal = room_type.price_weekday * weekday_nights + room_type.price_weekend * weekend_nights
+
+        discount = Decimal('0')
+        coupon_applied = coupon is not None and coupon.hotel_id == room_type.hotel_id and coupon_nights[i] > 0
+        if coupon_applied:
+            discounted_weekend = int(coupon_weekend[i])
+            discounted_weekday = int(coupon_nights[i]) - discounted_weekend
+            discounted = (
+                room_type.price_weekday * discounted_weekday
+                + room_type.price_weekend * discounted_weekend
+            )
+            discount = _money(discounted * coupon.discount_percent / HUNDRED)
+
+        taxable = subtotal - discount
+        tax = _money(taxable * Decimal(str(hotel.tax_rate)) / HUNDRED)
+        quotes.append({
+            'room_type': room_type.id,
+            'check_in': check_ins[i],
+            'check_out': check_outs[i],
+            'nights': int(nights[i]),
+            'weekday_nights': weekday_nights,
+            'weekend_nights': weekend_nights,
+            'price_weekday': room_type.price_weekday,
+            'price_weekend': room_type.price_weekend,
+            'subtotal': _money(subtotal),
+            'coupon': coupon.code if coupon_applied else None,
+            'discount': discount,
+            'tax_rate': hotel.tax_rate,
+            'tax': tax,
+            'total': _money(taxable + tax),
+            'currency': hotel.default_currency,
+        })
+    return quotes
+
+
+def quote_stay(room_type, check_in, check_out, coupon=None):
+    """Prices a single stay and adds the night-by-night rate breakdown."""
+    quote = price_stays([(room_type, check_in, check_out)], coupon)[0]
+    weekend = set(WEEKEND_NIGHTS)
+    quote['nightly'] = [
+        {
+            'night': night,
+            'weekend': night.weekday() in weekend,
+            'rate': room_type.price_weekend if night.weekday() in weekend else room_type.price_weekday,
+        }
+        for night in stay_nights(check_in, check_out)
+    ]
+    return quote
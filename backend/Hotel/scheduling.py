@@ -0,0 +1,49 @@
+"""
+Assignment of cleaning tasks to housekeepers.
+
+Two passes: a priority queue keyed on current load hands out task quotas so the
+busiest housekeeper ends up with as few tasks as possible (O(tasks log staff)),
+then tasks sorted by floor are dealt out in contiguous runs, each housekeeper
+starting near the floor they are already working on, which keeps floor changes
+to the runs' boundaries.
+"""
+import heapq
+from collections import Counter
+
+
+def balance_quotas(loads, task_count):
+    """{user_id: tasks already held} -> {user_id: new tasks to take}, least loaded first."""
+    heap = [(load, user_id) for user_id, load in loads.items()]
+    heapq.heapify(heap)
+    quotas = Counter()
+    for _ in range(task_count if heap else 0):
+        load, user_id = heap[0]
+        quotas[user_id] += 1
+        heapq.heapreplace(heap, (load + 1, user_id))
+    return quotas
+
+
+def assign_tasks(tasks, loads, current_floors=None):
+    """
+    tasks: [(task_id, floor)]; loads: {user_id: open tasks already held};
+    current_floors: {user_id: floor they are working on}.
+    Returns {task_id: user_id}. Nothing is assigned when there are no housekeepers.
+    """
+    current_floors = current_floors or {}
+    quotas = balance_quotas(loads, len(tasks))
+    ordered_tasks = sorted(tasks, key=lambda task: (task[1], task[0]))
+
+    # Housekeepers already on a floor take the runs there; the rest fill the gaps in between
+    lowest = ordered_tasks[0][1] if ordered_tasks else 0
+    staff = sorted(
+        (user_id for user_id in quotas if quotas[user_id]),
+        key=lambda user_id: (current_floors.get(user_id, lowest), loads[user_id], user_id),
+    )
+    assignments = {}
+    position = 0
+    for user_id in staff:
+        for task_id, _ in ordered_tasks[position:position + quotas[user_id]]:
+            assignments[task_id] = user_id
+        position += quotas[user_id]
+    return assignments
+
@@ -26,12 +26,14 @@ class BookingSerializer(serializers.ModelSerializer):
         model = Booking
         fields = [
             'id', 'hotel', 'guest', 'guest_name', 'room', 'room_type', 'room_type_name', # <-- ADDED 'hotel'
-            'check_in', 'check_out', 'status', 'total_price', 'special_requests'
+            'check_in', 'check_out', 'status', 'total_price', 'special_requests', 'checked_out_on',
+            'hold_expires_at',
         ]
         
         # --- ADDED THIS ---
         # Make 'hotel' read-only. The backend will set this automatically.
-        read_only_fields = ['hotel'] 
+        # total_price is always priced by the server (see pricing.py)
+        read_only_fields = ['hotel', 'total_price', 'checked_out_on', 'hold_expires_at']
         
         # Make foreign keys read-only=False so they can be set via ID
         extra_kwargs = {
@@ -39,6 +41,12 @@ class BookingSerializer(serializers.ModelSerializer):
             'room_type': {'required': True},
         }
 
+    def validate_status(self, value):
+        current = self.instance.status if self.instance else None
+        if current and value != current and value not in Booking.ALLOWED_TRANSITIONS.get(current, ()):
+            raise serializers.ValidationError(f"A {current} booking cannot be moved to {value}.")
+        return value
+
 # --- Room Configuration Serializers ---
 
 class AmenitySerializer(serializers.ModelSerializer):
@@ -213,6 +221,10 @@ class PaymentSerializer(serializers.ModelSerializer):
         model = Payment
         fields = ['id', 'invoice', 'invoice_number', 'guest_name', 'amount', 'payment_date', 'method', 'transaction_id', 'status']
 
+    def validate_transaction_id(self, value):
+        # Stored as NULL when blank, since transaction ids are unique
+        return value or None
+
 class InvoiceSerializer(serializers.ModelSerializer):
     payments = PaymentSerializer(many=True, read_only=True)
 
@@ -300,3 +312,20 @@ class PromoBannerSerializer(serializers.ModelSerializer):
         model = PromoBanner
         fields = ['id', 'hotel', 'title', 'message', 'link_text', 'link_url', 'style', 'is_active', 'created_at']
         read_only_fields = ['hotel', 'created_at']
+
+class RoomTransitionSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    status = serializers.ChoiceField(choices=Room.RoomStatus.choices)
+
+class TaskTransitionSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    status = serializers.ChoiceField(choices=HousekeepingTask.TaskStatus.choices)
+
+class BulkTransitionSerializer(serializers.Serializer):
+    rooms = RoomTransitionSerializer(many=True, required=False, default=list)
+    tasks = TaskTransitionSerializer(many=True, required=False, default=list)
+
+    def validate(self, attrs):
+        if not attrs['rooms'] and not attrs['tasks']:
+            raise serializers.ValidationError("Provide at least one room or task.")
+        return attrs
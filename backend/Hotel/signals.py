@@ -0,0 +1,163 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save, pre_delete
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .analytics import payment_day, refresh_daily_stats_on_commit
+from .authentication import invalidate_token, invalidate_user
+from .availability import sync_booking_nights
+from .caching import bump_version
+from .conditional import bump_model_version
+from .dashboard import invalidate_summary
+from .events import food_orders_channel, hub
+from .hotel_config import invalidate_hotel_config
+from .housekeeping import publish_housekeeping, room_payload
+from .models import (
+    Amenity, Blog, Booking, FoodItem, FoodOrder, Guest, Hotel, HousekeepingTask,
+    Invoice, Payment, PromoBanner, Room, RoomType, StaffProfile,
+)
+from .serializers import FoodOrderSerializer, HousekeepingTaskSerializer
+from .tenancy import forget_default_hotel
+
+
+@receiver(post_save, sender=Booking)
+def booking_saved(sender, instance, update_fields=None, **kwargs):
+    # Keep the nightly occupancy ledger, and the rollup of the nights it moved, in step with the booking
+    changed_nights = sync_booking_nights(instance, update_fields)
+    refresh_daily_stats_on_commit(instance.hotel_id, changed_nights)
+    invalidate_summary(instance.hotel_id)
+
+
+@receiver(pre_delete, sender=Booking)
+def booking_deleting(sender, instance, **kwargs):
+    # The ledger rows are cascaded away, so remember which nights they held
+    instance._ledger_nights = list(instance.nights.values_list('night', flat=True))
+
+
+@receiver(post_delete, sender=Booking)
+def booking_deleted(sender, instance, **kwargs):
+    refresh_daily_stats_on_commit(instance.hotel_id, getattr(instance, '_ledger_nights', []))
+    invalidate_summary(instance.hotel_id)
+
+
+@receiver([post_save, post_delete], sender=Payment)
+def payment_changed(sender, instance, **kwargs):
+    hotel_id = Invoice.objects.filter(pk=instance.invoice_id).values_list('booking__hotel_id', flat=True).first()
+    refresh_daily_stats_on_commit(hotel_id, [payment_day(instance)])
+
+
+@receiver([post_save, post_delete], sender=Room)
+def room_changed(sender, instance, **kwargs):
+    hotel_id = RoomType.objects.filter(pk=instance.room_type_id).values_list('hotel_id', flat=True).first()
+    invalidate_summary(hotel_id)
+
+
+@receiver([post_save, post_delete], sender=Invoice)
+def invoice_changed(sender, instance, **kwargs):
+    hotel_id = Booking.objects.filter(pk=instance.booking_id).values_list('hotel_id', flat=True).first()
+    invalidate_summary(hotel_id)
+
+
+@receiver([post_save, post_delete], sender=Guest)
+def guest_changed(sender, instance, **kwargs):
+    # Guests are not tied to a hotel, so every summary is affected
+    invalidate_summary()
+
+
+@receiver([post_save, post_delete], sender=Amenity)
+@receiver([post_save, post_delete], sender=Blog)
+@receiver([post_save, post_delete], sender=FoodItem)
+@receiver([post_save, post_delete], sender=PromoBanner)
+@receiver([post_save, post_delete], sender=RoomType)
+def cached_content_changed(sender, instance, **kwargs):
+    # Drops the cached public responses built from this model
+    bump_version(sender, getattr(instance, 'hotel_id', None))
+
+
+@receiver(m2m_changed, sender=RoomType.amenities.through)
+def room_type_amenities_changed(sender, instance, action, pk_set=None, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if isinstance(instance, RoomType):
+        bump_version(RoomType, instance.hotel_id)
+        return
+    # Changed from the amenity side: pk_set holds the room types (None on clear)
+    room_types = RoomType.objects.filter(pk__in=pk_set) if pk_set else RoomType.objects.all()
+    for hotel_id in set(room_types.values_list('hotel_id', flat=True)):
+        bump_version(RoomType, hotel_id)
+
+
+@receiver([post_save, post_delete], sender=Booking)
+@receiver([post_save, post_delete], sender=FoodOrder)
+@receiver([post_save, post_delete], sender=Guest)
+@receiver([post_save, post_delete], sender=HousekeepingTask)
+@receiver([post_save, post_delete], sender=Room)
+@receiver([post_save, post_delete], sender=RoomType)
+def polled_model_changed(sender, instance, **kwargs):
+    # Lets polling screens revalidate with a single version read
+    bump_model_version(sender, getattr(instance, 'hotel_id', None))
+
+
+def _publish_food_order(instance, name):
+    payload = {'id': instance.pk} if name == 'order.deleted' else FoodOrderSerializer(instance).data
+    # Only committed changes reach the kitchen screens
+    transaction.on_commit(lambda: hub.publish(food_orders_channel(instance.hotel_id), name, payload))
+
+
+@receiver(post_save, sender=FoodOrder)
+def food_order_saved(sender, instance, created, **kwargs):
+    _publish_food_order(instance, 'order.created' if created else 'order.updated')
+
+
+@receiver(post_delete, sender=FoodOrder)
+def food_order_deleted(sender, instance, **kwargs):
+    _publish_food_order(instance, 'order.deleted')
+
+
+@receiver([post_save, post_delete], sender=Room)
+def room_status_changed(sender, instance, **kwargs):
+    hotel_id = RoomType.objects.filter(pk=instance.room_type_id).values_list('hotel_id', flat=True).first()
+    name = 'room.deleted' if kwargs['signal'] is post_delete else 'room.updated'
+    publish_housekeeping(hotel_id, name, room_payload(instance))
+
+
+@receiver(post_init, sender=HousekeepingTask)
+def housekeeping_task_loaded(sender, instance, **kwargs):
+    # Remembered so the previous assignee learns the task left their list
+    instance._loaded_assigned_to_id = instance.assigned_to_id
+
+
+@receiver([post_save, post_delete], sender=HousekeepingTask)
+def housekeeping_task_changed(sender, instance, created=False, **kwargs):
+    hotel_id = Room.objects.filter(pk=instance.room_id).values_list('room_type__hotel_id', flat=True).first()
+    if kwargs['signal'] is post_delete:
+        name, payload = 'task.deleted', {'id': instance.pk, 'assigned_to': instance.assigned_to_id}
+    else:
+        name, payload = ('task.created' if created else 'task.updated'), dict(HousekeepingTaskSerializer(instance).data)
+    payload['previous_assigned_to'] = instance._loaded_assigned_to_id
+    instance._loaded_assigned_to_id = instance.assigned_to_id
+    publish_housekeeping(hotel_id, name, payload)
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    invalidate_token(instance.key)
+
+
+@receiver(post_save, sender=get_user_model())
+def user_saved(sender, instance, created, **kwargs):
+    # Covers password changes and resets, deactivation and permission changes
+    if not created:
+        invalidate_user(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=StaffProfile)
+def staff_profile_changed(sender, instance, **kwargs):
+    invalidate_user(instance.user_id)
+
+
+@receiver([post_save, post_delete], sender=Hotel)
+def hotel_changed(sender, instance, **kwargs):
+    forget_default_hotel()
+    invalidate_hotel_config(instance.pk)
@@ -0,0 +1,235 @@
+"""
+SQL fingerprinting: which query shapes dominate load, and from which views.
+
+metrics_middleware hands the statements of a sampled request to record_request().
+Each statement is reduced to a fingerprint (literals, placeholders and IN / VALUES
+lists folded away) and counted per view with its total time and a log-scale
+latency histogram, from which the p95 is read. Calls per request of a view make
+N+1 patterns stand out.
+
+Capture is off unless enabled in settings or at runtime (the sql_report command or
+POST /api/sql-report/), and only SQL_CAPTURE_SAMPLE_RATE of requests are sampled.
+The runtime switch lives in the default cache and every process re-reads it every
+few seconds; each process also publishes its totals there so a report merges all
+workers. Like the response cache, that needs REDIS_URL when several processes run.
+"""
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import cache
+
+SQL_CAPTURE_ENABLED = getattr(settings, 'SQL_CAPTURE_ENABLED', False)
+SQL_CAPTURE_SAMPLE_RATE = getattr(settings, 'SQL_CAPTURE_SAMPLE_RATE', 0.05)
+# Distinct (view, fingerprint) pairs kept per process; later ones are counted as OTHER
+SQL_CAPTURE_MAX_FINGERPRINTS = getattr(settings, 'SQL_CAPTURE_MAX_FINGERPRINTS', 2000)
+
+CONFIG_REFRESH_SECONDS = 5
+PUBLISH_SECONDS = 30
+SNAPSHOT_TIMEOUT = 24 * 3600
+
+CONFIG_KEY = 'sql-capture:config'
+PROCESSES_KEY = 'sql-capture:processes'
+PROCESS_ID = f'{os.getpid()}-{uuid.uuid4().hex[:8]}'
+OTHER = '(other statements)'
+
+# Upper bounds from 10us doubling every two steps, up to about 7s
+TIME_BUCKETS = tuple(1e-5 * 2 ** (i / 2) for i in range(40))
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'(?<![\w."])-?\d+(?:\.\d+)?\b')
+_PLACEHOLDER = re.compile(r'%s|\?')
+_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_ROWS = re.compile(r'\(\?\+\)(?:\s*,\s*\(\?\+\))+')
+_SPACE = re.compile(r'\s+')
+
+
+@lru_cache(maxsize=8192)
+def fingerprint(sql):
+    """
+    Normalised shape of a statement:
+    SELECT ... WHERE id IN (%s, %s) LIMIT 21  ->  SELECT ... WHERE id IN (?+) LIMIT ?
+    """
+    sql = _STRING.sub('?', sql)
+    sql = _PLACEHOLDER.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _LIST.sub('(?+)', sql)
+    sql = _ROWS.sub('(?+), ...', sql)
+    return _SPACE.sub(' ', sql).strip()
+
+
+class _Stat:
+    __slots__ = ('count', 'seconds', 'buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.buckets = [0] * (len(TIME_BUCKETS) + 1)
+
+
+_lock = threading.Lock()
+_stats = {}
+_view_requests = {}
+_config = {'enabled': SQL_CAPTURE_ENABLED, 'sample_rate': SQL_CAPTURE_SAMPLE_RATE, 'generation': 0}
+_config_read_at = 0.0
+_published_at = time.monotonic()
+
+
+def get_config():
+    global _config, _config_read_at
+    now = time.monotonic()
+    if now - _config_read_at >= CONFIG_REFRESH_SECONDS:
+        _config_read_at = now
+        shared = cache.get(CONFIG_KEY)
+        if shared is not None:
+            if shared['generation'] != _config['generation']:
+                _clear()
+            _config = shared
+    return _config
+
+
+def set_config(enabled=None, sample_rate=None, reset=False):
+    """Switches capture at runtime for every process sharing the cache."""
+    global _config, _config_read_at
+    config = dict(cache.get(CONFIG_KEY) or _config)
+    if enabled is not None:
+        config['enabled'] = enabled
+    if sample_rate is not None:
+        config['sample_rate'] = sample_rate
+    if reset:
+        config['generation'] += 1
+        for process_id in cache.get(PROCESSES_KEY) or ():
+            cache.delete(f'sql-capture:process:{process_id}')
+        cache.delete(PROCESSES_KEY)
+        _clear()
+    cache.set(CONFIG_KEY, config, None)
+    _config, _config_read_at = config, time.monotonic()
+    return config
+
+
+def should_sample():
+    config = get_config()
+    return config['enabled'] and random.random() < config['sample_rate']
+
+
+def _clear():
+    with _lock:
+        _stats.clear()
+        _view_requests.clear()
+
+
+def record_request(view, statements):
+    """Adds a sampled request's (sql, seconds) statements to this process's totals."""
+    with _lock:
+        _view_requests[view] = _view_requests.get(view, 0) + 1
+        for sql, seconds in statements:
+            key = (view, fingerprint(sql))
+            stat = _stats.get(key)
+            if stat is None:
+                if len(_stats) >= SQL_CAPTURE_MAX_FINGERPRINTS:
+                    key = (view, OTHER)
+                    stat = _stats.get(key)
+                if stat is None:
+                    stat = _stats[key] = _Stat()
+            stat.count += 1
+            stat.seconds += seconds
+            stat.buckets[bisect_left(TIME_BUCKETS, seconds)] += 1
+    if time.monotonic() - _published_at >= PUBLISH_SECONDS:
+        publish()
+
+
+def _snapshot():
+    with _lock:
+        return {
+            'views': dict(_view_requests),
+            'queries': [(view, sql, stat.count, stat.seconds, stat.buckets[:]) for (view, sql), stat in _stats.items()],
+        }
+
+
+def publish():
+    """Stores this process's totals in the cache, where reports pick them up."""
+    global _published_at
+    _published_at = time.monotonic()
+    if not _view_requests:
+        return
+    cache.set(f'sql-capture:process:{PROCESS_ID}', _snapshot(), SNAPSHOT_TIMEOUT)
+    processes = set(cache.get(PROCESSES_KEY) or ())
+    if PROCESS_ID not in processes:
+        cache.set(PROCESSES_KEY, processes | {PROCESS_ID}, None)
+
+
+def _p95(buckets, count):
+    threshold, seen = 0.95 * count, 0
+    for bound, hits in zip(TIME_BUCKETS, buckets):
+        seen += hits
+        if seen >= threshold:
+            return bound
+    return TIME_BUCKETS[-1]
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 3)
+
+
+def build_report(view=None, limit=50, order='total'):
+    """
+    Fingerprints ranked by total time (or count, p95), merged over every process,
+    each with its busiest views. ``view`` limits the report to one view.
+    """
+    publish()
+    processes = sorted(cache.get(PROCESSES_KEY) or ())
+    snapshots = [cache.get(f'sql-capture:process:{process_id}') for process_id in processes]
+    if not all(snapshots):
+        # Processes that stopped publishing have expired
+        cache.set(PROCESSES_KEY, {pid for pid, snapshot in zip(processes, snapshots) if snapshot}, None)
+
+    view_requests, merged = {}, {}
+    for snapshot in filter(None, snapshots):
+        for name, requests in snapshot['views'].items():
+            view_requests[name] = view_requests.get(name, 0) + requests
+        for name, sql, count, seconds, buckets in snapshot['queries']:
+            if view and name != view:
+                continue
+            entry = merged.setdefault(sql, {'count': 0, 'seconds': 0.0, 'buckets': [0] * len(buckets), 'views': {}})
+            entry['count'] += count
+            entry['seconds'] += seconds
+            entry['buckets'] = [a + b for a, b in zip(entry['buckets'], buckets)]
+            view_count, view_seconds = entry['views'].get(name, (0, 0.0))
+            entry['views'][name] = (view_count + count, view_seconds + seconds)
+
+    rows = []
+    for sql, entry in merged.items():
+        rows.append({
+            'fingerprint': sql,
+            'count': entry['count'],
+            'total_ms': _ms(entry['seconds']),
+            'mean_ms': _ms(entry['seconds'] / entry['count']),
+            'p95_ms': _ms(_p95(entry['buckets'], entry['count'])),
+            'views': [
+                {
+                    'view': name,
+                    'count': count,
+                    'total_ms': _ms(seconds),
+                    # Well above 1 on a list view usually means a query per row
+                    'per_request': round(count / max(view_requests.get(name, 1), 1), 2),
+                }
+                for name, (count, seconds) in sorted(entry['views'].items(), key=lambda item: -item[1][1])[:5]
+            ],
+        })
+    sort_key = {'total': 'total_ms', 'count': 'count', 'p95': 'p95_ms'}[order]
+    rows.sort(key=lambda row: row[sort_key], reverse=True)
+
+    config = get_config()
+    return {
+        'enabled': config['enabled'],
+        'sample_rate': config['sample_rate'],
+        'processes': len(list(filter(None, snapshots))),
+        'sampled_requests': sum(view_requests.values()) if not view else view_requests.get(view, 0),
+        'fingerprints': rows[:limit],
+    }
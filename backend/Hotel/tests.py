@@ -0,0 +1,2016 @@
+import asyncio
+import base64
+import csv
+import datetime
+import importlib
+import io
+import itertools
+import json
+import os
+import re
+import threading
+import time
+from decimal import Decimal
+from unittest import mock, skipUnless
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, IntegrityError, OperationalError, connection, connections, transaction
+from django.db.models import Count, Q
+from django.db.models.functions import Lower
+from django.http import HttpResponse
+from django.test import AsyncClient, Client, RequestFactory, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+from django.utils import timezone
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIClient
+
+try:
+    from openpyxl import load_workbook
+except ImportError:
+    load_workbook = None
+
+from .models import (
+    Amenity, Blog, Booking, ContactMessage, DailyStat, DiscountCoupon, EventBooking, FoodItem, FoodOrder, Guest,
+    Hotel, HousekeepingTask, InventoryItem, Invoice, PayHereNotification, Payment, PayrollEntry, PromoBanner, Room,
+    RoomNight, RoomType, StaffProfile,
+)
+from .authentication import USER_FIELDS, CachedTokenAuthentication, get_entry
+from .availability import free_rooms, release_expired_holds
+from .events import RESET, EventHub, food_orders_channel, housekeeping_channel, hub
+from .hotel_config import MAINTENANCE_RETRY_AFTER, in_maintenance
+from .housekeeping import auto_assign
+from .importers import run_import
+from .metrics import metrics_middleware, registry
+from .pagination import BookingPagination
+from .payhere import (
+    MAX_ATTEMPTS, RETRY_BASE_SECONDS, RETRY_MAX_SECONDS, SUCCESS_STATUS_CODE, _apply as payhere_apply,
+    notify_signature, process_batch, process_notification, queue_stats,
+)
+from .pricing import price_stays
+from .scheduling import assign_tasks, balance_quotas
+from .sqlstats import build_report, fingerprint, record_request, set_config
+from .urls import router
+from .views_export import Workbook
+from .views_stream import RETRY_MILLISECONDS, _assigned_to
+from .views import (
+    BookingViewSet, ContactMessageViewSet, EventBookingViewSet, FoodOrderViewSet, HousekeepingTaskViewSet,
+    InvoiceViewSet, PaymentViewSet, PayrollEntryViewSet,
+)
+
+
+def create_hotel(target):
+    """Sets up one hotel with an admin, a room type, three rooms and a guest on ``target``."""
+    target.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+    target.hotel = Hotel.objects.create(name='Hotel', location='Colombo', admin_user=target.admin, tax_rate=10)
+    StaffProfile.objects.create(user=target.admin, hotel=target.hotel, role='ADMIN')
+    target.room_type = RoomType.objects.create(
+        hotel=target.hotel, name='Deluxe', price_weekday=100, price_weekend=150, capacity=2,
+    )
+    target.rooms = [
+        Room.objects.create(room_type=target.room_type, room_number=str(100 + i), floor=1 + i // 2)
+        for i in range(3)
+    ]
+    target.guest = Guest.objects.create(name='Guest', email='guest@example.com', phone='1')
+
+
+class HotelTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        create_hotel(cls)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+
+# Benchmarks build large fixtures and are opt-in: RUN_BENCHMARKS=1 manage.py test Hotel.
+# BENCHMARK_SCALE shrinks (or grows) their data sets, e.g. 0.01 for a quick smoke run.
+benchmark = skipUnless(os.environ.get('RUN_BENCHMARKS'), 'Set RUN_BENCHMARKS=1 to run benchmarks.')
+BENCHMARK_SCALE = float(os.environ.get('BENCHMARK_SCALE', 1))
+
+
+def scaled(size):
+    return max(1, int(size * BENCHMARK_SCALE))
+
+
+def timings(fn, runs):
+    """Sorted wall-clock seconds of ``runs`` calls to ``fn``."""
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return sorted(samples)
+
+
+def report(name, samples):
+    """Prints the median and p99 of ``samples`` in the test output."""
+    median, p99 = samples[len(samples) // 2], samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    print(f"\n{name}: median {median * 1e3:.3f} ms, p99 {p99 * 1e3:.3f} ms over {len(samples)} runs")
+    return median, p99
+
+
+class BookingPaginationTests(HotelTestCase):
+    def test_cursor_walks_rows_sharing_a_check_in_date(self):
+        # Far more rows on one date than a page: the (check_in, id) key must still advance
+        day = datetime.date(2030, 1, 1)
+        Booking.objects.bulk_create(
+            Booking(hotel=self.hotel, guest=self.guest, room_type=self.room_type,
+                    check_in=day + datetime.timedelta(days=i // 1300), check_out=day + datetime.timedelta(days=5),
+                    total_price=100)
+            for i in range(1310)
+        )
+        expected = list(Booking.objects.order_by('-check_in', '-id').values_list('id', flat=True))
+
+        seen, pages, url = [], [], '/api/bookings/'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            pages.append(response.data)
+            seen.extend(row['id'] for row in response.data['results'])
+            url = response.data['next']
+            self.assertLessEqual(len(pages), 20)
+        self.assertEqual(seen, expected)
+        self.assertIsNone(pages[0]['previous'])
+
+        # Walking back from the last page returns the pages in reverse
+        previous = self.client.get(pages[-1]['previous']).data
+        self.assertEqual([row['id'] for row in previous['results']], [row['id'] for row in pages[-2]['results']])
+
+    def test_invalid_cursor_is_404(self):
+        response = self.client.get('/api/bookings/?cursor=not-a-cursor')
+        self.assertEqual(response.status_code, 404)
+
+    def test_page_number_fallback_reports_count(self):
+        response = self.client.get('/api/bookings/?page=1')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 0)
+
+    @benchmark
+    def test_benchmark_deep_pages_cost_the_same_as_the_first(self):
+        rows, page_size = scaled(5_000_000), BookingPagination.page_size
+        day, batch = datetime.date(2000, 1, 1), 100_000
+        for offset in range(0, rows, batch):
+            Booking.objects.bulk_create(
+                Booking(hotel=self.hotel, guest=self.guest, room_type=self.room_type,
+                        check_in=day + datetime.timedelta(days=i // 500), check_out=day + datetime.timedelta(days=i // 500 + 1),
+                        total_price=100)
+                for i in range(offset, min(offset + batch, rows))
+            )
+        # The last row before page 10,000 (or the deepest page there is), located once with OFFSET
+        depth = min(10_000, rows // page_size) - 1
+        last = Booking.objects.order_by('-check_in', '-id')[depth * page_size - 1 if depth else 0]
+        cursor = base64.urlsafe_b64encode(json.dumps(
+            {'v': last.check_in.isoformat(), 'id': last.pk, 'r': False}).encode('utf-8')).decode('ascii')
+
+        first = report('bookings, first page', timings(lambda: self.client.get('/api/bookings/'), 50))[0]
+        deep = report(f'bookings, page {depth + 1} of {rows} rows by cursor', timings(
+            lambda: self.client.get('/api/bookings/', {'cursor': cursor}), 50))[0]
+        report(f'bookings, page {depth + 1} by ?page= (OFFSET and COUNT)', timings(
+            lambda: self.client.get('/api/bookings/', {'page': depth + 1}), 5))
+        response = self.client.get('/api/bookings/', {'cursor': cursor})
+        self.assertEqual(len(response.data['results']), page_size)
+        # Both read a page off the hotel's (check_in, id) index, however large the table
+        self.assertLess(first, 0.05)
+        self.assertLess(deep, first * 3 + 0.005)
+
+
+class AvailabilitySearchTests(HotelTestCase):
+    STAY = {'check_in': '2030-01-04', 'check_out': '2030-01-06', 'guests': 2}
+
+    def _add_room_types(self, count, rooms_each):
+        room_types = RoomType.objects.bulk_create(
+            RoomType(hotel=self.hotel, name=f'Type {i}', price_weekday=100 + i, price_weekend=150 + i, capacity=1 + i % 3)
+            for i in range(count)
+        )
+        rooms = Room.objects.bulk_create(
+            Room(room_type=room_type, room_number=f'{room_type.pk}-{i}', floor=i // 10)
+            for room_type in room_types for i in range(rooms_each)
+        )
+        # Every other room is taken for the searched stay
+        bookings = Booking.objects.bulk_create(
+            Booking(hotel=self.hotel, guest=self.guest, room_type_id=room.room_type_id, room=room,
+                    check_in=datetime.date(2030, 1, 5), check_out=datetime.date(2030, 1, 6), total_price=100)
+            for room in rooms[::2]
+        )
+        RoomNight.objects.bulk_create(
+            RoomNight(room_id=booking.room_id, booking=booking, night=booking.check_in) for booking in bookings
+        )
+        return room_types
+
+    def _search(self):
+        response = self.client.get('/api/availability/', self.STAY)
+        self.assertEqual(response.status_code, 200)
+        return response.data['results']
+
+    def test_free_rooms_and_capacity(self):
+        Booking.objects.create(
+            hotel=self.hotel, guest=self.guest, room_type=self.room_type, room=self.rooms[0],
+            check_in=datetime.date(2030, 1, 5), check_out=datetime.date(2030, 1, 7), total_price=100,
+        )
+        Room.objects.filter(pk=self.rooms[1].pk).update(status=Room.RoomStatus.MAINTENANCE)
+        RoomType.objects.create(hotel=self.hotel, name='Single', price_weekday=50, price_weekend=60, capacity=1)
+        [deluxe] = self._search()
+        self.assertEqual((deluxe['name'], deluxe['free_rooms']), ('Deluxe', 1))
+        # Friday and Saturday nights are charged at the weekend rate
+        self.assertEqual((deluxe['weekday_nights'], deluxe['weekend_nights']), (0, 2))
+        self.assertEqual(deluxe['subtotal'], Decimal('300.00'))
+
+    def test_query_count_is_constant_in_room_types(self):
+        # Warms the cached hotel settings
+        self._search()
+        with CaptureQueriesContext(connection) as few:
+            self.assertEqual(len(self._search()), 1)
+        self._add_room_types(20, 4)
+        with CaptureQueriesContext(connection) as many:
+            self.assertGreater(len(self._search()), 10)
+        self.assertEqual(len(many), len(few))
+
+    @benchmark
+    def test_benchmark_search_over_500_room_types(self):
+        self._search()
+        with CaptureQueriesContext(connection) as few:
+            self._search()
+        room_types = scaled(500)
+        self._add_room_types(room_types, 20)
+        with CaptureQueriesContext(connection) as many:
+            results = self._search()
+        self.assertEqual(len(many), len(few))
+        # Types sleeping two or more, half of each one's rooms free
+        self.assertEqual({row['free_rooms'] for row in results if row['name'] != 'Deluxe'}, {10})
+        self.assertEqual(len(results), 1 + sum(1 for i in range(room_types) if i % 3))
+        report(f'availability search, {room_types} room types x {room_types * 20} rooms', timings(self._search, 20))
+
+
+class BookingPriceTests(HotelTestCase):
+    def test_availability_quotes_what_the_booking_charges(self):
+        # Thursday to Sunday: one weekday night and two weekend nights, plus 10% tax
+        stay = {'check_in': '2030-01-03', 'check_out': '2030-01-06'}
+        listed = self.client.get('/api/availability/', stay).data['results'][0]
+        response = self.client.post('/api/bookings/', {
+            'guest': self.guest.pk, 'room_type': self.room_type.pk, 'total_price': '1.00', **stay,
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(listed['total_price'], Decimal('440.00'))
+        self.assertEqual(Decimal(response.data['total_price']), listed['total_price'])
+
+    def test_total_price_cannot_be_edited(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            booking_id = self.client.post('/api/bookings/', {
+                'guest': self.guest.pk, 'room_type': self.room_type.pk,
+                'check_in': '2030-01-07', 'check_out': '2030-01-08',
+            }, format='json').data['id']
+        self.client.patch(f'/api/bookings/{booking_id}/', {'total_price': '1.00'}, format='json')
+        self.assertEqual(Booking.objects.get(pk=booking_id).total_price, Decimal('110.00'))
+
+
+    def test_changing_the_stay_reprices_it(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            booking_id = self.client.post('/api/bookings/', {
+                'guest': self.guest.pk, 'room_type': self.room_type.pk,
+                'check_in': '2030-01-07', 'check_out': '2030-01-08',
+            }, format='json').data['id']
+            # Monday to Wednesday: two weekday nights
+            response = self.client.patch(f'/api/bookings/{booking_id}/', {'check_out': '2030-01-09'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Decimal(response.data['total_price']), Decimal('220.00'))
+        self.assertEqual(Invoice.objects.get(booking_id=booking_id).amount, Decimal('220.00'))
+        response = self.client.patch(f'/api/bookings/{booking_id}/', {'check_out': '2030-01-07'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_coupon_must_be_a_string(self):
+        response = self.client.post('/api/bookings/', {
+            'guest': self.guest.pk, 'room_type': self.room_type.pk,
+            'check_in': '2030-01-07', 'check_out': '2030-01-08', 'coupon_code': 5,
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post('/api/quote/', {
+            'coupon': ['SUMMER'], 'stays': [{'room_type': self.room_type.pk, 'check_in': '2030-01-07', 'check_out': '2030-01-08'}],
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_batch_quote_applies_the_room_types_hotel_coupon(self):
+        other = Hotel.objects.create(name='Other', location='Kandy', admin_user=User.objects.create_user('other'))
+        window = {'valid_from': datetime.date(2030, 1, 1), 'valid_to': datetime.date(2030, 12, 31)}
+        DiscountCoupon.objects.create(hotel=other, code='summer', discount_percent=50, **window)
+        DiscountCoupon.objects.create(hotel=self.hotel, code='SUMMER', discount_percent=10, **window)
+        response = self.client.post('/api/quote/', {
+            'coupon': 'Summer',
+            'stays': [{'room_type': str(self.room_type.pk), 'check_in': '2030-01-07', 'check_out': '2030-01-08'}],
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'][0]['discount'], Decimal('10.00'))
+        self.assertEqual(response.data['results'][0]['coupon'], 'SUMMER')
+
+    @benchmark
+    def test_benchmark_batch_against_per_request_quotes(self):
+        day, room_type = datetime.date(2030, 1, 1), RoomType.objects.get(pk=self.room_type.pk)
+        stays = [
+            (room_type, day + datetime.timedelta(days=i % 365), day + datetime.timedelta(days=i % 365 + 1 + i % 14))
+            for i in range(scaled(5_000))
+        ]
+        self.assertEqual(price_stays(stays), [price_stays([stay])[0] for stay in stays])
+        batch = report(f'price_stays, {len(stays)} stays in one call', timings(lambda: price_stays(stays), 5))[0]
+        single = report(f'price_stays, {len(stays)} calls of one stay', timings(
+            lambda: [price_stays([stay]) for stay in stays], 5))[0]
+        self.assertLess(batch, single)
+
+        # Over HTTP: one POST against a GET per stay
+        stays = [
+            {'room_type': self.room_type.pk, 'check_in': str(check_in), 'check_out': str(check_out)}
+            for _, check_in, check_out in stays[:scaled(500)]
+        ]
+        post = report(f'POST /quote/, {len(stays)} stays', timings(
+            lambda: self.client.post('/api/quote/', {'stays': stays}, format='json'), 5))[0]
+        gets = report(f'GET /quote/, {len(stays)} requests', timings(
+            lambda: [self.client.get('/api/quote/', stay) for stay in stays], 5))[0]
+        self.assertLess(post, gets)
+
+
+class ConditionalGetTests(HotelTestCase):
+    def test_unchanged_poll_is_304_without_queries(self):
+        etag = self.client.get('/api/bookings/')['ETag']
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/bookings/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len(queries), 0)
+
+    def test_version_moves_when_the_write_commits(self):
+        etag = self.client.get('/api/bookings/')['ETag']
+        with self.captureOnCommitCallbacks() as callbacks:
+            Booking.objects.create(
+                hotel=self.hotel, guest=self.guest, room_type=self.room_type,
+                check_in=datetime.date(2030, 1, 1), check_out=datetime.date(2030, 1, 2), total_price=100,
+            )
+            # Not committed yet: pollers keep their copy
+            self.assertEqual(self.client.get('/api/bookings/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        for callback in callbacks:
+            callback()
+        response = self.client.get('/api/bookings/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertIn('Last-Modified', response)
+
+
+class CachedReadTests(HotelTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def _names(self, client=None):
+        response = (client or self.client).get('/api/room-types/')
+        self.assertEqual(response.status_code, 200)
+        return [row['name'] for row in response.data['results']], response['ETag']
+
+    def _room_type_queries(self, queries):
+        return [query['sql'] for query in queries if 'hotel_roomtype' in query['sql'].lower()]
+
+    def test_repeated_read_is_served_from_the_cache(self):
+        first = self._names()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self._names(), first)
+        self.assertEqual(self._room_type_queries(queries), [])
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/room-types/', HTTP_IF_NONE_MATCH=first[1])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self._room_type_queries(queries), [])
+
+    def test_save_and_amenity_change_invalidate(self):
+        names, etag = self._names()
+        self.room_type.name = 'Suite'
+        self.room_type.save()
+        renamed, renamed_etag = self._names()
+        self.assertEqual(renamed, ['Suite'])
+        self.assertNotEqual(renamed_etag, etag)
+
+        # Changed from the amenity side of the relation
+        amenity = Amenity.objects.create(name='Pool')
+        amenity.roomtype_set.add(self.room_type)
+        response = self.client.get('/api/room-types/')
+        self.assertNotEqual(response['ETag'], renamed_etag)
+        self.assertEqual(response.data['results'][0]['amenities'], [amenity.pk])
+        self.room_type.amenities.remove(amenity)
+        self.assertEqual(self.client.get('/api/room-types/').data['results'][0]['amenities'], [])
+
+    def test_key_is_scoped_to_the_staff_hotel(self):
+        other_admin = User.objects.create_user('other')
+        other = Hotel.objects.create(name='Other', location='Kandy', admin_user=other_admin)
+        RoomType.objects.create(hotel=other, name='Cabin', price_weekday=50, price_weekend=60, capacity=2)
+        staff = User.objects.create_user('staff', is_staff=True)
+        StaffProfile.objects.create(user=staff, hotel=self.hotel, role='STAFF')
+        client = APIClient()
+        client.force_authenticate(staff)
+
+        StaffProfile.objects.create(user=other_admin, hotel=other, role='ADMIN')
+        other_client = APIClient()
+        other_client.force_authenticate(other_admin)
+
+        names, etag = self._names(client)
+        self.assertEqual(names, ['Deluxe'])
+        # Same URL, other hotel: its own cache entry
+        self.assertEqual(self._names(other_client)[0], ['Cabin'])
+
+        # Another hotel's change leaves this hotel's entry alone; its own change does not
+        RoomType.objects.filter(hotel=other).get().save()
+        self.assertEqual(self._names(client)[1], etag)
+        self.room_type.save()
+        self.assertNotEqual(self._names(client)[1], etag)
+
+
+class DashboardTests(HotelTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def _summary(self):
+        response = self.client.get('/api/dashboard/')
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def _recomputes(self):
+        """Whether the next summary read runs the counting query."""
+        with CaptureQueriesContext(connection) as queries:
+            self._summary()
+        return any('COUNT' in query['sql'].upper() for query in queries)
+
+    def _book(self, **fields):
+        today = timezone.localdate()
+        return Booking.objects.create(
+            hotel=self.hotel, guest=self.guest, room_type=self.room_type, room=self.rooms[0],
+            check_in=today, check_out=today + datetime.timedelta(days=2), total_price=200, **fields,
+        )
+
+    def test_counters_take_one_query_and_are_cached(self):
+        booking = self._book(status=Booking.BookingStatus.CONFIRMED)
+        Invoice.objects.create(booking=booking, amount=200, due_date=booking.check_in)
+        with CaptureQueriesContext(connection) as queries:
+            data = self._summary()
+        self.assertEqual(sum('COUNT' in query['sql'].upper() for query in queries), 1)
+        self.assertEqual(
+            {name: data[name] for name in ('total_bookings', 'total_rooms', 'occupied_today', 'arrivals_today')},
+            {'total_bookings': 1, 'total_rooms': 3, 'occupied_today': 1, 'arrivals_today': 1},
+        )
+        self.assertEqual(data['revenue'], Decimal('200'))
+        self.assertEqual(data['occupancy_rate'], 33.33)
+        self.assertFalse(self._recomputes())
+
+    def test_bookings_invalidate(self):
+        self._summary()
+        booking = self._book()
+        self.assertEqual(self._summary()['occupied_today'], 1)
+        booking.status = Booking.BookingStatus.CANCELLED
+        booking.save(update_fields=['status'])
+        self.assertEqual(self._summary()['occupied_today'], 0)
+        booking.delete()
+        self.assertEqual(self._summary()['total_bookings'], 0)
+
+    def test_invoices_and_payments_invalidate(self):
+        booking = self._book()
+        self._summary()
+        invoice = Invoice.objects.create(booking=booking, amount=200, due_date=booking.check_in)
+        self.assertEqual(self._summary()['revenue'], Decimal('200'))
+        # A PayHere payment marks the invoice paid, which drops the cached counters
+        self.assertFalse(self._recomputes())
+        process_notification(PayHereNotification.objects.create(
+            payment_id='320001', order_id=f'BK-{booking.pk}', status_code=SUCCESS_STATUS_CODE,
+            payload={'payhere_amount': '200.00'}, signature_valid=True,
+        ))
+        self.assertEqual(Invoice.objects.get(pk=invoice.pk).status, Invoice.InvoiceStatus.PAID)
+        self.assertTrue(self._recomputes())
+
+    def test_rooms_and_guests_invalidate(self):
+        self._summary()
+        Room.objects.create(room_type=self.room_type, room_number='200', floor=2)
+        self.assertEqual(self._summary()['total_rooms'], 4)
+        Guest.objects.create(name='Other', email='other@example.com', phone='2')
+        self.assertEqual(self._summary()['total_customers'], 2)
+
+    def test_each_hotel_has_its_own_summary(self):
+        other_admin = User.objects.create_user('other')
+        other = Hotel.objects.create(name='Other', location='Kandy', admin_user=other_admin)
+        StaffProfile.objects.create(user=other_admin, hotel=other, role='ADMIN')
+        client = APIClient()
+        client.force_authenticate(other_admin)
+        self.assertEqual(client.get('/api/dashboard/').data['total_rooms'], 0)
+        self.assertEqual(self._summary()['total_rooms'], 3)
+        # Another hotel's room leaves this hotel's cached summary alone
+        other_type = RoomType.objects.create(hotel=other, name='Cabin', price_weekday=50, price_weekend=60, capacity=2)
+        Room.objects.create(room_type=other_type, room_number='1', floor=1)
+        self.assertFalse(self._recomputes())
+        self.assertEqual(client.get('/api/dashboard/').data['total_rooms'], 1)
+
+
+class OccupancyGridTests(HotelTestCase):
+    def _book(self, room, check_in, nights, **fields):
+        return Booking.objects.create(
+            hotel=self.hotel, guest=self.guest, room_type=self.room_type, room=room, total_price=100,
+            check_in=check_in, check_out=check_in + datetime.timedelta(days=nights), **fields,
+        )
+
+    def _grid(self, client=None, **params):
+        return (client or self.client).get('/api/occupancy-grid/', {'from': '2030-01-01', 'to': '2030-01-11', **params})
+
+    def test_stays_are_run_length_encoded(self):
+        day = datetime.date(2030, 1, 1)
+        # Clipped at the window's start, then a back-to-back stay in the same room
+        before = self._book(self.rooms[0], day - datetime.timedelta(days=2), 4)
+        after = self._book(self.rooms[0], day + datetime.timedelta(days=2), 3)
+        # Clipped at the window's end
+        late = self._book(self.rooms[1], day + datetime.timedelta(days=8), 5)
+        self._book(self.rooms[2], day, 2, status=Booking.BookingStatus.CANCELLED)
+
+        response = self._grid()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['days'], 10)
+        runs = {row['room_number']: row['runs'] for row in response.data['rooms']}
+        self.assertEqual(runs, {
+            '100': [[0, 2, before.pk], [2, 3, after.pk]],
+            '101': [[8, 2, late.pk]],
+            '102': [],
+        })
+        self.assertEqual([row['room_number'] for row in response.data['rooms']], ['100', '101', '102'])
+
+    def test_query_count_does_not_grow_with_bookings(self):
+        self._book(self.rooms[0], datetime.date(2030, 1, 1), 1)
+        # Warms the cached tenant lookups
+        self._grid()
+        with CaptureQueriesContext(connection) as few:
+            self._grid()
+        for i in range(1, 9):
+            self._book(self.rooms[i % 3], datetime.date(2030, 1, 1) + datetime.timedelta(days=i), 1)
+        with CaptureQueriesContext(connection) as many:
+            self._grid()
+        self.assertEqual(len(many), len(few))
+
+    def test_bad_windows_are_refused(self):
+        for params in ({'from': 'x'}, {'to': '2029-12-31'}, {'to': '2031-06-01'}):
+            self.assertEqual(self._grid(**params).status_code, 400)
+
+    def test_staff_only_see_their_hotel(self):
+        other_admin = User.objects.create_user('other')
+        other = Hotel.objects.create(name='Other', location='Kandy', admin_user=other_admin)
+        other_type = RoomType.objects.create(hotel=other, name='Cabin', price_weekday=50, price_weekend=60, capacity=2)
+        Room.objects.create(room_type=other_type, room_number='1', floor=1)
+        self.assertEqual(len(self._grid(hotel=str(other.pk)).data['rooms']), 3)
+
+        root = User.objects.create_superuser('root', 'root@example.com', 'pw')
+        client = APIClient()
+        client.force_authenticate(root)
+        self.assertEqual([row['room_number'] for row in self._grid(client, hotel=str(other.pk)).data['rooms']], ['1'])
+        self.assertEqual(len(self._grid(client).data['rooms']), 4)
+        self.assertEqual(self._grid(client, hotel='x').status_code, 400)
+
+
+class RoomLedgerTests(HotelTestCase):
+    def _book(self, room, check_in, check_out, **fields):
+        return Booking.objects.create(
+            hotel=self.hotel, guest=self.guest, room_type=self.room_type, room=room,
+            check_in=check_in, check_out=check_out, total_price=100, **fields,
+        )
+
+    def _nights(self, booking):
+        return sorted(RoomNight.objects.filter(booking=booking).values_list('room_id', 'night'))
+
+    def test_booking_takes_one_row_per_night(self):
+        booking = self._book(self.rooms[0], datetime.date(2030, 1, 1), datetime.date(2030, 1, 4))
+        self.assertEqual(self._nights(booking), [
+            (self.rooms[0].pk, datetime.date(2030, 1, day)) for day in (1, 2, 3)
+        ])
+        self.assertNotIn(self.rooms[0], free_rooms(self.room_type, datetime.date(2030, 1, 3), datetime.date(2030, 1, 5)))
+        self.assertIn(self.rooms[0], free_rooms(self.room_type, datetime.date(2030, 1, 4), datetime.date(2030, 1, 5)))
+
+    def test_cancel_frees_the_nights(self):
+        booking = self._book(self.rooms[0], datetime.date(2030, 1, 1), datetime.date(2030, 1, 4))
+        booking.status = Booking.BookingStatus.CANCELLED
+        booking.save(update_fields=['status'])
+        self.assertEqual(self._nights(booking), [])
+        self.assertIn(self.rooms[0], free_rooms(self.room_type, datetime.date(2030, 1, 1), datetime.date(2030, 1, 4)))
+
+    def test_date_change_rewrites_the_nights(self):
+        booking = self._book(self.rooms[0], datetime.date(2030, 1, 1), datetime.date(2030, 1, 3))
+        booking.check_in, booking.check_out = datetime.date(2030, 1, 10), datetime.date(2030, 1, 12)
+        booking.save()
+        self.assertEqual(self._nights(booking), [
+            (self.rooms[0].pk, datetime.date(2030, 1, 10)), (self.rooms[0].pk, datetime.date(2030, 1, 11)),
+        ])
+
+    def test_room_change_moves_the_nights(self):
+        booking = self._book(self.rooms[0], datetime.date(2030, 1, 1), datetime.date(2030, 1, 3))
+        booking.room = self.rooms[1]
+        booking.save(update_fields=['room'])
+        self.assertEqual({room_id for room_id, _ in self._nights(booking)}, {self.rooms[1].pk})
+        self.assertEqual(
+            list(free_rooms(self.room_type, datetime.date(2030, 1, 1), datetime.date(2030, 1, 3))),
+            [self.rooms[0], self.rooms[2]],
+        )
+
+    def test_delete_frees_the_nights(self):
+        booking = self._book(self.rooms[0], datetime.date(2030, 1, 1), datetime.date(2030, 1, 3))
+        booking.delete()
+        self.assertFalse(RoomNight.objects.exists())
+
+    def test_overlapping_night_is_refused(self):
+        self._book(self.rooms[0], datetime.date(2030, 1, 1), datetime.date(2030, 1, 3))
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            self._book(self.rooms[0], datetime.date(2030, 1, 2), datetime.date(2030, 1, 4))
+
+    @benchmark
+    def test_benchmark_lookup_is_flat_over_booking_history(self):
+        history = scaled(1_000_000)
+        rooms = Room.objects.bulk_create(
+            Room(room_type=self.room_type, room_number=f'H{i}', floor=1) for i in range(100)
+        )
+        check_in = datetime.date(2100, 1, 1)
+
+        def lookup():
+            return list(free_rooms(self.room_type, check_in, check_in + datetime.timedelta(days=3))[:1])
+
+        empty = report('free_rooms, no history', timings(lookup, 200))[0]
+        # One past night per booking, spread over the rooms so no two collide
+        start, batch = datetime.date(1990, 1, 1), 50_000
+        for offset in range(0, history, batch):
+            bookings = Booking.objects.bulk_create(
+                Booking(
+                    hotel=self.hotel, guest=self.guest, room_type=self.room_type, room=rooms[i % 100],
+                    check_in=start + datetime.timedelta(days=i // 100),
+                    check_out=start + datetime.timedelta(days=i // 100 + 1),
+                    status=Booking.BookingStatus.CHECKED_OUT, total_price=100,
+                )
+                for i in range(offset, min(offset + batch, history))
+            )
+            RoomNight.objects.bulk_create(
+                RoomNight(room_id=booking.room_id, booking=booking, night=booking.check_in) for booking in bookings
+            )
+        full = report(f'free_rooms, {history} bookings', timings(lookup, 200))[0]
+        # Bounded by the window, not the history: allow noise, not growth
+        self.assertLess(full, empty * 3 + 0.002)
+
+
+class DailyStatTests(HotelTestCase):
+    def _book_and_pay(self):
+        # PAYHERE in the notes books a prepaid stay with a completed payment
+        response = self.client.post('/api/bookings/', {
+            'guest': self.guest.pk, 'room_type': self.room_type.pk,
+            'check_in': '2030-01-06', 'check_out': '2030-01-08', 'special_requests': 'PAYHERE',
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+
+    def _stats(self):
+        return sorted(DailyStat.objects.values_list('date', 'room_type_id', 'rooms_sold', 'revenue'))
+
+    def test_rollup_is_refreshed_after_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            self._book_and_pay()
+            self.assertEqual(self._stats(), [])
+        for callback in callbacks:
+            callback()
+        # Nights sold on the stay, revenue on the day it was paid
+        sold = [(date, count) for date, _, count, _ in self._stats() if count]
+        self.assertEqual(sold, [(datetime.date(2030, 1, 6), 1), (datetime.date(2030, 1, 7), 1)])
+        self.assertEqual(sum(revenue for *_, revenue in self._stats()), Payment.objects.get().amount)
+
+    def _checked_in(self, nights_before, nights_after):
+        today = timezone.localdate()
+        with self.captureOnCommitCallbacks(execute=True):
+            return Booking.objects.create(
+                hotel=self.hotel, guest=self.guest, room_type=self.room_type, room=self.rooms[0],
+                check_in=today - datetime.timedelta(days=nights_before),
+                check_out=today + datetime.timedelta(days=nights_after),
+                status=Booking.BookingStatus.CHECKED_IN, total_price=300,
+            )
+
+    def _check_out(self, booking):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(f'/api/bookings/{booking.pk}/', {'status': 'CHECKED_OUT'}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_checkout_keeps_the_nights_sold(self):
+        booking = self._checked_in(3, 0)
+        before = self._stats()
+        self.assertEqual([count for _, _, count, _ in before], [1, 1, 1])
+        self._check_out(booking)
+        self.assertEqual(self._stats(), before)
+        self.assertEqual(RoomNight.objects.filter(booking=booking).count(), 3)
+
+    def test_early_checkout_frees_the_nights_not_stayed(self):
+        booking = self._checked_in(2, 2)
+        self._check_out(booking)
+        today = timezone.localdate()
+        self.assertEqual(
+            [(date, count) for date, _, count, _ in self._stats()],
+            [(today - datetime.timedelta(days=2), 1), (today - datetime.timedelta(days=1), 1)],
+        )
+        self.assertEqual(Booking.objects.get(pk=booking.pk).checked_out_on, today)
+        self.assertIn(self.rooms[0], free_rooms(self.room_type, today, today + datetime.timedelta(days=2)))
+
+    def test_backfill_matches_the_live_rollup(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self._book_and_pay()
+        expected = self._stats()
+        DailyStat.objects.all().delete()
+        migration = importlib.import_module('Hotel.migrations.0028_backfill_dailystat')
+        migration.backfill_daily_stats(apps, None)
+        self.assertEqual(self._stats(), expected)
+
+
+class BookingHoldTests(HotelTestCase):
+    def _book(self, user, **data):
+        client = APIClient()
+        client.force_authenticate(user)
+        response = client.post('/api/bookings/', {
+            'guest': self.guest.pk, 'room_type': self.room_type.pk,
+            'check_in': '2030-01-06', 'check_out': '2030-01-08', **data,
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        return Booking.objects.get(pk=response.data['id'])
+
+    def _expire(self, booking):
+        Booking.objects.filter(pk=booking.pk).update(hold_expires_at=timezone.now() - datetime.timedelta(minutes=1))
+
+    def _pay(self, booking, payment_id='320001'):
+        notification = PayHereNotification.objects.create(
+            payment_id=payment_id, order_id=f'BK-{booking.pk}', status_code=SUCCESS_STATUS_CODE,
+            payload={'payhere_amount': str(booking.total_price)}, signature_valid=True,
+        )
+        process_notification(notification)
+        return notification
+
+    def setUp(self):
+        super().setUp()
+        self.online = User.objects.create_user('online')
+
+    def test_only_unpaid_online_bookings_are_held(self):
+        online = self._book(self.online)
+        self.assertIsNotNone(online.hold_expires_at)
+        self.assertIsNone(self._book(self.online, special_requests='PAYHERE').hold_expires_at)
+        self.assertIsNone(self._book(self.admin).hold_expires_at)
+
+    def test_expired_hold_is_cancelled_and_frees_its_nights(self):
+        booking = self._book(self.online)
+        kept = self._book(self.online)
+        self._expire(booking)
+        self.assertEqual(release_expired_holds(), 1)
+        self.assertEqual(Booking.objects.get(pk=booking.pk).status, Booking.BookingStatus.CANCELLED)
+        self.assertEqual(Booking.objects.get(pk=kept.pk).status, Booking.BookingStatus.PENDING)
+        self.assertFalse(RoomNight.objects.filter(booking=booking).exists())
+        self.assertIn(booking.room, free_rooms(self.room_type, booking.check_in, booking.check_out))
+
+    def test_paid_booking_is_not_released(self):
+        booking = self._book(self.online)
+        Payment.objects.create(invoice=booking.invoices.get(), amount=booking.total_price, method='CASH')
+        self._expire(booking)
+        self.assertEqual(release_expired_holds(), 0)
+        self.assertEqual(Booking.objects.get(pk=booking.pk).status, Booking.BookingStatus.PENDING)
+
+    def test_release_runs_in_batches(self):
+        bookings = [self._book(self.online) for _ in range(3)]
+        for booking in bookings:
+            self._expire(booking)
+        self.assertEqual(release_expired_holds(batch_size=2), 3)
+        self.assertFalse(Booking.objects.filter(status=Booking.BookingStatus.PENDING).exists())
+
+    def test_payment_after_release_is_recorded(self):
+        booking = self._book(self.online)
+        self._expire(booking)
+        release_expired_holds()
+        notification = self._pay(booking)
+        self.assertEqual(notification.outcome, PayHereNotification.Outcome.PAID)
+        self.assertEqual(notification.detail, "Paid after the booking was cancelled.")
+        self.assertEqual(Payment.objects.get().transaction_id, '320001')
+        self.assertEqual(Booking.objects.get(pk=booking.pk).status, Booking.BookingStatus.CANCELLED)
+
+
+class HousekeepingTurnoverTests(HotelTestCase):
+    def _checked_in(self, room, nights_before=1):
+        today = timezone.localdate()
+        return Booking.objects.create(
+            hotel=self.hotel, guest=self.guest, room_type=self.room_type, room=room,
+            check_in=today - datetime.timedelta(days=nights_before), check_out=today + datetime.timedelta(days=1),
+            status=Booking.BookingStatus.CHECKED_IN, total_price=200,
+        )
+
+    def _check_out(self, booking):
+        return self.client.patch(f'/api/bookings/{booking.pk}/', {'status': 'CHECKED_OUT'}, format='json')
+
+    def _transition(self, rooms=(), tasks=(), client=None):
+        return (client or self.client).post('/api/housekeeping/bulk-transition/', {
+            'rooms': [{'id': pk, 'status': status} for pk, status in rooms],
+            'tasks': [{'id': pk, 'status': status} for pk, status in tasks],
+        }, format='json')
+
+    def test_checkout_turns_the_room_over_once(self):
+        room = self.rooms[0]
+        self.assertEqual(self._check_out(self._checked_in(room)).status_code, 200)
+        room.refresh_from_db()
+        self.assertEqual(room.status, Room.RoomStatus.DIRTY)
+        task = HousekeepingTask.objects.get()
+        self.assertEqual((task.room, task.status), (room, HousekeepingTask.TaskStatus.DIRTY))
+
+        # A second checkout while the task is open does not queue another one
+        self.assertEqual(self._check_out(self._checked_in(room, nights_before=0)).status_code, 200)
+        self.assertEqual(HousekeepingTask.objects.count(), 1)
+
+    def test_room_out_of_order_stays_out_of_order(self):
+        room = self.rooms[0]
+        Room.objects.filter(pk=room.pk).update(status=Room.RoomStatus.MAINTENANCE)
+        self._check_out(self._checked_in(room))
+        room.refresh_from_db()
+        self.assertEqual(room.status, Room.RoomStatus.MAINTENANCE)
+        self.assertEqual(HousekeepingTask.objects.filter(room=room).count(), 1)
+
+    def test_checkout_and_turnover_commit_together(self):
+        room, booking = self.rooms[0], self._checked_in(self.rooms[0])
+        with mock.patch.object(HousekeepingTask.objects, 'create', side_effect=DatabaseError('boom')):
+            with self.assertRaises(DatabaseError):
+                self._check_out(booking)
+        booking.refresh_from_db()
+        room.refresh_from_db()
+        self.assertEqual(booking.status, Booking.BookingStatus.CHECKED_IN)
+        self.assertEqual(room.status, Room.RoomStatus.CLEAN)
+        self.assertFalse(HousekeepingTask.objects.exists())
+
+    def test_bulk_transition(self):
+        dirty, cleaned, covered = self.rooms
+        Room.objects.filter(pk__in=[cleaned.pk, covered.pk]).update(status=Room.RoomStatus.DIRTY)
+        done = HousekeepingTask.objects.create(room=cleaned)
+        open_task = HousekeepingTask.objects.create(room=covered)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self._transition(
+                rooms=[(dirty.pk, 'DIRTY'), (covered.pk, 'DIRTY')], tasks=[(done.pk, 'CLEAN')],
+            )
+        self.assertEqual(response.status_code, 200)
+        # Only the room without an open task gets a new one
+        self.assertEqual(response.data['created_tasks'], 1)
+        self.assertEqual(
+            dict(Room.objects.values_list('pk', 'status')),
+            {dirty.pk: 'DIRTY', cleaned.pk: 'CLEAN', covered.pk: 'DIRTY'},
+        )
+        self.assertEqual(
+            sorted(HousekeepingTask.objects.values_list('room_id', 'status')),
+            sorted([(dirty.pk, 'DIRTY'), (cleaned.pk, 'CLEAN'), (covered.pk, open_task.status)]),
+        )
+        self.assertEqual(sorted(task['id'] for task in response.data['tasks']),
+                         sorted(HousekeepingTask.objects.exclude(pk=open_task.pk).values_list('pk', flat=True)))
+        # A fixed number of statements, not one per row
+        self.assertLess(len(queries), 15)
+
+    def test_bulk_transition_refuses_unknown_and_other_hotels_rows(self):
+        other_admin = User.objects.create_user('other')
+        other = Hotel.objects.create(name='Other', location='Kandy', admin_user=other_admin)
+        other_type = RoomType.objects.create(hotel=other, name='Cabin', price_weekday=50, price_weekend=60, capacity=2)
+        other_room = Room.objects.create(room_type=other_type, room_number='1', floor=1)
+        staff = User.objects.create_user('staff', is_staff=True)
+        StaffProfile.objects.create(user=staff, hotel=self.hotel, role='STAFF')
+        client = APIClient()
+        client.force_authenticate(staff)
+
+        response = self._transition(rooms=[(self.rooms[0].pk, 'DIRTY'), (other_room.pk, 'DIRTY')], client=client)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['rooms'], [other_room.pk])
+        response = self._transition(tasks=[(999, 'CLEAN')])
+        self.assertEqual((response.status_code, response.data['tasks']), (400, [999]))
+        # Nothing was applied
+        self.assertFalse(Room.objects.exclude(status=Room.RoomStatus.CLEAN).exists())
+        self.assertFalse(HousekeepingTask.objects.exists())
+
+    def test_bulk_transition_is_capped(self):
+        with mock.patch('Hotel.views.MAX_BULK_TRANSITION', 1):
+            response = self._transition(rooms=[(room.pk, 'DIRTY') for room in self.rooms[:2]])
+        self.assertEqual(response.status_code, 400)
+
+
+class SchedulingTests(HotelTestCase):
+    def _housekeepers(self, count, hotel=None, **fields):
+        users = []
+        for i in range(count):
+            user = User.objects.create_user(f'housekeeper{len(users)}-{User.objects.count()}')
+            StaffProfile.objects.create(user=user, hotel=hotel or self.hotel, role='HOUSEKEEPER', **fields)
+            users.append(user)
+        return users
+
+    def test_quotas_level_the_loads(self):
+        quotas = balance_quotas({1: 3, 2: 0, 3: 1}, 5)
+        self.assertEqual(sum(quotas.values()), 5)
+        self.assertEqual(max(load + quotas[user_id] for user_id, load in {1: 3, 2: 0, 3: 1}.items()), 3)
+        self.assertEqual(quotas[1], 0)
+        self.assertEqual(balance_quotas({}, 5), {})
+
+    def test_each_housekeeper_gets_a_contiguous_run_of_floors(self):
+        tasks = [(floor * 10 + i, floor) for floor in (3, 1, 2) for i in range(4)]
+        assignments = assign_tasks(tasks, {1: 0, 2: 0, 3: 0})
+        floors = {}
+        for task_id, floor in tasks:
+            floors.setdefault(assignments[task_id], set()).add(floor)
+        self.assertEqual(sorted(map(sorted, floors.values())), [[1], [2], [3]])
+
+    def test_housekeeper_keeps_the_floor_they_are_on(self):
+        tasks = [(1, 1), (2, 1), (3, 5), (4, 5)]
+        assignments = assign_tasks(tasks, {7: 0, 8: 0}, current_floors={7: 5})
+        self.assertEqual(assignments, {1: 8, 2: 8, 3: 7, 4: 7})
+        self.assertEqual(assign_tasks(tasks, {}), {})
+
+    def test_auto_assign_leaves_tasks_in_progress_alone(self):
+        busy, idle = self._housekeepers(2)
+        self._housekeepers(1, status='Inactive')
+        started = HousekeepingTask.objects.create(
+            room=self.rooms[0], assigned_to=busy, status=HousekeepingTask.TaskStatus.IN_PROGRESS,
+        )
+        dirty = [HousekeepingTask.objects.create(room=room) for room in self.rooms]
+
+        response = self.client.post('/api/housekeeping/auto-assign/', {}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['assigned'], 3)
+        started.refresh_from_db()
+        self.assertEqual((started.assigned_to, started.status), (busy, HousekeepingTask.TaskStatus.IN_PROGRESS))
+        # The task in progress counts towards its housekeeper's load: 4 open tasks split 2/2
+        self.assertEqual(response.data['loads'], [{'user': busy.pk, 'open_tasks': 2}, {'user': idle.pk, 'open_tasks': 2}])
+        self.assertEqual(
+            set(HousekeepingTask.objects.filter(pk__in=[task.pk for task in dirty]).values_list('assigned_to', flat=True)),
+            {busy.pk, idle.pk},
+        )
+
+    def test_auto_assign_only_moves_unassigned_tasks_unless_asked(self):
+        first, second = self._housekeepers(2)
+        tasks = [HousekeepingTask.objects.create(room=room, assigned_to=first) for room in self.rooms]
+        response = self.client.post('/api/housekeeping/auto-assign/', {}, format='json')
+        self.assertEqual(response.data['assigned'], 0)
+
+        response = self.client.post('/api/housekeeping/auto-assign/', {'reassign': True}, format='json')
+        self.assertEqual(response.data['assigned'], 1)
+        self.assertEqual(
+            sorted(HousekeepingTask.objects.filter(pk__in=[task.pk for task in tasks]).values_list('assigned_to', flat=True)),
+            sorted([first.pk, first.pk, second.pk]),
+        )
+
+    def test_auto_assign_without_housekeepers(self):
+        HousekeepingTask.objects.create(room=self.rooms[0])
+        response = self.client.post('/api/housekeeping/auto-assign/', {}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    @benchmark
+    def test_benchmark_assignment_time(self):
+        rooms, staff = scaled(2_000), scaled(80)
+        tasks = [(task_id, task_id // 40) for task_id in range(rooms)]
+        loads = {user_id: user_id % 3 for user_id in range(staff)}
+        _, p99 = report(f'assign_tasks, {rooms} tasks x {staff} housekeepers', timings(lambda: assign_tasks(tasks, loads), 50))
+        self.assertLess(p99, 0.1)
+
+        room_type = RoomType.objects.create(hotel=self.hotel, name='Bench', price_weekday=1, price_weekend=1)
+        created = Room.objects.bulk_create(
+            Room(room_type=room_type, room_number=f'B{i}', floor=i // 40) for i in range(rooms)
+        )
+        HousekeepingTask.objects.bulk_create(HousekeepingTask(room=room) for room in created)
+        self._housekeepers(staff)
+        # Writes every assignment, so a single cold run
+        report('auto_assign end to end', timings(lambda: auto_assign(self.hotel.pk), 1))
+
+
+class ImportTests(HotelTestCase):
+    def _upload(self, kind, name, text, client=None, **fields):
+        upload = SimpleUploadedFile(name, text.encode('utf-8'))
+        return (client or self.client).post(f'/api/import/{kind}/', {'file': upload, **fields}, format='multipart')
+
+    def test_rejected_rows_are_reported_by_line(self):
+        response = self._upload('rooms', 'rooms.csv', (
+            "room_type,room_number,floor\n"
+            "Deluxe,201,2\n"
+            "Penthouse,202,2\n"
+            "deluxe,100,1\n"
+            "Deluxe,203,\n"
+            "Deluxe,201,2\n"
+        ))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['created'], response.data['failed']), (1, 4))
+        self.assertEqual([(error['line'], list(error['errors'])) for error in response.data['errors']], [
+            (3, ['room_type']), (4, ['room_number']), (5, ['floor']), (6, ['room_number']),
+        ])
+        self.assertTrue(Room.objects.filter(room_number='201', floor=2).exists())
+
+    def test_jsonl_lines_are_checked_one_by_one(self):
+        response = self._upload('guests', 'guests.jsonl', (
+            '{"name": "A", "email": "a@example.com", "phone": "1"}\n'
+            'not json\n'
+            '[1, 2]\n'
+            '\n'
+            '{"name": "B", "email": "GUEST@example.com", "phone": "2"}\n'
+        ))
+        self.assertEqual((response.data['rows'], response.data['created'], response.data['failed']), (4, 1, 3))
+        self.assertEqual([error['line'] for error in response.data['errors']], [2, 3, 5])
+
+    def test_rows_are_written_chunk_by_chunk(self):
+        rows = ''.join(f'{{"name": "G{i}", "email": "g{i}@example.com", "phone": "{i}"}}\n' for i in range(5))
+        with mock.patch('Hotel.importers.GuestImporter.write', autospec=True,
+                        side_effect=[None, DatabaseError('deadlock'), None]) as write:
+            counts = run_import('guests', io.StringIO(rows), 'jsonl', self.hotel, batch_size=2)
+        self.assertEqual([len(call.args[1]) for call in write.call_args_list], [2, 2, 1])
+        # Only the rejected chunk is lost
+        self.assertEqual(counts, {'rows': 5, 'created': 3, 'failed': 2})
+
+    def test_bookings_fill_the_ledger_and_refuse_double_bookings(self):
+        response = self._upload('bookings', 'bookings.csv', (
+            "guest_email,room_type,room_number,check_in,check_out,status\n"
+            "guest@example.com,Deluxe,100,2030-01-01,2030-01-03,CONFIRMED\n"
+            "guest@example.com,Deluxe,100,2030-01-02,2030-01-04,CONFIRMED\n"
+            "guest@example.com,Deluxe,100,2030-01-03,2030-01-05,CONFIRMED\n"
+            "nobody@example.com,Deluxe,,2030-01-03,2030-01-05,\n"
+        ), batch_size='2')
+        self.assertEqual((response.data['created'], response.data['failed']), (2, 2))
+        self.assertEqual([error['line'] for error in response.data['errors']], [3, 5])
+        self.assertEqual(RoomNight.objects.filter(room=self.rooms[0]).count(), 4)
+        # Priced like a new booking when no total is given
+        self.assertEqual(Booking.objects.order_by('id').first().total_price, Decimal('220.00'))
+
+    def test_rows_only_resolve_in_the_target_hotel(self):
+        other_admin = User.objects.create_user('other')
+        other = Hotel.objects.create(name='Other', location='Kandy', admin_user=other_admin)
+        RoomType.objects.create(hotel=other, name='Cabin', price_weekday=50, price_weekend=60, capacity=2)
+        text = "room_type,room_number,floor\nCabin,1,1\n"
+
+        self.assertEqual(self._upload('rooms', 'rooms.csv', text, hotel=str(other.pk)).data['failed'], 1)
+
+        root = User.objects.create_superuser('root', 'root@example.com', 'pw')
+        client = APIClient()
+        client.force_authenticate(root)
+        response = self._upload('rooms', 'rooms.csv', text, client=client, hotel=str(other.pk))
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual(Room.objects.get(room_number='1').room_type.hotel, other)
+        for value in ('x', '\u00b2', '-1'):
+            response = self._upload('rooms', 'rooms.csv', text, client=client, hotel=value)
+            self.assertEqual(response.status_code, 400)
+        self.assertEqual(self._upload('rooms', 'rooms.csv', text, client=client).status_code, 400)
+
+
+class ExportTests(HotelTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        other = Hotel.objects.create(name='Other', location='Kandy', admin_user=User.objects.create_user('other'))
+        other_type = RoomType.objects.create(hotel=other, name='Suite', price_weekday=90, price_weekend=90, capacity=2)
+        for day, hotel, room_type in [(1, cls.hotel, cls.room_type)] * 5 + [(2, other, other_type), (20, cls.hotel, cls.room_type)]:
+            Booking.objects.create(
+                hotel=hotel, guest=cls.guest, room_type=room_type, total_price=100,
+                check_in=datetime.date(2030, 1, day), check_out=datetime.date(2030, 1, day + 1),
+            )
+        cls.url = '/api/export/bookings/?from=2030-01-01&to=2030-01-10'
+
+    def _rows(self, content):
+        return list(csv.reader(io.StringIO(content.decode())))
+
+    def test_csv_streams_the_window_in_keyset_batches(self):
+        with mock.patch('Hotel.views_export.EXPORT_BATCH_SIZE', 2), CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+            content = b''.join(response.streaming_content)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('attachment; filename="bookings_2030-01-01_2030-01-10.csv"', response['Content-Disposition'])
+        rows = self._rows(content)
+        self.assertEqual(rows[0][:3], ['id', 'hotel', 'guest'])
+        # The admin's hotel only, within the window, in id order
+        self.assertEqual([row[1] for row in rows[1:]], [str(self.hotel.pk)] * 5)
+        self.assertEqual([int(row[0]) for row in rows[1:]], sorted(int(row[0]) for row in rows[1:]))
+        # Three full or partial batches and the empty one that ends the export
+        self.assertEqual(sum('"Hotel_booking"."id" >' in query['sql'] for query in queries.captured_queries), 4)
+
+    def test_staff_cannot_export_another_hotel(self):
+        other = Hotel.objects.get(name='Other')
+        response = self.client.get(f'{self.url}&hotel={other.pk}')
+        self.assertEqual(len(self._rows(b''.join(response.streaming_content))), 6)
+
+    def test_rejects_bad_requests(self):
+        self.assertEqual(self.client.get('/api/export/guests/?from=2030-01-01&to=2030-01-10').status_code, 404)
+        self.assertEqual(self.client.get('/api/export/bookings/?from=2030-01-10&to=2030-01-01').status_code, 400)
+        self.assertEqual(self.client.get(f'{self.url}&file_format=pdf').status_code, 400)
+
+    def test_csv_streams_asynchronously_under_asgi(self):
+        async def download(authorization):
+            response = await AsyncClient().get(self.url, headers={'Authorization': authorization})
+            return response, b''.join([chunk async for chunk in response.streaming_content])
+
+        response, content = async_to_sync(download)(f'Token {Token.objects.create(user=self.admin).key}')
+        self.assertEqual(response.status_code, 200)
+        # An async iterator is sent chunk by chunk; a sync one would be read into memory first
+        self.assertTrue(response.is_async)
+        self.assertEqual(len(self._rows(content)), 6)
+
+    @skipUnless(Workbook, 'openpyxl is not installed')
+    def test_xlsx_export(self):
+        async def download(authorization):
+            response = await AsyncClient().get(f'{self.url}&file_format=xlsx', headers={'Authorization': authorization})
+            return response, b''.join([chunk async for chunk in response.streaming_content])
+
+        response = self.client.get(f'{self.url}&file_format=xlsx')
+        self.assertEqual(response.status_code, 200)
+        asgi_response, content = async_to_sync(download)(f'Token {Token.objects.create(user=self.admin).key}')
+        self.assertTrue(asgi_response.is_async)
+        self.assertEqual(int(asgi_response['Content-Length']), len(content))
+        for body in (b''.join(response.streaming_content), content):
+            workbook = load_workbook(io.BytesIO(body), read_only=True)
+            self.assertEqual(len(list(workbook.active.rows)), 6)
+
+class HotelParamTests(HotelTestCase):
+    """A malformed ?hotel= is a 400, not a server error."""
+
+    def setUp(self):
+        super().setUp()
+        # Without a staff profile the user may pick a hotel
+        self.client.force_authenticate(User.objects.create_superuser('root', 'root@example.com', 'pw'))
+
+    def test_non_numeric_hotel_is_rejected(self):
+        for url in (
+            '/api/availability/?check_in=2030-01-01&check_out=2030-01-03&hotel=abc',
+            '/api/occupancy-grid/?from=2030-01-01&to=2030-01-03&hotel=abc',
+            '/api/analytics/?from=2030-01-01&to=2030-01-03&hotel=abc',
+            '/api/export/bookings/?from=2030-01-01&to=2030-01-03&hotel=abc',
+        ):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('hotel', response.data)
+
+    def test_numeric_hotel_filters(self):
+        response = self.client.get(f'/api/availability/?check_in=2030-01-01&check_out=2030-01-03&hotel={self.hotel.pk}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['id'] for row in response.data['results']], [self.room_type.pk])
+
+
+class EventStreamTests(HotelTestCase):
+    SUBSCRIBERS = 500
+
+    def setUp(self):
+        super().setUp()
+        # The test thread's connection, which sync_to_async calls from the views run on
+        self.db = connections[DEFAULT_DB_ALIAS]
+        self.token = Token.objects.create(user=self.admin).key
+        self.streams = []
+
+    def test_streams_are_refused_under_wsgi(self):
+        response = self.client.get('/api/food-orders/stream/')
+        self.assertEqual(response.status_code, 501)
+
+    async def _get(self, path, token=None, **params):
+        headers = {'Authorization': f'Token {token}'} if token else {}
+        return await AsyncClient().get(path, params, headers=headers)
+
+    async def _open(self, path, token=None, **params):
+        response = await self._get(path, token, **params)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        frames = response.streaming_content
+        self.streams.append(frames)
+        self.assertEqual(await anext(frames), f'retry: {RETRY_MILLISECONDS}\n\n'.encode())
+        return frames
+
+    async def _close(self):
+        for frames in self.streams:
+            await frames.aclose()
+
+    async def _next(self, frames):
+        return await asyncio.wait_for(anext(frames), 1)
+
+    def _recording(self, queries):
+        """Records the SQL run on the test thread's connection; unlike CaptureQueriesContext it opens nothing."""
+        def record(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+        return self.db.execute_wrapper(record)
+
+    def _event(self, frame):
+        fields = dict(line.split(': ', 1) for line in frame.decode().strip().split('\n'))
+        return fields['event'], json.loads(fields['data'])
+
+    def _order(self, hotel):
+        with self.captureOnCommitCallbacks(execute=True):
+            return FoodOrder.objects.create(
+                hotel=hotel, guest=self.guest, room_number='100', items_json=[], total_price=10,
+            )
+
+    async def test_tokens_resolve_through_the_token_cache(self):
+        self.assertEqual((await self._get('/api/food-orders/stream/')).status_code, 401)
+        self.assertEqual((await self._get('/api/food-orders/stream/', token='nope')).status_code, 401)
+        await self._open('/api/food-orders/stream/', token=self.token)
+        # Warm: the header or ?token= costs no query
+        queries = []
+        with self._recording(queries):
+            await self._open('/api/food-orders/stream/', token=self.token)
+            await self._open('/api/housekeeping/stream/', **{'token': self.token})
+        self.assertEqual(queries, [])
+        await self._close()
+
+        self.admin.is_active = False
+        await sync_to_async(self.admin.save)()
+        self.assertEqual((await self._get('/api/food-orders/stream/', token=self.token)).status_code, 401)
+
+    async def test_superuser_without_profile_picks_the_hotel(self):
+        root = await sync_to_async(User.objects.create_superuser)('root', 'root@example.com', 'pw')
+        token = (await Token.objects.acreate(user=root)).key
+        other_admin = await sync_to_async(User.objects.create_user)('other')
+        other = await Hotel.objects.acreate(name='Other', location='Kandy', admin_user=other_admin)
+        for value in ('x', '\u00b2'):
+            response = await self._get('/api/food-orders/stream/', token=token, hotel=value)
+            self.assertEqual(response.status_code, 400)
+        self.assertEqual((await self._get('/api/food-orders/stream/', token=token, hotel='999999')).status_code, 400)
+
+        frames = await self._open('/api/food-orders/stream/', token=token, hotel=str(other.pk))
+        hub.publish(food_orders_channel(other.pk), 'order.created', {'id': 1})
+        self.assertEqual(self._event(await self._next(frames)), ('order.created', {'id': 1}))
+        await self._close()
+
+    async def test_orders_reach_their_own_hotel_only(self):
+        other_admin = await sync_to_async(User.objects.create_user)('other')
+        other = await Hotel.objects.acreate(name='Other', location='Kandy', admin_user=other_admin)
+        frames = await self._open('/api/food-orders/stream/', token=self.token)
+        await sync_to_async(self._order)(other)
+        order = await sync_to_async(self._order)(self.hotel)
+        name, payload = self._event(await self._next(frames))
+        self.assertEqual((name, payload['id']), ('order.created', order.pk))
+        await self._close()
+
+    async def test_resume_replays_missed_events(self):
+        channel = food_orders_channel(self.hotel.pk)
+        seen = hub.publish(channel, 'order.updated', {'id': 1})
+        hub.publish(channel, 'order.updated', {'id': 2})
+        frames = await self._open('/api/food-orders/stream/', token=self.token, last_event_id=seen.id)
+        self.assertEqual(self._event(await self._next(frames)), ('order.updated', {'id': 2}))
+        # An id from another process run cannot be resumed: the client refetches
+        frames = await self._open('/api/food-orders/stream/', token=self.token, last_event_id='1-1')
+        self.assertEqual(await self._next(frames), b'event: reset\ndata: {}\n\n')
+        await self._close()
+
+    async def test_housekeepers_only_receive_their_tasks(self):
+        housekeeper = await sync_to_async(User.objects.create_user)('housekeeper')
+        await StaffProfile.objects.acreate(user=housekeeper, hotel=self.hotel, role='HOUSEKEEPER')
+        token = (await Token.objects.acreate(user=housekeeper)).key
+        frames = await self._open('/api/housekeeping/stream/', token=token)
+        channel = housekeeping_channel(self.hotel.pk)
+        hub.publish(channel, 'task.updated', {'id': 1, 'assigned_to': self.admin.pk, 'previous_assigned_to': None})
+        hub.publish(channel, 'task.updated', {'id': 2, 'assigned_to': None, 'previous_assigned_to': housekeeper.pk})
+        hub.publish(channel, 'room.updated', {'id': 3})
+        self.assertEqual(self._event(await self._next(frames))[1]['id'], 2)
+        self.assertEqual(self._event(await self._next(frames))[1]['id'], 3)
+        await self._close()
+
+    async def test_many_subscribers_share_each_event(self):
+        await self._open('/api/food-orders/stream/', token=self.token)
+        queries = []
+        with self._recording(queries):
+            streams = await asyncio.gather(*(
+                self._open('/api/food-orders/stream/', token=self.token) for _ in range(self.SUBSCRIBERS)
+            ))
+        # Connecting does not touch the database
+        self.assertEqual(queries, [])
+        order = await sync_to_async(self._order)(self.hotel)
+        received = await asyncio.gather(*(self._next(frames) for frames in streams))
+        self.assertEqual({self._event(frame)[1]['id'] for frame in received}, {order.pk})
+        # The frame is encoded once and shared
+        self.assertEqual(len({id(frame) for frame in received}), 1)
+        await self._close()
+
+
+class EventHubTests(HotelTestCase):
+    def setUp(self):
+        super().setUp()
+        self.hub = EventHub()
+
+    def _drain(self, subscription):
+        events = []
+        while not subscription.queue.empty():
+            events.append(subscription.queue.get_nowait())
+        return events
+
+    async def test_events_stay_on_their_channel(self):
+        first, _ = self.hub.subscribe(food_orders_channel(1))
+        second, _ = self.hub.subscribe(food_orders_channel(2))
+        self.hub.publish(food_orders_channel(2), 'order.created', {'id': 1})
+        await asyncio.sleep(0)
+        self.assertEqual(self._drain(first), [])
+        self.assertEqual([event.payload for event in self._drain(second)], [{'id': 1}])
+
+        self.hub.unsubscribe(second)
+        self.hub.publish(food_orders_channel(2), 'order.created', {'id': 2})
+        await asyncio.sleep(0)
+        self.assertEqual(self._drain(second), [])
+
+    async def test_reassigned_task_reaches_both_housekeepers(self):
+        old, new = self.admin.pk, self.admin.pk + 1000
+        mine = {
+            user_id: self.hub.subscribe(housekeeping_channel(self.hotel.pk), predicate=_assigned_to(user_id))[0]
+            for user_id in (old, new, new + 1)
+        }
+        self.hub.publish(housekeeping_channel(self.hotel.pk), 'task.updated',
+                         {'id': 1, 'assigned_to': new, 'previous_assigned_to': old})
+        self.hub.publish(housekeeping_channel(self.hotel.pk), 'room.updated', {'id': 2})
+        await asyncio.sleep(0)
+        received = {user_id: [event.name for event in self._drain(sub)] for user_id, sub in mine.items()}
+        self.assertEqual(received, {
+            old: ['task.updated', 'room.updated'], new: ['task.updated', 'room.updated'], new + 1: ['room.updated'],
+        })
+
+    def test_task_signals_publish_the_previous_assignee(self):
+        first = User.objects.create_user('first')
+        second = User.objects.create_user('second')
+        task = HousekeepingTask.objects.create(room=self.rooms[0], assigned_to=first)
+        with mock.patch.object(hub, 'publish') as publish, self.captureOnCommitCallbacks(execute=True):
+            task.assigned_to = second
+            task.save()
+        channel, name, payload = publish.call_args.args
+        self.assertEqual((channel, name), (housekeeping_channel(self.hotel.pk), 'task.updated'))
+        self.assertEqual((payload['assigned_to'], payload['previous_assigned_to']), (second.pk, first.pk))
+
+    async def test_slow_subscriber_is_reset(self):
+        with mock.patch('Hotel.events.QUEUE_SIZE', 3):
+            subscription, _ = self.hub.subscribe('slow')
+        for i in range(4):
+            self.hub.publish('slow', 'order.updated', {'id': i})
+        await asyncio.sleep(0)
+        # The fourth event overflowed the queue: the backlog is dropped for a single reset
+        self.assertEqual(subscription.queue.qsize(), 1)
+        self.assertIs(await anext(subscription), RESET)
+
+    async def test_resume_past_the_history_is_a_reset(self):
+        with mock.patch('Hotel.events.HISTORY_SIZE', 2):
+            self.hub.publish('short', 'order.updated', {'id': 0})
+        first = self.hub.publish('short', 'order.updated', {'id': 1})
+        for i in range(2, 5):
+            self.hub.publish('short', 'order.updated', {'id': i})
+        self.assertIsNone(self.hub.subscribe('short', first.id)[1])
+        self.assertEqual(
+            [event.payload['id'] for event in self.hub.subscribe('short', f'{self.hub._epoch}-3')[1]], [3, 4],
+        )
+
+    def test_closed_loop_unsubscribes(self):
+        loop = asyncio.new_event_loop()
+        loop.run_until_complete(self._subscribe('gone'))
+        loop.close()
+        self.hub.publish('gone', 'order.updated', {'id': 1})
+        self.assertEqual(self.hub._channels['gone'].subscribers, set())
+
+    async def _subscribe(self, channel):
+        return self.hub.subscribe(channel)[0]
+
+
+class TenantScopeTests(HotelTestCase):
+    """Staff of one hotel can neither see nor change another hotel's rooms."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        other_admin = User.objects.create_user('other', 'other@example.com', 'pw')
+        other_hotel = Hotel.objects.create(name='Other', location='Kandy', admin_user=other_admin)
+        other_type = RoomType.objects.create(hotel=other_hotel, name='Suite', price_weekday=200, price_weekend=250, capacity=2)
+        cls.other_room = Room.objects.create(room_type=other_type, room_number='900', floor=9)
+        cls.other_task = HousekeepingTask.objects.create(room=cls.other_room)
+
+    def test_bulk_transition_ignores_other_hotels(self):
+        response = self.client.post('/api/housekeeping/bulk-transition/', {
+            'rooms': [{'id': self.other_room.pk, 'status': 'DIRTY'}],
+            'tasks': [{'id': self.other_task.pk, 'status': 'CLEAN'}],
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['rooms'], [self.other_room.pk])
+        self.assertEqual(response.data['tasks'], [self.other_task.pk])
+        self.other_task.refresh_from_db()
+        self.assertEqual(self.other_task.status, HousekeepingTask.TaskStatus.DIRTY)
+
+    def test_occupancy_grid_shows_own_hotel_only(self):
+        response = self.client.get(f'/api/occupancy-grid/?from=2030-01-01&to=2030-01-08&hotel={self.other_room.room_type.hotel_id}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sorted(room['id'] for room in response.data['rooms']), [room.pk for room in self.rooms])
+
+
+class TokenAuthenticationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('clerk', 'clerk@example.com', 'old-password')
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_cached_entry_leaves_out_the_password(self):
+        entry = get_entry(self.token.key)
+        self.assertNotIn('password', USER_FIELDS)
+        self.assertNotIn(self.user.password, entry['user'])
+        user, _ = CachedTokenAuthentication().authenticate_credentials(self.token.key)
+        self.assertEqual(user.username, 'clerk')
+        self.assertIn('password', user.get_deferred_fields())
+
+    def test_change_password_loads_the_deferred_hash(self):
+        response = self.client.put('/api/change-password/', {
+            'old_password': 'old-password', 'new_password': 'new-password',
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password('new-password'))
+        self.assertEqual(self.user.email, 'clerk@example.com')
+
+    def _request(self):
+        return RequestFactory().get('/api/bookings/', HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_warm_token_costs_no_query(self):
+        with CaptureQueriesContext(connection) as cold:
+            CachedTokenAuthentication().authenticate(self._request())
+        with CaptureQueriesContext(connection) as warm:
+            user, _ = CachedTokenAuthentication().authenticate(self._request())
+        self.assertEqual((len(cold), len(warm)), (1, 0))
+        self.assertEqual(user.pk, self.user.pk)
+
+        # Logging out drops the entry
+        self.token.delete()
+        with self.assertRaises(AuthenticationFailed):
+            CachedTokenAuthentication().authenticate(self._request())
+
+    @benchmark
+    def test_benchmark_auth_step(self):
+        request = self._request()
+        for backend in (TokenAuthentication(), CachedTokenAuthentication()):
+            backend.authenticate(request)
+            with CaptureQueriesContext(connection) as queries:
+                samples = timings(lambda: backend.authenticate(request), 2_000)
+            report(f'{type(backend).__name__}, warm', samples)
+            print(f"{len(queries) / len(samples):g} queries per request")
+        self.assertEqual(len(queries), 0)
+
+
+class MaintenanceModeTests(HotelTestCase):
+    def setUp(self):
+        super().setUp()
+        # The middleware runs before DRF, so it only knows token-authenticated users
+        self.auth = f'Token {Token.objects.create(user=self.admin).key}'
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=self.auth)
+
+    def _maintenance(self, hotel, on):
+        hotel.maintenance_mode = on
+        hotel.save()
+
+    def _write(self, client=None):
+        return (client or self.client).post('/api/amenities/', {'name': 'Pool'}, format='json')
+
+    def test_writes_get_503_while_reads_go_through(self):
+        self._maintenance(self.hotel, True)
+        response = self._write()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], str(MAINTENANCE_RETRY_AFTER))
+        self.assertEqual(self.client.get('/api/bookings/').status_code, 200)
+        self.assertFalse(Amenity.objects.exists())
+
+    def test_saving_the_hotel_refreshes_every_cached_config(self):
+        self.assertEqual(self._write().status_code, 201)
+        # Warm: the check costs no query
+        request = RequestFactory().post('/api/amenities/', HTTP_AUTHORIZATION=self.auth)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertFalse(in_maintenance(request))
+        self.assertEqual(len(queries), 0)
+        self._maintenance(self.hotel, True)
+        self.assertEqual(self._write().status_code, 503)
+        self._maintenance(self.hotel, False)
+        self.assertEqual(self._write().status_code, 201)
+
+    def test_exempt_paths_stay_writable(self):
+        self._maintenance(self.hotel, True)
+        # The admin can switch maintenance off again
+        response = self.client.patch(f'/api/hotels/{self.hotel.pk}/', {'maintenance_mode': False}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self._write().status_code, 201)
+        self._maintenance(self.hotel, True)
+        self.assertNotEqual(self.client.post('/api/payhere/notify/', {}).status_code, 503)
+
+    def test_other_hotels_are_not_affected(self):
+        other_admin = User.objects.create_user('other', is_staff=True)
+        other = Hotel.objects.create(name='Other', location='Kandy', admin_user=other_admin)
+        StaffProfile.objects.create(user=other_admin, hotel=other, role='ADMIN')
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=other_admin).key}')
+        self._maintenance(self.hotel, True)
+        self.assertEqual(self._write(client).status_code, 201)
+
+    def test_asgi_writes_get_503(self):
+        self._maintenance(self.hotel, True)
+        async def write():
+            return await AsyncClient().post('/api/amenities/', {'name': 'Pool'}, headers={'Authorization': self.auth})
+
+        self.assertEqual(async_to_sync(write)().status_code, 503)
+
+
+class MetricsAccessTests(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user('ops', is_staff=True)
+        self.clerk = User.objects.create_user('clerk')
+
+    def _get(self, authorization=None):
+        headers = {'HTTP_AUTHORIZATION': authorization} if authorization else {}
+        return self.client.get('/metrics/', **headers)
+
+    def test_closed_to_anonymous_and_non_staff_users(self):
+        self.assertEqual(self._get().status_code, 403)
+        self.assertEqual(self._get(f'Token {Token.objects.create(user=self.clerk).key}').status_code, 403)
+        self.assertEqual(self._get('Token not-a-token').status_code, 403)
+        self.client.force_login(self.clerk)
+        self.assertEqual(self._get().status_code, 403)
+
+    def test_open_to_staff(self):
+        self.assertEqual(self._get(f'Token {Token.objects.create(user=self.staff).key}').status_code, 200)
+        self.client.force_login(self.staff)
+        self.assertEqual(self._get().status_code, 200)
+
+    def test_open_to_the_metrics_token(self):
+        with mock.patch('Hotel.metrics.METRICS_TOKEN', 'scrape-secret'):
+            self.assertEqual(self._get('Bearer scrape-secret').status_code, 200)
+            self.assertEqual(self._get('Bearer wrong').status_code, 403)
+        self.assertEqual(self._get('Bearer scrape-secret').status_code, 403)
+
+class MetricsMiddlewareTests(HotelTestCase):
+    def setUp(self):
+        super().setUp()
+        self.headers = {'Authorization': f'Token {Token.objects.create(user=self.admin).key}'}
+        # Resolves and caches the token, so every measured request runs the same queries
+        self.assertEqual(Client().get('/api/bookings/', headers=self.headers).status_code, 200)
+        registry.reset()
+
+    def _queries(self, route):
+        return {key: queries for key, _, _, _, queries, *_ in registry.snapshot()}.get((route, 'GET'))
+
+    def test_asgi_requests_count_their_queries(self):
+        Client().get('/api/bookings/', headers=self.headers)
+        wsgi = self._queries('booking-list')
+        registry.reset()
+        response = async_to_sync(AsyncClient().get)('/api/bookings/', headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(wsgi, 0)
+        self.assertEqual(self._queries('booking-list'), wsgi)
+
+    @benchmark
+    def test_benchmark_middleware_overhead(self):
+        # A one-query view, so the execute_wrapper's per-statement cost is measured too
+        def view(request):
+            Hotel.objects.filter(pk=self.hotel.pk).exists()
+            return HttpResponse(b'{}', content_type='application/json')
+
+        request = RequestFactory().get('/api/bookings/')
+        request.resolver_match = resolve('/api/bookings/')
+        wrapped = metrics_middleware(view)
+        bare, _ = report('bare view', timings(lambda: view(request), 20_000))
+        timed, _ = report('through metrics_middleware', timings(lambda: wrapped(request), 20_000))
+        print(f"overhead {(timed - bare) * 1e6:.1f}µs per request")
+        self.assertLess(timed - bare, 50e-6)
+
+
+class SqlCaptureTests(HotelTestCase):
+    def setUp(self):
+        super().setUp()
+        set_config(enabled=False, reset=True)
+        self.addCleanup(set_config, enabled=False, reset=True)
+
+    def test_fingerprint_folds_literals_and_lists(self):
+        for sql, expected in [
+            ("SELECT * FROM t WHERE id IN (%s, %s, %s) AND name = 'x''y' LIMIT 21",
+             "SELECT * FROM t WHERE id IN (?+) AND name = ? LIMIT ?"),
+            ('SELECT "t1"."col2" FROM "t1" WHERE "t1"."id" = -5.5', 'SELECT "t1"."col2" FROM "t1" WHERE "t1"."id" = ?'),
+            ("INSERT INTO t (a, b) VALUES (%s, %s), (%s, %s), (%s, %s)", "INSERT INTO t (a, b) VALUES (?+), ..."),
+            ("SELECT  a\n  FROM t WHERE b = ?", "SELECT a FROM t WHERE b = ?"),
+        ]:
+            self.assertEqual(fingerprint(sql), expected)
+        self.assertEqual(fingerprint("SELECT * FROM t WHERE id IN (1, 2)"), fingerprint("SELECT * FROM t WHERE id IN (%s)"))
+
+    def test_report_ranks_fingerprints_and_views(self):
+        for _ in range(4):
+            record_request('booking-list', [('SELECT * FROM b WHERE id = 1', 0.001)] * 10)
+        record_request('room-list', [('SELECT * FROM r WHERE id = 2', 0.05)])
+        record_request('room-list', [('SELECT * FROM b WHERE id = 3', 0.002)])
+
+        report = build_report()
+        self.assertEqual(report['sampled_requests'], 6)
+        rows = report['fingerprints']
+        self.assertEqual([row['fingerprint'] for row in rows], ['SELECT * FROM r WHERE id = ?', 'SELECT * FROM b WHERE id = ?'])
+        self.assertEqual(rows[1]['count'], 41)
+        # The N+1 stands out as calls per request of the view
+        self.assertEqual([(view['view'], view['per_request']) for view in rows[1]['views']], [('booking-list', 10.0), ('room-list', 0.5)])
+        self.assertEqual([row['count'] for row in build_report(order='count')['fingerprints']], [41, 1])
+        self.assertEqual(len(build_report(view='room-list')['fingerprints']), 2)
+
+    def test_asgi_requests_are_captured(self):
+        set_config(enabled=True, sample_rate=1.0)
+        headers = {'Authorization': f'Token {Token.objects.create(user=self.admin).key}'}
+        response = async_to_sync(AsyncClient().get)('/api/bookings/', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        report = build_report(view='booking-list')
+        self.assertEqual(report['sampled_requests'], 1)
+        self.assertTrue(any('"Hotel_booking"' in row['fingerprint'] for row in report['fingerprints']))
+
+class QueryCountTests(HotelTestCase):
+    """
+    Every router endpoint runs the same number of queries for N and 10N rows, so a
+    serializer reaching through an unloaded relation shows up as a failure.
+    """
+    N = 3
+
+    def setUp(self):
+        super().setUp()
+        self.sequence = itertools.count(1000)
+
+    # Each row gets its own related rows, so per-row lookups cannot hide behind one shared object
+    def _guest(self, i):
+        return Guest.objects.create(name=f'Guest {i}', email=f'guest{i}@example.com', phone=str(i))
+
+    def _user(self, i):
+        return User.objects.create_user(f'user{i}', f'user{i}@example.com', first_name=f'User {i}')
+
+    def _staff(self, i):
+        return StaffProfile.objects.create(user=self._user(i), hotel=self.hotel)
+
+    def _room(self, i):
+        return Room.objects.create(room_type=self.room_type, room_number=str(i), floor=i % 5)
+
+    def _booking(self, i):
+        return Booking.objects.create(
+            hotel=self.hotel, guest=self._guest(i), room_type=self.room_type, room=self._room(i),
+            check_in=datetime.date(2030, 1, 1), check_out=datetime.date(2030, 1, 3), total_price=200,
+        )
+
+    def _invoice(self, i):
+        invoice = Invoice.objects.create(booking=self._booking(i), amount=200, due_date=datetime.date(2030, 1, 1))
+        Payment.objects.create(invoice=invoice, amount=100, method='CASH')
+        return invoice
+
+    def _room_type(self, i):
+        room_type = RoomType.objects.create(hotel=self.hotel, name=f'Type {i}', price_weekday=100, price_weekend=120)
+        room_type.amenities.add(Amenity.objects.create(name=f'Amenity {i}'))
+        return room_type
+
+    SEEDERS = {
+        'hotels': lambda self, i: Hotel.objects.create(name=f'Hotel {i}', location='L', admin_user=self._user(i)),
+        'users': _user,
+        'staff': _staff,
+        'amenities': lambda self, i: Amenity.objects.create(name=f'Amenity {i}'),
+        'room-types': _room_type,
+        'rooms': _room,
+        'guests': _guest,
+        'bookings': _booking,
+        'invoices': _invoice,
+        'payments': lambda self, i: self._invoice(i).payments.get(),
+        'housekeeping': lambda self, i: HousekeepingTask.objects.create(room=self._room(i), assigned_to=self._user(i)),
+        'inventory': lambda self, i: InventoryItem.objects.create(hotel=self.hotel, name=f'Item {i}'),
+        'coupons': lambda self, i: DiscountCoupon.objects.create(
+            hotel=self.hotel, code=f'CODE{i}', discount_percent=10,
+            valid_from=datetime.date(2030, 1, 1), valid_to=datetime.date(2030, 2, 1),
+        ),
+        'payroll': lambda self, i: PayrollEntry.objects.create(
+            staff=self._staff(i), salary_amount=1000, payment_date=datetime.date(2030, 1, 1),
+        ),
+        'food-items': lambda self, i: FoodItem.objects.create(hotel=self.hotel, name=f'Dish {i}', category='mains', price=10),
+        'food-orders': lambda self, i: FoodOrder.objects.create(
+            hotel=self.hotel, guest=self._guest(i), room_number='101', items_json=[], total_price=10,
+        ),
+        'blogs': lambda self, i: Blog.objects.create(hotel=self.hotel, title=f'Post {i}', content='Text'),
+        'event-bookings': lambda self, i: EventBooking.objects.create(
+            hotel=self.hotel, guest=self._guest(i), event_type='PARTY',
+            start_date=datetime.date(2030, 1, 1), end_date=datetime.date(2030, 1, 2), attendees=10,
+        ),
+        'contact-messages': lambda self, i: ContactMessage.objects.create(
+            name=f'Visitor {i}', email=f'visitor{i}@example.com', subject='Hello', message='Text',
+        ),
+        'promo-banners': lambda self, i: PromoBanner.objects.create(hotel=self.hotel, title=f'Promo {i}', message='Text'),
+    }
+
+    def _seed(self, prefix, count):
+        return [self.SEEDERS[prefix](self, next(self.sequence)) for _ in range(count)]
+
+    def _count(self, url):
+        # A first request settles per-user lookups that seeding invalidated; cached
+        # responses would then answer without the queries being measured
+        self.client.get(url)
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        return len(queries), response
+
+    def test_every_router_endpoint_is_constant_in_rows(self):
+        self.assertEqual({prefix for prefix, *_ in router.registry}, set(self.SEEDERS))
+        for prefix, *_ in router.registry:
+            with self.subTest(endpoint=prefix):
+                rows = self._seed(prefix, self.N)
+                list_queries, response = self._count(f'/api/{prefix}/')
+                retrieve_queries, _ = self._count(f'/api/{prefix}/{rows[0].pk}/')
+
+                rows = self._seed(prefix, 9 * self.N)
+                more_list_queries, more_response = self._count(f'/api/{prefix}/')
+                more_retrieve_queries, _ = self._count(f'/api/{prefix}/{rows[-1].pk}/')
+
+                # The seeded rows are really listed
+                listed = more_response.data['results'] if 'results' in more_response.data else more_response.data
+                self.assertGreaterEqual(len(listed), 10 * self.N)
+                self.assertEqual(more_list_queries, list_queries, 'list')
+                self.assertEqual(more_retrieve_queries, retrieve_queries, 'retrieve')
+
+
+def full_scans(queryset):
+    """Tables the database would read in full to answer ``queryset``."""
+    if connection.vendor == 'mysql':
+        scans = []
+
+        def walk(node):
+            if isinstance(node, dict):
+                if node.get('access_type') == 'ALL':
+                    scans.append(node.get('table_name'))
+                for value in node.values():
+                    walk(value)
+            elif isinstance(node, list):
+                for value in node:
+                    walk(value)
+
+        walk(json.loads(queryset.explain(format='json')))
+        return scans
+    plan = queryset.explain()
+    # SQLite: "SCAN table" without an index; an index walked in order is fine. PostgreSQL: "Seq Scan on table"
+    return re.findall(r'\bSCAN (\w+)\s*$', plan, re.MULTILINE) + re.findall(r'Seq Scan on (\w+)', plan)
+
+
+class QueryPlanTests(HotelTestCase):
+    """The hot queries stay on their indexes (see the Meta.indexes of models.py)."""
+
+    def test_hot_queries_use_indexes(self):
+        day = datetime.date(2030, 1, 1)
+        hotel_id, guest_id = self.hotel.pk, self.guest.pk
+        queries = {
+            'booking list': BookingViewSet.queryset.filter(hotel_id=hotel_id)[:101],
+            'booking keyset page': BookingViewSet.queryset.filter(Q(check_in__lt=day) | Q(check_in=day, pk__lt=50))[:101],
+            "guest's bookings": Booking.objects.filter(guest_id=guest_id).order_by('-check_in'),
+            'departures': Booking.objects.filter(hotel_id=hotel_id, check_out=day),
+            'room overlap': Booking.objects.filter(
+                room_id=self.rooms[0].pk, status=Booking.BookingStatus.CONFIRMED, check_in__lt=day, check_out__gt=day,
+            ),
+            'free rooms': free_rooms(self.room_type, day, day + datetime.timedelta(days=3)),
+            'guest by email': Guest.objects.alias(email_lower=Lower('email')).filter(email_lower='guest@example.com'),
+            'payroll of staff': PayrollEntryViewSet.queryset.filter(staff_id=1),
+            "guest's events": EventBookingViewSet.queryset.filter(guest_id=guest_id),
+            'payment list': PaymentViewSet.queryset.filter(invoice__booking__hotel_id=hotel_id)[:101],
+            'invoice list': InvoiceViewSet.queryset.filter(booking__hotel_id=hotel_id),
+            'food order list': FoodOrderViewSet.queryset.filter(hotel_id=hotel_id)[:101],
+            'contact message list': ContactMessageViewSet.queryset[:101],
+            'housekeeping list': HousekeepingTaskViewSet.queryset.filter(room__room_type__hotel_id=hotel_id),
+        }
+        for name, queryset in queries.items():
+            with self.subTest(query=name):
+                self.assertEqual(full_scans(queryset), [], queryset.explain())
+
+
+class PayHereQueueTests(HotelTestCase):
+    def _order(self):
+        booking = Booking.objects.create(
+            hotel=self.hotel, guest=self.guest, room_type=self.room_type,
+            check_in=datetime.date(2030, 1, 1), check_out=datetime.date(2030, 1, 3), total_price=200,
+        )
+        Invoice.objects.create(booking=booking, amount=200, due_date=booking.check_in)
+        return booking
+
+    def _notification(self, booking, payment_id, **fields):
+        return PayHereNotification.objects.create(
+            payment_id=payment_id, order_id=f'BK-{booking.pk}', status_code=SUCCESS_STATUS_CODE,
+            payload={'payhere_amount': '200.00'}, signature_valid=True, **fields,
+        )
+
+    def _data(self, booking, payment_id):
+        data = {
+            'merchant_id': settings.PAYHERE_MERCHANT_ID, 'order_id': f'BK-{booking.pk}',
+            'payment_id': payment_id, 'payhere_amount': '200.00',
+            'payhere_currency': settings.PAYHERE_CURRENCY, 'status_code': SUCCESS_STATUS_CODE,
+        }
+        data['md5sig'] = notify_signature(data)
+        return data
+
+    def test_notify_only_logs_the_delivery(self):
+        booking = self._order()
+        response = APIClient().post('/api/payhere/notify/', self._data(booking, '320001'))
+        self.assertEqual(response.status_code, 200)
+        notification = PayHereNotification.objects.get()
+        self.assertTrue(notification.signature_valid)
+        self.assertIsNone(notification.processed_at)
+        self.assertFalse(Payment.objects.exists())
+
+        self.assertEqual(process_batch(), 1)
+        self.assertEqual(Payment.objects.get().invoice.booking, booking)
+        self.assertEqual(process_batch(), 0)
+
+    def test_failures_back_off_exponentially_then_park(self):
+        notification = self._notification(self._order(), '320001')
+        start = timezone.now()
+        with mock.patch('Hotel.payhere._apply', side_effect=OperationalError('lock wait timeout')):
+            delays = []
+            for attempt in range(1, MAX_ATTEMPTS + 1):
+                PayHereNotification.objects.filter(pk=notification.pk).update(next_attempt_at=start)
+                with mock.patch('Hotel.payhere.timezone.now', return_value=start):
+                    self.assertEqual(process_batch(), 1)
+                notification.refresh_from_db()
+                self.assertEqual(notification.attempts, attempt)
+                self.assertEqual(notification.last_error, 'OperationalError: lock wait timeout')
+                if notification.processed_at is None:
+                    delays.append((notification.next_attempt_at - start).total_seconds())
+                    # Not due yet: the next run leaves it alone
+                    self.assertEqual(process_batch(), 0)
+        expected = [min(RETRY_BASE_SECONDS * 2 ** i, RETRY_MAX_SECONDS) for i in range(MAX_ATTEMPTS - 1)]
+        self.assertEqual(delays, expected)
+        self.assertEqual(notification.outcome, PayHereNotification.Outcome.FAILED)
+        self.assertFalse(Payment.objects.exists())
+
+    def test_a_failing_delivery_does_not_sink_the_batch(self):
+        first, second = self._order(), self._order()
+        failing = self._notification(first, '320001')
+        self._notification(second, '320002')
+        apply = payhere_apply
+
+        def flaky(notification):
+            if notification.pk == failing.pk:
+                # Written, then rolled back to the delivery's savepoint
+                Payment.objects.create(invoice=first.invoices.get(), amount=1, method='PAYHERE')
+                raise DatabaseError('boom')
+            return apply(notification)
+
+        with mock.patch('Hotel.payhere._apply', side_effect=flaky):
+            self.assertEqual(process_batch(), 2)
+        self.assertEqual(list(Payment.objects.values_list('transaction_id', flat=True)), ['320002'])
+        failing.refresh_from_db()
+        self.assertEqual((failing.attempts, failing.processed_at), (1, None))
+
+    def test_batch_is_processed_in_order_id_order(self):
+        orders = [self._order() for _ in range(3)]
+        for i, booking in enumerate(reversed(orders)):
+            self._notification(booking, f'32000{i}')
+        self._notification(orders[0], '320009')
+        seen = []
+        apply = payhere_apply
+
+        def record(notification):
+            seen.append(notification.order_id)
+            return apply(notification)
+
+        with mock.patch('Hotel.payhere._apply', side_effect=record):
+            process_batch()
+        # Invoice locks are taken in one global order, whichever rows a worker claimed
+        self.assertEqual(seen, sorted(seen))
+        self.assertEqual(len(seen), 4)
+
+    def test_queue_stats(self):
+        booking = self._order()
+        self._notification(booking, '320001')
+        self._notification(booking, '320002', attempts=2, next_attempt_at=timezone.now() + datetime.timedelta(hours=1))
+        process_batch()
+        stats = queue_stats()
+        self.assertEqual(
+            (stats['depth'], stats['due'], stats['retrying'], stats['processed_last_hour'], stats['failed_last_hour']),
+            (1, 0, 1, 1, 0),
+        )
+
+    @benchmark
+    def test_benchmark_notify_latency(self):
+        booking = self._order()
+        client = APIClient()
+        deliveries = iter([self._data(booking, f'{i:06d}') for i in range(scaled(1_000))])
+        samples = timings(lambda: client.post('/api/payhere/notify/', next(deliveries)), scaled(1_000))
+        _, p99 = report('payhere notify', samples)
+        print(f"{len(samples) / sum(samples):.0f} requests/s from one client")
+        self.assertLess(p99, 0.01)
+
+
+class ConcurrentBookingTests(TransactionTestCase):
+    """Parallel requests for the same nights must never share a room."""
+    THREADS = 12
+
+    def setUp(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest('Threads cannot share an in-memory SQLite database.')
+        create_hotel(self)
+
+    def _book(self, barrier, check_in, check_out, statuses):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        try:
+            barrier.wait()
+            response = client.post('/api/bookings/', {
+                'guest': self.guest.pk, 'room_type': self.room_type.pk,
+                'check_in': check_in.isoformat(), 'check_out': check_out.isoformat(),
+            }, format='json')
+            statuses.append(response.status_code)
+        finally:
+            connection.close()
+
+    def test_parallel_bookings_do_not_overlap(self):
+        day = datetime.date(2030, 3, 2)
+        # Every thread wants a stay overlapping all the others on the 4th
+        stays = [(day + datetime.timedelta(days=i % 3), day + datetime.timedelta(days=3 + i % 2)) for i in range(self.THREADS)]
+        barrier, statuses = threading.Barrier(self.THREADS), []
+        threads = [threading.Thread(target=self._book, args=(barrier, *stay, statuses)) for stay in stays]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(statuses), self.THREADS)
+        self.assertEqual(set(statuses) - {201, 400}, set())
+        # Three rooms and one night everyone needs: exactly three bookings win
+        self.assertEqual(statuses.count(201), len(self.rooms))
+        bookings = list(Booking.objects.order_by('pk'))
+        self.assertEqual(len(bookings), len(self.rooms))
+        self.assertEqual(len({booking.room_id for booking in bookings}), len(self.rooms))
+        for booking in bookings:
+            nights = RoomNight.objects.filter(booking=booking).count()
+            self.assertEqual(nights, (booking.check_out - booking.check_in).days)
+
+
+class DuplicateNotificationTests(TransactionTestCase):
+    """Replayed PayHere deliveries, processed by parallel workers, pay each order once."""
+    ORDERS = 20
+    DELIVERIES = 10_000
+    # Deliveries that go through the notify endpoint; the rest are logged directly
+    POSTED = 200
+    THREADS = 8
+    WORKERS = 4
+
+    def setUp(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest('Threads cannot share an in-memory SQLite database.')
+        create_hotel(self)
+        self.notifications = []
+        for i in range(self.ORDERS):
+            booking = Booking.objects.create(
+                hotel=self.hotel, guest=self.guest, room_type=self.room_type,
+                check_in=datetime.date(2030, 1, 1), check_out=datetime.date(2030, 1, 3), total_price=200,
+            )
+            Invoice.objects.create(booking=booking, amount=200, due_date=datetime.date(2030, 1, 1))
+            data = {
+                'merchant_id': settings.PAYHERE_MERCHANT_ID, 'order_id': f'BK-{booking.pk}',
+                'payment_id': f'32000{i:05d}', 'payhere_amount': '200.00',
+                'payhere_currency': settings.PAYHERE_CURRENCY, 'status_code': SUCCESS_STATUS_CODE,
+            }
+            data['md5sig'] = notify_signature(data)
+            self.notifications.append(data)
+
+    def _run(self, target, args_list):
+        threads = [threading.Thread(target=target, args=args) for args in args_list]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def _post(self, barrier, deliveries, statuses):
+        client = APIClient()
+        try:
+            barrier.wait()
+            for data in deliveries:
+                statuses.append(client.post('/api/payhere/notify/', data).status_code)
+        finally:
+            connection.close()
+
+    def _work(self, barrier):
+        try:
+            barrier.wait()
+            while True:
+                try:
+                    if not process_batch(200):
+                        break
+                except OperationalError:
+                    # Lost a lock race: the batch rolled back and is claimed again
+                    connection.close()
+        finally:
+            connection.close()
+
+    def test_replayed_notifications_pay_each_order_once(self):
+        deliveries = list(itertools.islice(itertools.cycle(self.notifications), self.DELIVERIES))
+        posted, logged = deliveries[:self.POSTED], deliveries[self.POSTED:]
+        PayHereNotification.objects.bulk_create([
+            PayHereNotification(
+                payment_id=data['payment_id'], order_id=data['order_id'], status_code=data['status_code'],
+                payload=data, signature_valid=True,
+            )
+            for data in logged
+        ], batch_size=1000)
+
+        barrier, statuses = threading.Barrier(self.THREADS), []
+        self._run(self._post, [(barrier, posted[i::self.THREADS], statuses) for i in range(self.THREADS)])
+        self.assertEqual(statuses, [200] * self.POSTED)
+
+        barrier = threading.Barrier(self.WORKERS)
+        self._run(self._work, [(barrier,)] * self.WORKERS)
+
+        self.assertFalse(PayHereNotification.objects.filter(processed_at=None).exists())
+        outcomes = dict(PayHereNotification.objects.values_list('outcome').annotate(Count('id')))
+        self.assertEqual(outcomes, {
+            PayHereNotification.Outcome.PAID: self.ORDERS,
+            PayHereNotification.Outcome.DUPLICATE: self.DELIVERIES - self.ORDERS,
+        })
+        self.assertEqual(Payment.objects.count(), self.ORDERS)
+        self.assertEqual(
+            sorted(Payment.objects.values_list('transaction_id', flat=True)),
+            sorted(data['payment_id'] for data in self.notifications),
+        )
+        self.assertFalse(Invoice.objects.exclude(status=Invoice.InvoiceStatus.PAID).exists())
+        self.assertFalse(Booking.objects.exclude(status=Booking.BookingStatus.CONFIRMED).exists())
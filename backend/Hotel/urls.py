@@ -1,4 +1,11 @@
 from .views_dashboard import dashboard_summary
+from .views_availability import availability_search, occupancy_grid
+from .views_pricing import quote
+from .views_analytics import analytics
+from .views_stream import food_order_stream, housekeeping_stream
+from .views_import import import_rows
+from .views_export import export
+from .views_sqlstats import sql_report
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from rest_framework.authtoken.views import obtain_auth_token
@@ -33,7 +40,18 @@ router.register(r'promo-banners', views.PromoBannerViewSet) # <--- REGISTER THIS
 # This one line creates all the URLs for list, create, detail, update, etc.
 urlpatterns = [
     path('dashboard/', dashboard_summary, name='dashboard'),
+    path('availability/', availability_search, name='availability'),
+    path('occupancy-grid/', occupancy_grid, name='occupancy-grid'),
+    path('quote/', quote, name='quote'),
+    path('analytics/', analytics, name='analytics'),
+    path('import/<str:kind>/', import_rows, name='import'),
+    path('export/<str:kind>/', export, name='export'),
+    path('sql-report/', sql_report, name='sql-report'),
+    # Before the router so 'stream' is not taken for an order id
+    path('food-orders/stream/', food_order_stream, name='food-order-stream'),
+    path('housekeeping/stream/', housekeeping_stream, name='housekeeping-stream'),
     path('login/', views.CustomAuthToken.as_view(), name='api_token_auth'), 
+    path('logout/', views.logout_view, name='logout'),
     path('change-password/', views.ChangePasswordView.as_view(), name='change-password'),
     path('request-reset/', views.PasswordResetRequestView.as_view(), name='request-reset'),
     path('confirm-reset/', views.PasswordResetConfirmView.as_view(), name='confirm-reset'),
@@ -41,6 +59,7 @@ urlpatterns = [
     # --- FIX: REMOVE 'api/' PREFIX FROM THESE LINES ---
     path('payhere/init/', views.payhere_init, name='payhere_init'),
     path('payhere/notify/', views.payhere_notify, name='payhere_notify'),
+    path('payhere/queue/', views.payhere_queue, name='payhere_queue'),
     path('payhere/success/', views.payhere_success, name='payhere_success'), # Added trailing slash
     path('payhere/cancel/', views.payhere_cancel, name='payhere_cancel'),   # Added trailing slash
     
@@ -7,10 +7,12 @@ from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.authtoken.models import Token
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from django.db import IntegrityError
+from django.db import IntegrityError, transaction
+from django.db.models.functions import Lower
+from django.utils import timezone
 import hashlib 
 from django.conf import settings
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.permissions import IsAuthenticatedOrReadOnly
 
@@ -25,14 +27,25 @@ from .serializers import (
     HotelSerializer, StaffProfileSerializer, AmenitySerializer, RoomTypeSerializer, RoomSerializer,
     GuestSerializer, BookingSerializer, InvoiceSerializer, PaymentSerializer,
     HousekeepingTaskSerializer, InventoryItemSerializer, DiscountCouponSerializer,
-    UserSerializer,PayrollEntrySerializer,FoodItemSerializer, FoodOrderSerializer,BlogSerializer,ChangePasswordSerializer,
+    UserSerializer,PayrollEntrySerializer,BulkTransitionSerializer,FoodItemSerializer, FoodOrderSerializer,BlogSerializer,ChangePasswordSerializer,
     PasswordResetRequestSerializer, PasswordResetConfirmSerializer,EventBookingSerializer,ContactMessageSerializer, PromoBannerSerializer
 )
+from .availability import AllocationConflict, allocate_room, hold_expiry
+from .payhere import queue_stats, record_notification
+from .pricing import find_coupon, price_stays
+from .pagination import BookingPagination, CreatedAtPagination, PaymentPagination
+from .caching import CachedReadMixin
+from .conditional import ConditionalGetMixin
+from .tenancy import HotelScopedMixin
+from .views_availability import parse_hotel_param
+from .housekeeping import (
+    MAX_BULK_TRANSITION, UnknownRows, auto_assign, bulk_transition, room_payload, turn_over_room,
+)
 
 # A ViewSet automatically provides list, create, retrieve, update, delete actions
 
 class HotelViewSet(viewsets.ModelViewSet):
-    queryset = Hotel.objects.all()
+    queryset = Hotel.objects.all().select_related('admin_user')
     serializer_class = HotelSerializer
 
 class UserViewSet(viewsets.ModelViewSet):
@@ -43,25 +56,19 @@ class UserViewSet(viewsets.ModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
 
-class StaffProfileViewSet(viewsets.ModelViewSet):
-    queryset = StaffProfile.objects.all()
+class StaffProfileViewSet(HotelScopedMixin, viewsets.ModelViewSet):
+    queryset = StaffProfile.objects.all().select_related('user')
     serializer_class = StaffProfileSerializer
+    create_needs_profile = True
 
-    def perform_create(self, serializer):
-        user = self.request.user
-        try:
-            admin_profile = StaffProfile.objects.get(user=user)
-            serializer.save(hotel=admin_profile.hotel)
-        except StaffProfile.DoesNotExist:
-            from rest_framework.exceptions import ValidationError
-            raise ValidationError('Logged-in user is not associated with a hotel staff profile.')
-
-class AmenityViewSet(viewsets.ModelViewSet):
+class AmenityViewSet(CachedReadMixin, viewsets.ModelViewSet):
+    cache_models = (Amenity,)
     queryset = Amenity.objects.all()
     serializer_class = AmenitySerializer
 
-class RoomTypeViewSet(viewsets.ModelViewSet):
-    queryset = RoomType.objects.all()
+class RoomTypeViewSet(HotelScopedMixin, CachedReadMixin, viewsets.ModelViewSet):
+    cache_models = (RoomType,)
+    queryset = RoomType.objects.all().prefetch_related('amenities')
     serializer_class = RoomTypeSerializer
 
     def perform_create(self, serializer):
@@ -72,22 +79,19 @@ class RoomTypeViewSet(viewsets.ModelViewSet):
             raise PermissionDenied("You must be an admin to perform this action.")
 
         # 2. Determine Hotel
-        hotel = None
-        try:
-            staff_profile = StaffProfile.objects.get(user=user)
-            hotel = staff_profile.hotel
-        except StaffProfile.DoesNotExist:
+        hotel_id = self.request.tenant.hotel_id
+        if hotel_id is None:
             if user.is_superuser:
-                hotel = Hotel.objects.first()
-                if not hotel:
+                hotel_id = self.request.tenant.write_hotel_id
+                if not hotel_id:
                     # Auto-create default hotel if missing
-                    hotel = Hotel.objects.create(name="Azure Coast Default", location="Main St", admin_user=user)
+                    hotel_id = Hotel.objects.create(name="Azure Coast Default", location="Main St", admin_user=user).pk
             else:
                 raise ValidationError({"detail": "Logged-in user is not linked to any Hotel Staff Profile."})
 
         # 3. Safe Save (Catch Database Crashes)
         try:
-            serializer.save(hotel=hotel)
+            serializer.save(hotel_id=hotel_id)
         except IntegrityError as e:
             # This catches "NOT NULL constraint failed" errors and sends them as JSON
             raise ValidationError({"db_error": str(e)})
@@ -95,7 +99,8 @@ class RoomTypeViewSet(viewsets.ModelViewSet):
             raise ValidationError({"server_error": str(e)})
 
 
-class RoomViewSet(viewsets.ModelViewSet):
+class RoomViewSet(HotelScopedMixin, viewsets.ModelViewSet):
+    hotel_field = 'room_type__hotel_id'
     queryset = Room.objects.all().select_related('room_type')
     serializer_class = RoomSerializer
 
@@ -109,14 +114,18 @@ class GuestViewSet(viewsets.ModelViewSet):
         email = self.request.query_params.get('email')
         user_id = self.request.query_params.get('user')
         if email:
-            return queryset.filter(email__iexact=email)
+            # Matches the Lower('email') index on every database backend
+            return queryset.alias(email_lower=Lower('email')).filter(email_lower=email.lower())
         if user_id:
             return queryset.filter(user__id=user_id)
         return queryset
 
-class BookingViewSet(viewsets.ModelViewSet):
-    queryset = Booking.objects.all().select_related('guest', 'room_type', 'room').order_by('-check_in')
+class BookingViewSet(HotelScopedMixin, ConditionalGetMixin, viewsets.ModelViewSet):
+    # guest_name and room_type_name come from Guest and RoomType
+    version_models = (Booking, Guest, RoomType)
+    queryset = Booking.objects.all().select_related('guest', 'room_type', 'room').order_by('-check_in', '-id')
     serializer_class = BookingSerializer
+    pagination_class = BookingPagination
 
     # --- FIX: Add Server-Side Filtering ---
     def get_queryset(self):
@@ -127,106 +136,180 @@ class BookingViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(guest=guest_id)
         return queryset
 
-    def perform_create(self, serializer):
-        # ... (keep your existing create logic unchanged) ...
+    def _price_stay(self, room_type, check_in, check_out):
+        """Server-side total of a stay, with the request's coupon_code if one is sent."""
+        if check_out <= check_in:
+            raise ValidationError({"detail": "Check-out must be after check-in."})
+        coupon_code = self.request.data.get('coupon_code')
         try:
-            data = self.request.data
-            room_type_id = data.get('room_type')
-            check_in = data.get('check_in')
-            check_out = data.get('check_out')
-            
-            if not all([room_type_id, check_in, check_out]):
-                raise ValidationError("Room Type, Check-in, and Check-out are required.")
-
-            room_type = RoomType.objects.get(pk=room_type_id)
-            hotel = room_type.hotel
-            
-            occupied_room_ids = Booking.objects.filter(
-                room__room_type=room_type,
-                status__in=['CONFIRMED', 'CHECKED_IN'],
-                check_in__lt=check_out, 
-                check_out__gt=check_in
-            ).values_list('room_id', flat=True)
+            coupon = find_coupon(coupon_code, room_type.hotel_id)
+        except ValueError:
+            raise ValidationError({"coupon_code": "Must be a coupon code."})
+        if coupon_code and coupon is None:
+            raise ValidationError({"coupon_code": "Invalid or inactive coupon."})
+        return price_stays([(room_type, check_in, check_out)], coupon)[0]['total']
 
-            available_room = Room.objects.filter(room_type=room_type).exclude(id__in=occupied_room_ids).exclude(status='MAINTENANCE').first()
-
-            if not available_room:
-                raise ValidationError({"detail": "No specific rooms are available for these dates."})
-
-            serializer.save(hotel=hotel, room=available_room)
+    def perform_create(self, serializer):
+        data = self.request.data
+        room_type = serializer.validated_data['room_type']
+        check_in = serializer.validated_data['check_in']
+        check_out = serializer.validated_data['check_out']
+        hotel_id = room_type.hotel_id
+
+        # The stay is always priced on the server; total_price is read-only
+        total_price = self._price_stay(room_type, check_in, check_out)
+
+        notes = data.get('special_requests', '') or ''
+        is_prepaid = 'PAYHERE' in notes.upper()
+        extra = {}
+        online = self.request.tenant.hotel_id is None and not self.request.user.is_superuser
+        pending = serializer.validated_data.get('status', Booking.BookingStatus.PENDING) == Booking.BookingStatus.PENDING
+        if online and pending and not is_prepaid:
+            # An unpaid online booking keeps its room only while the guest pays
+            extra['hold_expires_at'] = hold_expiry()
+
+        def create_booking(room):
+            # A retried attempt must insert a fresh row, not update the rolled-back one
+            serializer.instance = None
+            booking = serializer.save(hotel_id=hotel_id, room=room, total_price=total_price, **extra)
 
             # Invoice logic (Keep existing)
-            notes = data.get('special_requests', '')
-            is_prepaid = 'PAYHERE' in notes.upper()
             invoice_status = 'PAID' if is_prepaid else 'UNPAID'
-            
+
             invoice = Invoice.objects.create(
-                booking=serializer.instance,
-                amount=serializer.instance.total_price,
+                booking=booking,
+                amount=booking.total_price,
                 status=invoice_status,
-                due_date=serializer.instance.check_in
+                due_date=booking.check_in
             )
-            
+
             if is_prepaid:
                 Payment.objects.create(
                     invoice=invoice,
-                    amount=serializer.instance.total_price,
+                    amount=booking.total_price,
                     method='PAYHERE_SANDBOX'
                 )
+            return booking
 
-        except RoomType.DoesNotExist:
-             raise ValidationError({"room_type": "Invalid Room Type selected."})
-        except ValidationError as e:
-             raise e
-        except Exception as e:
-             hotel = Hotel.objects.first()
-             if hotel: serializer.save(hotel=hotel)
-             else: raise ValidationError({"detail": f"System error: {str(e)}"})
-
-class InvoiceViewSet(viewsets.ModelViewSet):
-    queryset = Invoice.objects.all().prefetch_related('payments')
+        # Room lookup, booking and invoice are committed together or not at all
+        try:
+            booking = allocate_room(room_type, check_in, check_out, create_booking)
+        except AllocationConflict:
+            raise ValidationError({"detail": "Rooms are being booked right now, please try again."})
+
+        if booking is None:
+            raise ValidationError({"detail": "No specific rooms are available for these dates."})
+
+    def perform_update(self, serializer):
+        booking, data = serializer.instance, serializer.validated_data
+        previous_status = booking.status
+        extra = {}
+        stay = (
+            data.get('room_type', booking.room_type),
+            data.get('check_in', booking.check_in),
+            data.get('check_out', booking.check_out),
+        )
+        if stay != (booking.room_type, booking.check_in, booking.check_out) or 'coupon_code' in self.request.data:
+            # A changed stay is repriced like a new one, and its unpaid invoice follows
+            extra['total_price'] = self._price_stay(*stay)
+        if data.get('status') == Booking.BookingStatus.CHECKED_OUT != previous_status:
+            # The nights before today were stayed and stay sold; the rest go back on sale
+            extra['checked_out_on'] = timezone.localdate()
+        try:
+            with transaction.atomic():
+                booking = serializer.save(**extra)
+                if 'total_price' in extra:
+                    for invoice in booking.invoices.filter(status=Invoice.InvoiceStatus.UNPAID):
+                        invoice.amount = booking.total_price
+                        invoice.save(update_fields=['amount'])
+                if booking.status == Booking.BookingStatus.CHECKED_OUT and previous_status != booking.status:
+                    # Checkout hands the room over to housekeeping in the same transaction
+                    turn_over_room(booking)
+        except IntegrityError:
+            raise ValidationError({"detail": "The assigned room is already booked for some of these nights."})
+
+class InvoiceViewSet(HotelScopedMixin, viewsets.ModelViewSet):
+    hotel_field = 'booking__hotel_id'
+    # Nested payments read invoice.booking.guest, which the prefetch points back at these rows
+    queryset = Invoice.objects.all().select_related('booking__guest').prefetch_related('payments')
     serializer_class = InvoiceSerializer
 
-class PaymentViewSet(viewsets.ModelViewSet):
-    queryset = Payment.objects.all()
+class PaymentViewSet(HotelScopedMixin, viewsets.ModelViewSet):
+    hotel_field = 'invoice__booking__hotel_id'
+    queryset = Payment.objects.all().select_related('invoice__booking__guest').order_by('-payment_date', '-id')
     serializer_class = PaymentSerializer
+    pagination_class = PaymentPagination
 
-class HousekeepingTaskViewSet(viewsets.ModelViewSet):
+class HousekeepingTaskViewSet(HotelScopedMixin, ConditionalGetMixin, viewsets.ModelViewSet):
+    hotel_field = 'room__room_type__hotel_id'
+    version_models = (HousekeepingTask, Room)
     queryset = HousekeepingTask.objects.all().select_related('room', 'assigned_to')
     serializer_class = HousekeepingTaskSerializer
 
-class InventoryItemViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=['post'], url_path='bulk-transition')
+    def bulk_transition(self, request):
+        """
+        Moves many rooms and tasks at once:
+        {"rooms": [{"id": 12, "status": "DIRTY"}], "tasks": [{"id": 40, "status": "CLEAN"}]}
+        """
+        payload = BulkTransitionSerializer(data=request.data)
+        payload.is_valid(raise_exception=True)
+        rooms, tasks = payload.validated_data['rooms'], payload.validated_data['tasks']
+        if len(rooms) + len(tasks) > MAX_BULK_TRANSITION:
+            return Response({"detail": f"At most {MAX_BULK_TRANSITION} rooms and tasks per request."}, status=400)
+
+        try:
+            rooms, tasks, created = bulk_transition(
+                {row['id']: row['status'] for row in rooms},
+                {row['id']: row['status'] for row in tasks},
+                hotel_id=request.tenant.hotel_id,
+            )
+        except UnknownRows as e:
+            return Response({"detail": "Some rooms or tasks do not exist.", **e.args[0]}, status=400)
+        return Response({
+            'rooms': [room_payload(room) for room in rooms],
+            'tasks': HousekeepingTaskSerializer(tasks, many=True).data,
+            'created_tasks': created,
+        })
+
+    @action(detail=False, methods=['post'], url_path='auto-assign')
+    def auto_assign(self, request):
+        """
+        Assigns the hotel's unassigned DIRTY tasks to active housekeepers, balancing load
+        and keeping each housekeeper on as few floors as possible.
+        {"reassign": true} rebalances every DIRTY task instead.
+        """
+        hotel_id = request.tenant.hotel_id
+        if hotel_id is None and request.user.is_superuser:
+            try:
+                hotel_id = parse_hotel_param(request.data)
+            except ValueError:
+                return Response({"hotel": "Must be a hotel id."}, status=400)
+        if not hotel_id:
+            return Response({"detail": "Logged-in user is not associated with a hotel staff profile."}, status=400)
+
+        tasks, loads = auto_assign(hotel_id, reassign=bool(request.data.get('reassign')))
+        if not loads:
+            return Response({"detail": "No active housekeepers in this hotel."}, status=400)
+        return Response({
+            'assigned': len(tasks),
+            'tasks': HousekeepingTaskSerializer(tasks, many=True).data,
+            'loads': [{'user': user_id, 'open_tasks': load} for user_id, load in sorted(loads.items())],
+        })
+
+class InventoryItemViewSet(HotelScopedMixin, viewsets.ModelViewSet):
     queryset = InventoryItem.objects.all()
     serializer_class = InventoryItemSerializer
+    create_needs_profile = True
 
-    # --- ADD THIS FUNCTION ---
-    def perform_create(self, serializer):
-        user = self.request.user
-        try:
-            # Find the user's staff profile to get their hotel
-            staff_profile = StaffProfile.objects.get(user=user)
-            # Save the item, automatically adding the hotel
-            serializer.save(hotel=staff_profile.hotel)
-        except StaffProfile.DoesNotExist:
-            from rest_framework.exceptions import ValidationError
-            raise ValidationError('Logged-in user is not associated with a hotel staff profile.')
-
-class DiscountCouponViewSet(viewsets.ModelViewSet):
+class DiscountCouponViewSet(HotelScopedMixin, viewsets.ModelViewSet):
     queryset = DiscountCoupon.objects.all()
     serializer_class = DiscountCouponSerializer
+    create_needs_profile = True
 
-    # --- FIX: Auto-assign the hotel from the logged-in admin ---
-    def perform_create(self, serializer):
-        user = self.request.user
-        try:
-            staff_profile = StaffProfile.objects.get(user=user)
-            serializer.save(hotel=staff_profile.hotel)
-        except StaffProfile.DoesNotExist:
-            from rest_framework.exceptions import ValidationError
-            raise ValidationError('Logged-in user is not associated with a hotel staff profile.')
-
-class PayrollEntryViewSet(viewsets.ModelViewSet):
-    queryset = PayrollEntry.objects.all().order_by('-payment_date')
+class PayrollEntryViewSet(HotelScopedMixin, viewsets.ModelViewSet):
+    hotel_field = 'staff__hotel_id'
+    queryset = PayrollEntry.objects.all().select_related('staff__user').order_by('-payment_date')
     serializer_class = PayrollEntrySerializer
 
     def get_queryset(self):
@@ -295,41 +378,32 @@ class CustomAuthToken(ObtainAuthToken):
             'user': user_payload
         })
     
-class FoodItemViewSet(viewsets.ModelViewSet):
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def logout_view(request):
+    """Revokes the caller's token (and its cached copy); the next login issues a new one."""
+    Token.objects.filter(user=request.user).delete()
+    return Response(status=status.HTTP_204_NO_CONTENT)
+
+class FoodItemViewSet(HotelScopedMixin, CachedReadMixin, viewsets.ModelViewSet):
+    cache_models = (FoodItem,)
     queryset = FoodItem.objects.all()
     serializer_class = FoodItemSerializer
-    
-    def perform_create(self, serializer):
-        # Auto-assign hotel
-        try:
-            serializer.save(hotel=Hotel.objects.first())
-        except Exception:
-            pass
 
-class FoodOrderViewSet(viewsets.ModelViewSet):
-    queryset = FoodOrder.objects.all().select_related('guest').order_by('-created_at')
+class FoodOrderViewSet(HotelScopedMixin, ConditionalGetMixin, viewsets.ModelViewSet):
+    version_models = (FoodOrder, Guest)
+    queryset = FoodOrder.objects.all().select_related('guest').order_by('-created_at', '-id')
     serializer_class = FoodOrderSerializer
+    pagination_class = CreatedAtPagination
 
-    def perform_create(self, serializer):
-        try:
-            serializer.save(hotel=Hotel.objects.first())
-        except Exception:
-            pass
-
-class BlogViewSet(viewsets.ModelViewSet):
+class BlogViewSet(HotelScopedMixin, CachedReadMixin, viewsets.ModelViewSet):
+    cache_models = (Blog,)
     queryset = Blog.objects.all().order_by('-created_at')
     serializer_class = BlogSerializer
     
     # Allow anyone to read, but only auth users to create/edit
     permission_classes = [IsAuthenticatedOrReadOnly] 
 
-    def perform_create(self, serializer):
-        # Auto-assign hotel
-        try:
-            serializer.save(hotel=Hotel.objects.first())
-        except Exception:
-            pass
-
 class ChangePasswordView(generics.UpdateAPIView):
     serializer_class = ChangePasswordSerializer
     model = User
@@ -449,7 +523,7 @@ class PasswordResetConfirmView(generics.GenericAPIView):
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
-class EventBookingViewSet(viewsets.ModelViewSet):
+class EventBookingViewSet(HotelScopedMixin, viewsets.ModelViewSet):
     queryset = EventBooking.objects.all().select_related('guest').order_by('-created_at')
     serializer_class = EventBookingSerializer
 
@@ -461,65 +535,6 @@ class EventBookingViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(guest=guest_id)
         return queryset
 
-    def perform_create(self, serializer):
-        try:
-            serializer.save(hotel=Hotel.objects.first())
-        except Exception:
-            pass
-
-class BookingViewSet(viewsets.ModelViewSet):
-    queryset = Booking.objects.all().select_related('guest', 'room_type', 'room').order_by('-check_in')
-    serializer_class = BookingSerializer
-
-    def perform_create(self, serializer):
-        try:
-            data = self.request.data
-            room_type_id = data.get('room_type')
-            check_in = data.get('check_in')
-            check_out = data.get('check_out')
-            
-            # 1. Find Hotel & Room
-            room_type = RoomType.objects.get(pk=room_type_id)
-            hotel = room_type.hotel
-            
-            # Simple room assignment logic
-            occupied = Booking.objects.filter(
-                room__room_type=room_type, status__in=['CONFIRMED', 'CHECKED_IN'],
-                check_in__lt=check_out, check_out__gt=check_in
-            ).values_list('room_id', flat=True)
-            
-            available_room = Room.objects.filter(room_type=room_type).exclude(id__in=occupied).first()
-            
-            # Save Booking
-            booking = serializer.save(hotel=hotel, room=available_room)
-
-            # 2. AUTOMATIC INVOICE GENERATION
-            # Check if payment info suggests it was paid (e.g., PayHere)
-            notes = data.get('special_requests', '')
-            is_prepaid = 'PAYHERE' in notes.upper()
-            
-            invoice_status = 'PAID' if is_prepaid else 'UNPAID'
-            
-            invoice = Invoice.objects.create(
-                booking=booking,
-                amount=booking.total_price,
-                status=invoice_status,
-                due_date=booking.check_in # Due on arrival
-            )
-            
-            if is_prepaid:
-                Payment.objects.create(
-                    invoice=invoice,
-                    amount=booking.total_price,
-                    method='PAYHERE_SANDBOX'
-                )
-
-        except Exception as e:
-             # Fallback to save without extra logic if it fails
-             hotel = Hotel.objects.first()
-             if hotel: serializer.save(hotel=hotel)
-             else: raise ValidationError({"detail": str(e)})
-
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def generate_payhere_hash(request):
@@ -608,45 +623,20 @@ def payhere_init(request):
 @permission_classes([AllowAny])     # PayHere does not send authentication
 def payhere_notify(request):
     """
-    PayHere callback → validates payment → marks invoice & booking as paid
+    PayHere callback → queues the delivery and answers at once; the
+    process_payhere_notifications worker records the payment (see payhere.py)
     """
+    notification = record_notification(request.data)
+    if not notification.signature_valid:
+        return Response("FAILED", status=400)
+    return Response("OK", status=200)
 
-    try:
-        order_id = request.data.get("order_id")   # example: "BK-33"
-        status_code = request.data.get("status_code")  # 2 = success
-        payment_id = request.data.get("payment_id")
-        paid_amount = float(request.data.get("payhere_amount"))
-
-        # Extract booking ID
-        booking_id = int(order_id.split("-")[1])
-        booking = Booking.objects.get(id=booking_id)
-
-        invoice = Invoice.objects.get(booking=booking)
-
-        # Only mark success if status_code == 2
-        if str(status_code) == "2":
-            invoice.status = "PAID"
-            invoice.save()
 
-            Payment.objects.create(
-                invoice=invoice,
-                amount=paid_amount,
-                method="PAYHERE",
-                transaction_id=payment_id
-            )
-
-            booking.status = "CONFIRMED"
-            booking.save()
-
-            return Response("OK", status=200)
-
-        else:
-            invoice.status = "FAILED"
-            invoice.save()
-            return Response("FAILED", status=400)
-
-    except Exception as e:
-        return Response({"error": str(e)}, status=400)
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def payhere_queue(request):
+    """Depth and processing latency of the PayHere notification queue."""
+    return Response(queue_stats())
 
 @api_view(['GET'])
 def payhere_success(request):
@@ -658,8 +648,9 @@ def payhere_cancel(request):
 
 
 class ContactMessageViewSet(viewsets.ModelViewSet):
-    queryset = ContactMessage.objects.all().order_by('-created_at')
+    queryset = ContactMessage.objects.all().order_by('-created_at', '-id')
     serializer_class = ContactMessageSerializer
+    pagination_class = CreatedAtPagination
     
     def get_permissions(self):
         """
@@ -673,14 +664,9 @@ class ContactMessageViewSet(viewsets.ModelViewSet):
         return [permission() for permission in permission_classes]
 
 
-class PromoBannerViewSet(viewsets.ModelViewSet):
+class PromoBannerViewSet(HotelScopedMixin, CachedReadMixin, viewsets.ModelViewSet):
+    cache_models = (PromoBanner,)
     queryset = PromoBanner.objects.all().order_by('-created_at')
     serializer_class = PromoBannerSerializer
     # Allow public to read (see banners), but only admin to write
     permission_classes = [IsAuthenticatedOrReadOnly] 
-    
-    def perform_create(self, serializer):
-        try:
-            serializer.save(hotel=Hotel.objects.first())
-        except Exception:
-            pass
\ No newline at end of file
@@ -0,0 +1,108 @@
+from collections import Counter
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncMonth, TruncWeek
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+
+from .models import DailyStat, Room
+from .views_availability import parse_date_range, parse_hotel_param
+
+BUCKETS = {
+    'day': F('date'),
+    'week': TruncWeek('date'),
+    'month': TruncMonth('date'),
+}
+
+# Longest range analytics will report on in one response
+MAX_ANALYTICS_DAYS = 731
+
+
+def _bucket_start(day, bucket):
+    if bucket == 'week':
+        return day - timedelta(days=day.weekday())
+    if bucket == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def _ratio(numerator, denominator, places='0.01'):
+    if not denominator:
+        return Decimal('0')
+    return (Decimal(numerator) / Decimal(denominator)).quantize(Decimal(places))
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def analytics(request):
+    """
+    Revenue, occupancy, ADR and RevPAR per time bucket, e.g.
+    /analytics/?from=2025-01-01&to=2026-01-01&bucket=month&group_by=room_type
+
+    Reads the DailyStat rollup, so a year of daily buckets is a single grouped query.
+    Revenue is COMPLETED payments; available room nights use the current room inventory.
+    """
+    params = request.query_params
+    window = parse_date_range(params, 'from', 'to')
+    if window is None:
+        return Response({"detail": "from and to must be valid dates with to after from."}, status=400)
+    start, end = window
+    if (end - start).days > MAX_ANALYTICS_DAYS:
+        return Response({"detail": f"Analytics can span at most {MAX_ANALYTICS_DAYS} days."}, status=400)
+
+    bucket = params.get('bucket', 'day')
+    if bucket not in BUCKETS:
+        return Response({"bucket": f"Choose one of: {', '.join(BUCKETS)}."}, status=400)
+    by_room_type = params.get('group_by') == 'room_type'
+
+    # Staff are held to their own hotel; users without a profile may pick one
+    try:
+        hotel_id = request.tenant.hotel_id or parse_hotel_param(params)
+    except ValueError:
+        return Response({"hotel": "Must be a hotel id."}, status=400)
+    stats = DailyStat.objects.filter(date__gte=start, date__lt=end)
+    rooms = Room.objects.all()
+    if hotel_id:
+        stats = stats.filter(hotel_id=hotel_id)
+        rooms = rooms.filter(room_type__hotel_id=hotel_id)
+
+    group_fields = ['bucket', 'room_type'] if by_room_type else ['bucket']
+    rows = (
+        stats.annotate(bucket=BUCKETS[bucket])
+        .values(*group_fields)
+        .annotate(rooms_sold=Sum('rooms_sold'), revenue=Sum('revenue'))
+        .order_by(*group_fields)
+    )
+    totals = {tuple(row[field] for field in group_fields): row for row in rows}
+
+    inventory = dict(rooms.values_list('room_type').annotate(count=Count('id')).order_by())
+    room_type_ids = sorted(inventory) if by_room_type else [None]
+
+    # Days of each bucket that fall inside the requested window
+    bucket_days = Counter(_bucket_start(start + timedelta(days=i), bucket) for i in range((end - start).days))
+
+    results = []
+    for bucket_start, days in sorted(bucket_days.items()):
+        for room_type_id in room_type_ids:
+            key = (bucket_start, room_type_id) if by_room_type else (bucket_start,)
+            row = totals.get(key, {})
+            rooms_sold = row.get('rooms_sold') or 0
+            revenue = Decimal(str(row.get('revenue') or 0))
+            available = days * (inventory.get(room_type_id, 0) if by_room_type else sum(inventory.values()))
+            entry = {
+                'bucket': bucket_start,
+                'rooms_sold': rooms_sold,
+                'rooms_available': available,
+                'occupancy_rate': _ratio(rooms_sold * 100, available),
+                'revenue': revenue,
+                'adr': _ratio(revenue, rooms_sold),
+                'revpar': _ratio(revenue, available),
+            }
+            if by_room_type:
+                entry['room_type'] = room_type_id
+            results.append(entry)
+
+    return Response({'from': start, 'to': end, 'bucket': bucket, 'results': results})
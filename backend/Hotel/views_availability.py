@@ -0,0 +1,168 @@
+from django.db.models import Count, Q
+from django.utils.dateparse import parse_date
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.response import Response
+
+from .availability import occupied_room_ids
+from .models import Room, RoomNight, RoomType
+from .pricing import price_stays
+
+# Longest window the occupancy grid will render in one response
+MAX_GRID_DAYS = 366
+
+
+def parse_date_range(params, start_key='check_in', end_key='check_out'):
+    """Parses and validates a pair of date query parameters."""
+    try:
+        start = parse_date(params.get(start_key, ''))
+        end = parse_date(params.get(end_key, ''))
+    except ValueError:
+        start = end = None
+    if not (start and end) or end <= start:
+        return None
+    return start, end
+
+
+def parse_hotel_param(params):
+    """
+    The optional ?hotel= filter as an int, or None when absent.
+    Raises ValueError when it is not a hotel id.
+    """
+    value = str(params.get('hotel') or '')
+    if not value:
+        return None
+    if not (value.isascii() and value.isdigit()):
+        raise ValueError(value)
+    return int(value)
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def availability_search(request):
+    """
+    Every room type with its free room count and price for a stay, e.g.
+    /availability/?check_in=2025-12-01&check_out=2025-12-05&guests=2
+
+    Free rooms are counted in a single grouped query against the nightly
+    occupancy ledger, whatever the number of room types.
+    """
+    stay = parse_date_range(request.query_params)
+    if stay is None:
+        return Response({"detail": "check_in and check_out must be valid dates with check_out after check_in."}, status=400)
+    check_in, check_out = stay
+
+    try:
+        guests = int(request.query_params.get('guests', 1))
+    except ValueError:
+        return Response({"guests": "Must be a whole number."}, status=400)
+
+    try:
+        hotel_id = parse_hotel_param(request.query_params)
+    except ValueError:
+        return Response({"hotel": "Must be a hotel id."}, status=400)
+
+    room_types = RoomType.objects.filter(capacity__gte=guests)
+    if hotel_id:
+        room_types = room_types.filter(hotel_id=hotel_id)
+
+    occupied = occupied_room_ids(check_in, check_out)
+    room_types = room_types.annotate(
+        free_rooms=Count(
+            'rooms',
+            filter=~Q(rooms__status=Room.RoomStatus.MAINTENANCE) & ~Q(rooms__id__in=occupied),
+        )
+    ).order_by('price_weekday', 'id')
+
+    # Priced exactly as a booking would be, tax included, in one vectorised pass
+    room_types = list(room_types)
+    quotes = price_stays([(room_type, check_in, check_out) for room_type in room_types])
+
+    results = []
+    for room_type, quote in zip(room_types, quotes):
+        results.append({
+            'id': room_type.id,
+            'hotel': room_type.hotel_id,
+            'name': room_type.name,
+            'capacity': room_type.capacity,
+            'image': request.build_absolute_uri(room_type.image.url) if room_type.image else None,
+            'free_rooms': room_type.free_rooms,
+            'price_weekday': room_type.price_weekday,
+            'price_weekend': room_type.price_weekend,
+            'weekday_nights': quote['weekday_nights'],
+            'weekend_nights': quote['weekend_nights'],
+            'weekday_total': room_type.price_weekday * quote['weekday_nights'],
+            'weekend_total': room_type.price_weekend * quote['weekend_nights'],
+            'subtotal': quote['subtotal'],
+            'tax': quote['tax'],
+            'total_price': quote['total'],
+            'currency': quote['currency'],
+        })
+
+    return Response({
+        'check_in': check_in,
+        'check_out': check_out,
+        'guests': guests,
+        'nights': (check_out - check_in).days,
+        'results': results,
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def occupancy_grid(request):
+    """
+    Rooms x nights occupancy for the front desk calendar, e.g.
+    /occupancy-grid/?from=2025-12-01&to=2025-12-31
+
+    Each room carries run-length encoded stays as [first_night_offset, nights, booking_id],
+    read straight from the nightly occupancy ledger in two queries.
+    """
+    window = parse_date_range(request.query_params, 'from', 'to')
+    if window is None:
+        return Response({"detail": "from and to must be valid dates with to after from."}, status=400)
+    start, end = window
+    days = (end - start).days
+    if days > MAX_GRID_DAYS:
+        return Response({"detail": f"The grid can span at most {MAX_GRID_DAYS} days."}, status=400)
+
+    # Staff only ever see their own hotel; others may pick one with ?hotel=
+    try:
+        hotel_id = request.tenant.hotel_id or parse_hotel_param(request.query_params)
+    except ValueError:
+        return Response({"hotel": "Must be a hotel id."}, status=400)
+
+    rooms = Room.objects.select_related('room_type').order_by('floor', 'room_number')
+    nights = RoomNight.objects.filter(night__gte=start, night__lt=end)
+    if hotel_id:
+        rooms = rooms.filter(room_type__hotel_id=hotel_id)
+        nights = nights.filter(room__room_type__hotel_id=hotel_id)
+
+    runs_by_room = {}
+    last = None
+    for room_id, night, booking_id in nights.order_by('room_id', 'night').values_list('room_id', 'night', 'booking_id'):
+        offset = (night - start).days
+        runs = runs_by_room.setdefault(room_id, [])
+        # Extend the current run while the same booking holds consecutive nights
+        if last == (room_id, booking_id, offset - 1):
+            runs[-1][1] += 1
+        else:
+            runs.append([offset, 1, booking_id])
+        last = (room_id, booking_id, offset)
+
+    return Response({
+        'from': start,
+        'to': end,
+        'days': days,
+        'rooms': [
+            {
+                'id': room.id,
+                'room_number': room.room_number,
+                'floor': room.floor,
+                'room_type': room.room_type.name,
+                'status': room.status,
+                'runs': runs_by_room.get(room.id, []),
+            }
+            for room in rooms
+        ],
+    })
@@ -0,0 +1,203 @@
+"""
+Streaming exports of bookings, invoices, payments and payroll for accounting.
+
+Rows are read from values() querysets in keyset batches (id > last id) rather than
+one large cursor, because the MySQL driver buffers a whole result set client-side;
+the CSV is written to the client as each batch arrives, so memory stays flat
+whatever the row count. XLSX needs openpyxl and goes through a write-only workbook
+spooled to a temporary file.
+
+Django buffers a sync iterator whole before sending it under ASGI, so there the
+response streams from an async generator that fetches each batch (or reads each
+chunk of the spooled workbook) through sync_to_async.
+"""
+import csv
+import tempfile
+from datetime import datetime
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.db import models
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils import timezone
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+
+from .analytics import day_start
+from .models import Booking, Invoice, Payment, PayrollEntry
+from .views_availability import parse_date_range, parse_hotel_param
+
+try:
+    from openpyxl import Workbook
+except ImportError:
+    Workbook = None
+
+EXPORT_BATCH_SIZE = 2000
+# Bytes read from the spooled workbook per chunk sent
+XLSX_CHUNK_SIZE = 64 * 1024
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# kind: (queryset, date field, hotel field, [(column, field)])
+EXPORTS = {
+    'bookings': (Booking.objects.all(), 'check_in', 'hotel_id', [
+        ('id', 'id'), ('hotel', 'hotel_id'), ('guest', 'guest__name'), ('guest_email', 'guest__email'),
+        ('room_type', 'room_type__name'), ('room', 'room__room_number'), ('check_in', 'check_in'),
+        ('check_out', 'check_out'), ('status', 'status'), ('total_price', 'total_price'),
+    ]),
+    'invoices': (Invoice.objects.all(), 'issued_date', 'booking__hotel_id', [
+        ('id', 'id'), ('booking', 'booking_id'), ('guest', 'booking__guest__name'), ('amount', 'amount'),
+        ('status', 'status'), ('issued_date', 'issued_date'), ('due_date', 'due_date'),
+    ]),
+    'payments': (Payment.objects.all(), 'payment_date', 'invoice__booking__hotel_id', [
+        ('id', 'id'), ('invoice', 'invoice_id'), ('booking', 'invoice__booking_id'),
+        ('guest', 'invoice__booking__guest__name'), ('amount', 'amount'), ('method', 'method'),
+        ('status', 'status'), ('transaction_id', 'transaction_id'), ('payment_date', 'payment_date'),
+    ]),
+    'payroll': (PayrollEntry.objects.all(), 'payment_date', 'staff__hotel_id', [
+        ('id', 'id'), ('staff', 'staff_id'), ('first_name', 'staff__user__first_name'),
+        ('last_name', 'staff__user__last_name'), ('role', 'staff__role'), ('salary_amount', 'salary_amount'),
+        ('bonus_amount', 'bonus_amount'), ('payment_date', 'payment_date'),
+    ]),
+}
+
+
+class Echo:
+    """Pseudo-buffer for csv.writer: write() hands the formatted line straight back."""
+    def write(self, value):
+        return value
+
+
+def _fetch_batch(queryset, fields, last_id):
+    return list(queryset.filter(id__gt=last_id).order_by('id').values_list(*fields)[:EXPORT_BATCH_SIZE])
+
+
+def _export_batches(queryset, fields):
+    """Yields lists of value tuples in id order, one keyset batch per query."""
+    last_id = 0
+    while True:
+        batch = _fetch_batch(queryset, fields, last_id)
+        if not batch:
+            return
+        yield batch
+        last_id = batch[-1][0]
+
+
+async def _aexport_batches(queryset, fields):
+    """_export_batches for ASGI: each batch is fetched in the request's worker thread."""
+    fetch = sync_to_async(_fetch_batch)
+    last_id = 0
+    while True:
+        batch = await fetch(queryset, fields, last_id)
+        if not batch:
+            return
+        yield batch
+        last_id = batch[-1][0]
+
+
+def _local(value):
+    # Spreadsheets have no time zones, so datetimes are written in the server's zone
+    if isinstance(value, datetime):
+        return timezone.localtime(value).replace(tzinfo=None) if timezone.is_aware(value) else value
+    return value
+
+
+def _csv_chunk(writer, batch):
+    # One chunk per batch keeps the per-chunk cost of the response out of the row loop
+    return ''.join(
+        writer.writerow([_local(value).isoformat(sep=' ') if isinstance(value, datetime) else value for value in row])
+        for row in batch
+    )
+
+
+def _csv_stream(columns, batches):
+    writer = csv.writer(Echo())
+    yield writer.writerow(columns)
+    for batch in batches:
+        yield _csv_chunk(writer, batch)
+
+
+async def _acsv_stream(columns, batches):
+    writer = csv.writer(Echo())
+    yield writer.writerow(columns)
+    async for batch in batches:
+        yield _csv_chunk(writer, batch)
+
+
+def _xlsx_file(columns, batches):
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(columns)
+    for batch in batches:
+        for row in batch:
+            sheet.append([_local(value) for value in row])
+    spool = tempfile.TemporaryFile()
+    workbook.save(spool)
+    spool.seek(0)
+    return spool
+
+
+async def _aread_chunks(spool):
+    read = sync_to_async(spool.read)
+    try:
+        while chunk := await read(XLSX_CHUNK_SIZE):
+            yield chunk
+    finally:
+        spool.close()
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def export(request, kind):
+    """
+    Downloads every row of a period, e.g.
+    /export/payments/?from=2025-01-01&to=2025-02-01&file_format=xlsx
+
+    Bookings are dated by check-in, invoices by issue date, payments and payroll by
+    payment date. file_format is csv (default) or xlsx.
+    """
+    if kind not in EXPORTS:
+        return Response({"detail": f"Unknown export '{kind}'. Use one of: {', '.join(sorted(EXPORTS))}."}, status=404)
+    params = request.query_params
+    window = parse_date_range(params, 'from', 'to')
+    if window is None:
+        return Response({"detail": "from and to must be valid dates with to after from."}, status=400)
+    start, end = window
+    file_format = params.get('file_format', 'csv')
+    if file_format not in ('csv', 'xlsx'):
+        return Response({"detail": "file_format must be 'csv' or 'xlsx'."}, status=400)
+    if file_format == 'xlsx' and Workbook is None:
+        return Response({"detail": "XLSX export needs openpyxl installed on the server."}, status=400)
+
+    # Staff are held to their own hotel; users without a profile may pick one
+    try:
+        hotel_id = request.tenant.hotel_id or parse_hotel_param(params)
+    except ValueError:
+        return Response({"hotel": "Must be a hotel id."}, status=400)
+
+    queryset, date_field, hotel_field, spec = EXPORTS[kind]
+    if isinstance(queryset.model._meta.get_field(date_field), models.DateTimeField):
+        queryset = queryset.filter(**{f'{date_field}__gte': day_start(start), f'{date_field}__lt': day_start(end)})
+    else:
+        queryset = queryset.filter(**{f'{date_field}__gte': start, f'{date_field}__lt': end})
+    if hotel_id:
+        queryset = queryset.filter(**{hotel_field: hotel_id})
+
+    columns = [column for column, _ in spec]
+    fields = [field for _, field in spec]
+    filename = f'{kind}_{start.isoformat()}_{end.isoformat()}.{file_format}'
+    under_asgi = isinstance(request._request, ASGIRequest)
+    if file_format == 'xlsx':
+        spool = _xlsx_file(columns, _export_batches(queryset, fields))
+        if not under_asgi:
+            return FileResponse(spool, as_attachment=True, filename=filename)
+        response = StreamingHttpResponse(_aread_chunks(spool), content_type=XLSX_CONTENT_TYPE)
+        response['Content-Length'] = spool.seek(0, 2)
+        spool.seek(0)
+    elif under_asgi:
+        response = StreamingHttpResponse(_acsv_stream(columns, _aexport_batches(queryset, fields)), content_type='text/csv')
+    else:
+        response = StreamingHttpResponse(_csv_stream(columns, _export_batches(queryset, fields)), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
@@ -0,0 +1,61 @@
+import os
+
+from rest_framework.decorators import api_view, parser_classes, permission_classes
+from rest_framework.parsers import MultiPartParser
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+
+from .importers import DEFAULT_BATCH_SIZE, FORMATS, IMPORTERS, run_import
+from .models import Hotel
+from .views_availability import parse_hotel_param
+
+# Rejected rows listed in the response; the rest are only counted
+MAX_REPORTED_ERRORS = 500
+
+MAX_BATCH_SIZE = 5000
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@parser_classes([MultiPartParser])
+def import_rows(request, kind):
+    """
+    Imports an uploaded CSV / JSON Lines file of rooms, guests or bookings into the
+    user's hotel. Form fields: file, file_format (defaults to the extension),
+    batch_size, dry_run. Very large files are better loaded with `manage.py import_data`.
+    """
+    if kind not in IMPORTERS:
+        return Response({"detail": f"Unknown import '{kind}'. Use one of: {', '.join(sorted(IMPORTERS))}."}, status=404)
+    upload = request.FILES.get('file')
+    if upload is None:
+        return Response({"detail": "Attach the rows as 'file'."}, status=400)
+
+    hotel_id = request.tenant.hotel_id
+    if hotel_id is None and request.user.is_superuser:
+        try:
+            hotel_id = parse_hotel_param(request.data)
+        except ValueError:
+            return Response({"hotel": "Must be a hotel id."}, status=400)
+    hotel = Hotel.objects.filter(pk=hotel_id).first() if hotel_id else None
+    if hotel is None:
+        return Response({"detail": "Logged-in user is not associated with a hotel staff profile."}, status=400)
+
+    file_format = request.data.get('file_format') or os.path.splitext(upload.name)[1].lstrip('.').lower()
+    if file_format not in FORMATS:
+        return Response({"detail": "file_format must be 'csv' or 'jsonl'."}, status=400)
+    try:
+        batch_size = int(request.data.get('batch_size', DEFAULT_BATCH_SIZE))
+    except ValueError:
+        return Response({"detail": "batch_size must be a number."}, status=400)
+    if not 1 <= batch_size <= MAX_BATCH_SIZE:
+        return Response({"detail": f"batch_size must be between 1 and {MAX_BATCH_SIZE}."}, status=400)
+    dry_run = str(request.data.get('dry_run', '')).lower() in ('1', 'true', 'yes')
+
+    errors = []
+
+    def report(line, row_errors):
+        if len(errors) < MAX_REPORTED_ERRORS:
+            errors.append({'line': line, 'errors': row_errors})
+
+    counts = run_import(kind, upload.file, file_format, hotel, batch_size=batch_size, dry_run=dry_run, on_error=report)
+    return Response({**counts, 'dry_run': dry_run, 'errors': errors})
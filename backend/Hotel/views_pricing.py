@@ -0,0 +1,105 @@
+from django.utils.dateparse import parse_date
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+
+from .models import RoomType
+from .pricing import find_coupon, price_stays, quote_stay
+
+# Upper bound on stays priced by a single batch request
+MAX_BATCH_QUOTES = 5000
+
+
+def _room_type_id(value):
+    """A room type id sent as a number or a string of digits, else None."""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str) and value.isascii() and value.isdigit():
+        return int(value)
+    return None
+
+
+def _parse_stay(check_in, check_out):
+    try:
+        check_in, check_out = parse_date(str(check_in or '')), parse_date(str(check_out or ''))
+    except ValueError:
+        return None
+    if not (check_in and check_out) or check_out <= check_in:
+        return None
+    return check_in, check_out
+
+
+@api_view(['GET', 'POST'])
+@permission_classes([AllowAny])
+def quote(request):
+    """
+    Server-side price quotes.
+
+    GET  /quote/?room_type=1&check_in=2025-12-01&check_out=2025-12-05&coupon=SUMMER
+         prices one stay with its night-by-night breakdown.
+    POST /quote/ {"coupon": "SUMMER", "stays": [{"room_type": 1, "check_in": ..., "check_out": ...}, ...]}
+         prices many stays in one call.
+    """
+    if request.method == 'GET':
+        params = request.query_params
+        stay = _parse_stay(params.get('check_in'), params.get('check_out'))
+        if stay is None:
+            return Response({"detail": "check_in and check_out must be valid dates with check_out after check-in."}, status=400)
+        try:
+            room_type = RoomType.objects.get(pk=params.get('room_type'))
+        except (RoomType.DoesNotExist, ValueError, TypeError):
+            return Response({"room_type": "Invalid Room Type selected."}, status=400)
+
+        try:
+            coupon = find_coupon(params.get('coupon'), room_type.hotel_id)
+        except ValueError:
+            return Response({"coupon": "Must be a coupon code."}, status=400)
+        if params.get('coupon') and coupon is None:
+            return Response({"coupon": "Invalid or inactive coupon."}, status=400)
+        return Response(quote_stay(room_type, *stay, coupon=coupon))
+
+    stays = request.data.get('stays')
+    if not isinstance(stays, list) or not stays:
+        return Response({"stays": "Provide a non-empty list of stays."}, status=400)
+    if len(stays) > MAX_BATCH_QUOTES:
+        return Response({"stays": f"At most {MAX_BATCH_QUOTES} stays can be quoted at once."}, status=400)
+
+    # Room types for the whole batch are loaded in one query
+    room_type_ids = {_room_type_id(item.get('room_type')) for item in stays if isinstance(item, dict)}
+    room_types = RoomType.objects.in_bulk([pk for pk in room_type_ids if pk is not None])
+
+    parsed, errors = [], {}
+    for index, item in enumerate(stays):
+        if not isinstance(item, dict):
+            errors[index] = "Each stay must be an object."
+            continue
+        room_type = room_types.get(_room_type_id(item.get('room_type')))
+        stay = _parse_stay(item.get('check_in'), item.get('check_out'))
+        if room_type is None:
+            errors[index] = "Invalid Room Type selected."
+        elif stay is None:
+            errors[index] = "check_in and check_out must be valid dates with check_out after check_in."
+        else:
+            parsed.append((room_type, *stay))
+    if errors:
+        return Response({"stays": errors}, status=400)
+
+    # Coupons belong to a hotel: each hotel's stays are priced with that hotel's coupon
+    code = request.data.get('coupon')
+    by_hotel = {}
+    for index, (room_type, *_) in enumerate(parsed):
+        by_hotel.setdefault(room_type.hotel_id, []).append(index)
+    try:
+        coupons = {hotel_id: find_coupon(code, hotel_id) for hotel_id in by_hotel}
+    except ValueError:
+        return Response({"coupon": "Must be a coupon code."}, status=400)
+    if code and not any(coupons.values()):
+        return Response({"coupon": "Invalid or inactive coupon."}, status=400)
+
+    results = [None] * len(parsed)
+    for hotel_id, indexes in by_hotel.items():
+        for index, quote in zip(indexes, price_stays([parsed[index] for index in indexes], coupons[hotel_id])):
+            results[index] = quote
+    return Response({'results': results})
@@ -0,0 +1,46 @@
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+
+from .sqlstats import build_report, set_config
+
+ORDERS = ('total', 'count', 'p95')
+
+
+@api_view(['GET', 'POST'])
+@permission_classes([IsAuthenticated])
+def sql_report(request):
+    """
+    Superusers only.
+
+    GET  /sql-report/?order=total|count|p95&limit=50&view=booking-list
+         ranks the captured query fingerprints.
+    POST /sql-report/ {"enabled": true, "sample_rate": 0.05, "reset": false}
+         switches capture at runtime.
+    """
+    if not request.user.is_superuser:
+        return Response({"detail": "Only superusers can see the SQL report."}, status=403)
+
+    if request.method == 'POST':
+        enabled = request.data.get('enabled')
+        if enabled is not None and not isinstance(enabled, bool):
+            return Response({"enabled": "Must be true or false."}, status=400)
+        sample_rate = request.data.get('sample_rate')
+        if sample_rate is not None:
+            try:
+                sample_rate = float(sample_rate)
+            except (TypeError, ValueError):
+                sample_rate = -1
+            if not 0 < sample_rate <= 1:
+                return Response({"sample_rate": "Must be a number above 0 and at most 1."}, status=400)
+        return Response(set_config(enabled, sample_rate, reset=bool(request.data.get('reset'))))
+
+    params = request.query_params
+    order = params.get('order', 'total')
+    if order not in ORDERS:
+        return Response({"order": f"Choose one of: {', '.join(ORDERS)}."}, status=400)
+    try:
+        limit = min(max(int(params.get('limit', 50)), 1), 500)
+    except ValueError:
+        return Response({"limit": "Must be a number."}, status=400)
+    return Response(build_report(view=params.get('view') or None, limit=limit, order=order))
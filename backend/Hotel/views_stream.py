@@ -0,0 +1,129 @@
+"""
+Server-sent event streams for screens that used to poll (kitchen food orders,
+the housekeeping board).
+
+These are plain async Django views, so they must be served by an ASGI server
+(``uvicorn Hotel_project.asgi:application``, as the Dockerfile runs); each
+connection holds no database connection while idle. Under WSGI (runserver) a
+stream would pin a worker thread for as long as it stays open, so it is refused. EventSource cannot send headers, so the token
+may also be passed as ``?token=``. Tokens resolve through the same cache as the
+API (see authentication.py), so a reconnecting screen costs no query.
+"""
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+
+from .authentication import entry_user, get_entry, staff_scope
+from .events import RESET, food_orders_channel, housekeeping_channel, hub
+from .models import Hotel, StaffProfile
+from .views_availability import parse_hotel_param
+
+RETRY_MILLISECONDS = 3000
+
+WSGI_REFUSED = {'detail': 'Event streams need the ASGI server; poll the list endpoint instead.'}
+
+
+async def _stream_user(request):
+    header = request.headers.get('Authorization', '')
+    key = header[len('Token '):] if header.startswith('Token ') else request.GET.get('token')
+    if not key:
+        return None
+    entry = await sync_to_async(get_entry)(key)
+    if entry is None:
+        return None
+    user = entry_user(entry)
+    return user if user.is_active else None
+
+
+async def _stream_profile(request, user):
+    """(hotel_id, role) of the connecting user. Raises ValueError for a malformed ?hotel=."""
+    role, hotel_id = staff_scope(user)
+    if hotel_id is None and user.is_superuser:
+        # Superusers without a profile pick the hotel to watch
+        requested = parse_hotel_param(request.GET)
+        hotels = Hotel.objects.filter(pk=requested) if requested else Hotel.objects.order_by('id')
+        return await hotels.values_list('id', flat=True).afirst(), None
+    return hotel_id, role
+
+
+async def _connect(request):
+    """(user, hotel_id, role) of a stream request, or the JsonResponse refusing it."""
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse(WSGI_REFUSED, status=501)
+    user = await _stream_user(request)
+    if user is None:
+        return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+    try:
+        hotel_id, role = await _stream_profile(request, user)
+    except ValueError:
+        return JsonResponse({'hotel': 'Must be a hotel id.'}, status=400)
+    if hotel_id is None:
+        return JsonResponse({'detail': 'No hotel is assigned to this user.'}, status=400)
+    return user, hotel_id, role
+
+
+def _reset_frame():
+    return b'event: reset\ndata: {}\n\n'
+
+
+async def _event_stream(subscription, backlog):
+    try:
+        yield f'retry: {RETRY_MILLISECONDS}\n\n'.encode()
+        if backlog is None:
+            yield _reset_frame()
+        else:
+            for event in backlog:
+                yield event.frame
+        async for event in subscription:
+            if event is None:
+                yield b': ping\n\n'
+            elif event is RESET:
+                # The client refetches the list and reconnects without Last-Event-ID
+                yield _reset_frame()
+                return
+            else:
+                yield event.frame
+    finally:
+        hub.unsubscribe(subscription)
+
+
+def event_stream_response(channel, request, predicate=None):
+    last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    subscription, backlog = hub.subscribe(channel, last_event_id, predicate)
+    response = StreamingHttpResponse(_event_stream(subscription, backlog), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+async def food_order_stream(request):
+    """Pushes order.created / order.updated / order.deleted events for the user's hotel."""
+    connected = await _connect(request)
+    if isinstance(connected, JsonResponse):
+        return connected
+    _, hotel_id, _ = connected
+    return event_stream_response(food_orders_channel(hotel_id), request)
+
+
+def _assigned_to(user_id):
+    def wants(event):
+        # Room status is board-wide; tasks only reach their current or previous assignee
+        if not event.name.startswith('task.'):
+            return True
+        return user_id in (event.payload.get('assigned_to'), event.payload.get('previous_assigned_to'))
+    return wants
+
+
+async def housekeeping_stream(request):
+    """
+    Pushes room.updated / room.deleted and task.created / task.updated / task.deleted
+    deltas for the user's hotel. Housekeepers, or anyone passing ?assigned=me, only
+    receive the tasks assigned to them.
+    """
+    connected = await _connect(request)
+    if isinstance(connected, JsonResponse):
+        return connected
+    user, hotel_id, role = connected
+    mine = role == StaffProfile.RoleChoices.HOUSEKEEPER or request.GET.get('assigned') == 'me'
+    return event_stream_response(housekeeping_channel(hotel_id), request, _assigned_to(user.pk) if mine else None)
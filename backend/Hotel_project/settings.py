@@ -48,6 +48,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Outermost, so the timings cover every other middleware too
+    'Hotel.metrics.metrics_middleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -55,6 +57,8 @@ MIDDLEWARE = [
     "django.middleware.common.CommonMiddleware",
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'Hotel.tenancy.tenant_middleware',
+    'Hotel.hotel_config.maintenance_middleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -176,10 +180,35 @@ CORS_ALLOWED_ORIGINS = [
 ]
 
 
+# Cache used by the dashboard counters and the public response cache (Hotel/caching.py).
+# LocMemCache is an in-process LRU; set REDIS_URL to share the cache (and its
+# invalidations) between several worker processes.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    }
+}
+if os.environ.get('REDIS_URL'):
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ['REDIS_URL'],
+    }
+
+RESPONSE_CACHE_ALIAS = 'default'
+RESPONSE_CACHE_TIMEOUT = 600
+
+# Resolved API tokens (see Hotel/authentication.py): an in-process LRU, backed by
+# the shared cache when there is one so logouts reach every worker process
+AUTH_TOKEN_CACHE_SIZE = 10000
+AUTH_TOKEN_CACHE_TIMEOUT = 300
+AUTH_TOKEN_CACHE_ALIAS = 'default' if os.environ.get('REDIS_URL') else None
+
+
 REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
      'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',  # <--- CRITICAL: Enables Token Login
+        'Hotel.authentication.CachedTokenAuthentication',  # <--- CRITICAL: Enables Token Login
         'rest_framework.authentication.SessionAuthentication',
     ],
     'PAGE_SIZE': 100
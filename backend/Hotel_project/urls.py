@@ -22,12 +22,14 @@ from django.conf.urls.static import static
 from rest_framework.authtoken import views
 from rest_framework.authtoken.views import obtain_auth_token 
 from Hotel.views_auth import AdminLoginAPI
+from Hotel.metrics import metrics_view
 
 urlpatterns = [
     path('api/login/', AdminLoginAPI.as_view(), name='admin-login'),
     path('admin/', admin.site.urls),
     path('api/', include('Hotel.urls')),
     path('api-token-auth/', views.obtain_auth_token),
+    path('metrics/', metrics_view, name='metrics'),
 
     
     